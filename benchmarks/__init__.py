@@ -0,0 +1 @@
+"""Synthetic fleet generator and end-to-end ingest/report benchmarks; run ``python -m benchmarks --help``."""
@@ -0,0 +1,154 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+import pytz
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fleet import FleetSpec, generate_fleet
+from benchmarks.scenarios import SCENARIOS, run_scenarios
+
+# Settings that change what is being measured, recorded with every result.
+RECORDED_ENV = ['REPORT_SOURCE', 'REPORT_WORKERS', 'REPORT_SHARDS_PER_WORKER', 'REPORT_BATCH_STORES', 'REPORT_PROGRESS_STORES', 'REPORT_JOB_WORKERS', 'UPLOAD_WORKERS', 'DB_POOL_SIZE']
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _spec(args) -> FleetSpec:
+    return FleetSpec(stores=args.stores, weeks=args.weeks, seed=args.seed)
+
+def run(args) -> int:
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    cwd = os.getcwd()
+    try:
+        spec = _spec(args)
+        print(f"Generating {spec.stores} stores x {spec.weeks} weeks in {workdir}")
+        fleet = generate_fleet(spec, os.path.join(workdir, 'data'))
+        print(f"Rows: {fleet['rows']}")
+
+        # The app keeps its database and report files relative to the working directory.
+        os.chdir(workdir)
+        from fastapi.testclient import TestClient
+        import main
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+        with TestClient(main.app) as client:
+            scenarios = run_scenarios(client, fleet, args.repeat, args.only)
+
+        results = {
+            'meta': {
+                'fleet': spec.as_dict(),
+                'rows': fleet['rows'],
+                'repeat': args.repeat,
+                'commit': _git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'env': {name: os.environ[name] for name in RECORDED_ENV if name in os.environ},
+                'created_at': datetime.now(pytz.UTC).isoformat(),
+            },
+            'scenarios': scenarios,
+        }
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as handle:
+            return compare_results(json.load(handle), results, args.threshold, args.min_delta)
+    return 0
+
+def compare_results(baseline: dict, current: dict, threshold: float, min_delta: float) -> int:
+    """Print a comparison table; returns 1 when any scenario is slower than baseline * (1 + threshold)."""
+    if baseline['meta'].get('fleet') != current['meta'].get('fleet'):
+        print(f"Warning: fleets differ: {baseline['meta'].get('fleet')} vs {current['meta'].get('fleet')}")
+
+    regressions = []
+    print(f"{'scenario':<24} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, _, _ in SCENARIOS:
+        if name not in baseline['scenarios'] or name not in current['scenarios']:
+            continue
+        before = baseline['scenarios'][name]['seconds']
+        after = current['scenarios'][name]['seconds']
+        change = (after - before) / before if before else 0.0
+        # Tiny scenarios are noisy; ignore changes below min_delta seconds.
+        regressed = change > threshold and after - before > min_delta
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<24} {before:9.3f}s {after:9.3f}s {change:+7.1%}{'  REGRESSION' if regressed else ''}")
+
+    if regressions:
+        print(f"{len(regressions)} scenario(s) regressed more than {threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+def compare(args) -> int:
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    with open(args.current) as handle:
+        current = json.load(handle)
+    return compare_results(baseline, current, args.threshold, args.min_delta)
+
+def generate(args) -> int:
+    fleet = generate_fleet(_spec(args), args.directory)
+    print(f"Wrote {fleet['rows']} to {args.directory}")
+    return 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Ingest and report benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def fleet_options(command):
+        command.add_argument('--stores', type=int, default=1000)
+        command.add_argument('--weeks', type=int, default=1)
+        command.add_argument('--seed', type=int, default=42)
+
+    def compare_options(command):
+        command.add_argument('--threshold', type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+        command.add_argument('--min-delta', type=float, default=0.05, help="ignore changes below this many seconds")
+
+    run_command = commands.add_parser('run', help="generate a fleet and time every scenario")
+    fleet_options(run_command)
+    compare_options(run_command)
+    run_command.add_argument('--repeat', type=int, default=3, help="runs per report scenario (median is kept)")
+    run_command.add_argument('--only', nargs='+', choices=[name for name, _, _ in SCENARIOS],
+                             help="report scenarios to run; uploads always run")
+    run_command.add_argument('--output', '-o', help="write results JSON here")
+    run_command.add_argument('--baseline', help="compare with this results JSON and fail on regressions")
+    run_command.add_argument('--keep', action='store_true', help="keep the temporary data and database")
+    run_command.add_argument('--verbose', action='store_true', help="keep the application's INFO logging")
+    run_command.set_defaults(handler=run)
+
+    compare_command = commands.add_parser('compare', help="compare two results files")
+    compare_command.add_argument('baseline')
+    compare_command.add_argument('current')
+    compare_options(compare_command)
+    compare_command.set_defaults(handler=compare)
+
+    generate_command = commands.add_parser('generate', help="only write the synthetic CSVs")
+    generate_command.add_argument('directory')
+    fleet_options(generate_command)
+    generate_command.set_defaults(handler=generate)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
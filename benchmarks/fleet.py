@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from typing import Dict
+import os
+import uuid
+import numpy as np
+import pandas as pd
+
+TIMEZONES = ['America/Chicago', 'America/New_York', 'America/Los_Angeles', 'America/Denver', 'Asia/Kolkata']
+TIMEZONE_WEIGHTS = [0.4, 0.25, 0.2, 0.1, 0.05]
+
+# Roughly how the production data is spread across kinds of business hours.
+HOURS_KINDS = ['always_open', 'regular', 'overnight', 'none']
+HOURS_WEIGHTS = [0.2, 0.6, 0.1, 0.1]
+
+POLL_INTERVAL = pd.Timedelta(hours=1)
+MISSED_POLL_RATE = 0.03
+STATUS_FLIP_RATE = 0.05
+STORES_PER_CHUNK = 2000
+
+@dataclass
+class FleetSpec:
+    stores: int = 1000
+    weeks: int = 1
+    seed: int = 42
+    # Polls end here; the default range crosses the 2024-03-10 US DST change.
+    end: str = '2024-03-12 14:00:00'
+
+    def as_dict(self) -> Dict:
+        return {'stores': self.stores, 'weeks': self.weeks, 'seed': self.seed, 'end': self.end}
+
+def _store_ids(rng: np.random.Generator, count: int) -> np.ndarray:
+    raw = rng.integers(0, 256, size=(count, 16), dtype=np.uint8)
+    return np.array([str(uuid.UUID(bytes=row.tobytes())) for row in raw], dtype=object)
+
+def _timezones(rng: np.random.Generator, store_ids: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame({
+        'store_id': store_ids,
+        'timezone_str': rng.choice(TIMEZONES, size=len(store_ids), p=TIMEZONE_WEIGHTS),
+    })
+
+def _business_hours(rng: np.random.Generator, store_ids: np.ndarray) -> pd.DataFrame:
+    kind = rng.choice(HOURS_KINDS, size=len(store_ids), p=HOURS_WEIGHTS)
+    stores = np.repeat(store_ids, 7)
+    kind = np.repeat(kind, 7)
+    day = np.tile(np.arange(7), len(store_ids))
+
+    open_minutes = rng.integers(5 * 4, 11 * 4, size=len(stores)) * 15
+    close_minutes = rng.integers(15 * 4, 23 * 4, size=len(stores)) * 15
+    start = np.select([kind == 'always_open', kind == 'overnight'], [0, 22 * 60], open_minutes)
+    end = np.select([kind == 'always_open', kind == 'overnight'], [24 * 60 - 1, 2 * 60 + 30], close_minutes)
+    # Some stores are closed on some days.
+    keep = (kind != 'none') & (rng.random(len(stores)) > 0.1)
+
+    def as_time(minutes: np.ndarray) -> np.ndarray:
+        # 23:59 is written as 23:59:59, like the production data's all-day stores.
+        seconds = np.where(minutes == 24 * 60 - 1, 59, 0)
+        parts = [np.char.zfill(values.astype(str), 2) for values in (minutes // 60, minutes % 60, seconds)]
+        return np.char.add(np.char.add(np.char.add(parts[0], ':'), np.char.add(parts[1], ':')), parts[2])
+
+    return pd.DataFrame({
+        'store_id': stores[keep],
+        'dayOfWeek': day[keep],
+        'start_time_local': as_time(start[keep]),
+        'end_time_local': as_time(end[keep]),
+    })
+
+def _polls(rng: np.random.Generator, store_ids: np.ndarray, spec: FleetSpec) -> pd.DataFrame:
+    """Hourly polls with jitter, missed polls and occasional status flips."""
+    end = pd.Timestamp(spec.end)
+    hours = int(pd.Timedelta(weeks=spec.weeks) / POLL_INTERVAL)
+    start_us = (end - pd.Timedelta(weeks=spec.weeks)).value // 1000
+    grid = start_us + np.arange(hours, dtype=np.int64) * (POLL_INTERVAL.value // 1000)
+
+    ts = grid[None, :] + rng.integers(0, 3600 * 10**6, size=(len(store_ids), hours))
+    flips = rng.random((len(store_ids), hours)) < STATUS_FLIP_RATE
+    active = np.cumsum(flips, axis=1) % 2 == 0
+    keep = rng.random((len(store_ids), hours)) > MISSED_POLL_RATE
+
+    stamps = np.datetime_as_string(ts[keep].astype('datetime64[us]'), unit='us')
+    return pd.DataFrame({
+        'store_id': np.repeat(store_ids, keep.sum(axis=1)),
+        'timestamp_utc': pd.Series(stamps).str.replace('T', ' ', regex=False).to_numpy() + ' UTC',
+        'status': np.where(active[keep], 'active', 'inactive'),
+    })
+
+def generate_fleet(spec: FleetSpec, directory: str) -> Dict:
+    """Write timezones.csv, business_hours.csv and store_status.csv; returns their paths and row counts."""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(spec.seed)
+    store_ids = _store_ids(rng, spec.stores)
+
+    paths = {name: os.path.join(directory, f"{name}.csv")
+             for name in ('timezones', 'business_hours', 'store_status')}
+    _timezones(rng, store_ids).to_csv(paths['timezones'], index=False)
+    hours = _business_hours(rng, store_ids)
+    hours.to_csv(paths['business_hours'], index=False)
+
+    # Polls are written in store chunks so memory stays flat at 100k stores.
+    status_rows = 0
+    for i in range(0, len(store_ids), STORES_PER_CHUNK):
+        polls = _polls(rng, store_ids[i:i + STORES_PER_CHUNK], spec)
+        polls.to_csv(paths['store_status'], mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        status_rows += len(polls)
+
+    return {
+        **paths,
+        'rows': {'timezones': len(store_ids), 'business_hours': len(hours), 'store_status': status_rows},
+    }
@@ -0,0 +1,105 @@
+from typing import Callable, Dict, List
+import statistics
+import time
+
+# Each scenario returns extra metrics for the JSON results; its wall time is measured around it.
+Scenario = Callable[[object, Dict], Dict]
+
+JOB_POLL_SECONDS = 0.01
+REPORT_POLL_SECONDS = 0.05
+
+def _upload(client, endpoint: str, path: str) -> Dict:
+    with open(path, 'rb') as source:
+        response = client.post(f'/api/upload/{endpoint}', files={'file': (path, source, 'text/csv')})
+    response.raise_for_status()
+    job_id = response.json()['job_id']
+    while True:
+        job = client.get(f'/api/upload/status/{job_id}').json()
+        if job['status'] == 'Complete':
+            return {'rows': job['rows_processed'], 'result': job.get('result')}
+        if job['status'] == 'Failed':
+            raise RuntimeError(f"{endpoint} upload failed: {job['errors']}")
+        time.sleep(JOB_POLL_SECONDS)
+
+def upload_timezones(client, fleet: Dict) -> Dict:
+    return _upload(client, 'timezones', fleet['timezones'])
+
+def upload_business_hours(client, fleet: Dict) -> Dict:
+    return _upload(client, 'business-hours', fleet['business_hours'])
+
+def upload_store_status(client, fleet: Dict) -> Dict:
+    return _upload(client, 'store-status', fleet['store_status'])
+
+def _wait_for_report(client, report_id: str) -> None:
+    while True:
+        response = client.get(f'/api/get_report/{report_id}', headers={'Range': 'bytes=0-0'})
+        if response.status_code >= 400:
+            raise RuntimeError(f"Report {report_id} failed: {response.text}")
+        if response.headers.get('content-type', '').startswith('text/csv'):
+            return
+        time.sleep(REPORT_POLL_SECONDS)
+
+def _forget_reports():
+    # Finished reports are reused for unchanged data; drop them so the next trigger computes again.
+    from database import SessionLocal
+    from models.report import Report
+    db = SessionLocal()
+    try:
+        db.query(Report).delete()
+        db.commit()
+    finally:
+        db.close()
+
+def generate_report(client, fleet: Dict) -> Dict:
+    _forget_reports()
+    report_id = client.post('/api/trigger_report').json()['report_id']
+    _wait_for_report(client, report_id)
+    fleet['report_id'] = report_id
+    return {}
+
+def trigger_report_cached(client, fleet: Dict) -> Dict:
+    report_id = client.post('/api/trigger_report').json()['report_id']
+    if report_id != fleet.get('report_id'):
+        raise RuntimeError("Trigger with unchanged data did not reuse the existing report")
+    return {}
+
+def get_report(client, fleet: Dict) -> Dict:
+    response = client.get(f"/api/get_report/{fleet['report_id']}")
+    response.raise_for_status()
+    return {'bytes': len(response.content), 'lines': response.content.count(b'\n')}
+
+def availability_series(client, fleet: Dict) -> Dict:
+    response = client.get('/api/availability', params={'bucket': '15m'})
+    response.raise_for_status()
+    return {'buckets': response.json()['buckets']}
+
+# Uploads change the database, so they run once; the rest repeat.
+SCENARIOS: List = [
+    ('upload_timezones', upload_timezones, False),
+    ('upload_business_hours', upload_business_hours, False),
+    ('upload_store_status', upload_store_status, False),
+    ('generate_report', generate_report, True),
+    ('trigger_report_cached', trigger_report_cached, True),
+    ('get_report', get_report, True),
+    ('availability_series', availability_series, True),
+]
+
+def run_scenarios(client, fleet: Dict, repeat: int, only: List[str] = None) -> Dict[str, Dict]:
+    results = {}
+    for name, scenario, repeatable in SCENARIOS:
+        if only and name not in only and repeatable:
+            continue
+        runs, metrics = [], {}
+        for _ in range(repeat if repeatable else 1):
+            started = time.perf_counter()
+            metrics = scenario(client, fleet)
+            runs.append(time.perf_counter() - started)
+        results[name] = {
+            'seconds': statistics.median(runs),
+            'runs': [round(run, 6) for run in runs],
+            **metrics,
+        }
+        if 'rows' in metrics:
+            results[name]['rows_per_second'] = round(metrics['rows'] / results[name]['seconds'], 1)
+        print(f"{name:<24} {results[name]['seconds']:9.3f}s")
+    return results
@@ -0,0 +1,30 @@
+import argparse
+import sys
+from database import SessionLocal, engine, Base
+import migrations
+import models
+from controllers.status_intervals import STATUS_RAW_RETENTION_DAYS, compact_store_status, rebuild_intervals
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge store_status polls into status intervals and prune old polls")
+    parser.add_argument("--retention-days", type=float, default=STATUS_RAW_RETENTION_DAYS,
+                        help="raw polls older than this many days before the newest poll are deleted")
+    parser.add_argument("--rebuild", action="store_true", help="re-merge every raw poll even if the intervals are current")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            rebuild_intervals(db)
+            db.commit()
+        result = compact_store_status(db, args.retention_days)
+        print(f"Deleted {result['rows_deleted']} raw polls; {result['rows_remaining']} remain "
+              f"next to {result['intervals']} intervals")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from datetime import datetime, timedelta
+import io
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from sqlalchemy.orm import Session
+from controllers.db_utils import from_utc_us, to_utc_us
+from controllers.uptime_engine import MAX_REPORT_WINDOW, US_PER_SECOND, availability_series, load_fleet, parse_windows
+from metrics import phase
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Longest series one request may ask for, e.g. 20000 buckets is ~208 days of 15m buckets.
+AVAILABILITY_MAX_BUCKETS = int(os.getenv("AVAILABILITY_MAX_BUCKETS", "20000"))
+DEFAULT_AVAILABILITY_RANGE = timedelta(weeks=1)
+ARROW_STREAM_TYPE = 'application/vnd.apache.arrow.stream'
+
+SERIES_COLUMNS = ['availability', 'active_stores', 'inactive_stores', 'open_stores']
+
+def parse_bucket(spec: Optional[str]) -> timedelta:
+    """One bucket size in window syntax ("15m", "hour", "1h", ...) that divides a day; default 15 minutes."""
+    windows = parse_windows(spec or '15m')
+    if len(windows) != 1:
+        raise ValueError("Give a single bucket size, e.g. 15m or 1h")
+    bucket = windows[0][1]
+    if timedelta(days=1) % bucket:
+        raise ValueError(f"Bucket '{spec}' must divide a day evenly")
+    return bucket
+
+def _iso(values_us: np.ndarray) -> List[str]:
+    return [f"{stamp}+00:00" for stamp in np.datetime_as_string(values_us.astype('datetime64[us]'), unit='s')]
+
+def availability_frame(db: Session, bucket: timedelta, start: Optional[datetime], end: Optional[datetime],
+                       current_time: datetime, store_ids: Optional[Sequence[str]] = None) -> Tuple[pd.DataFrame, int]:
+    """Fleet availability per UTC-aligned bucket over [start, end), by default the week up to ``current_time``.
+
+    ``active_stores`` and ``inactive_stores`` are the average number of stores
+    inside business hours that were polled active or inactive, ``open_stores``
+    those inside business hours at all (NaN after the newest poll);
+    ``availability`` is the active share of the polled ones (NaN when none
+    were). Returns the series and the number of
+    stores. Raises ValueError for a bad range.
+    """
+    end = end or current_time
+    start = start or end - DEFAULT_AVAILABILITY_RANGE
+    bucket_us = int(bucket.total_seconds() * US_PER_SECOND)
+    start_us = to_utc_us(start) // bucket_us * bucket_us
+    end_us = -(-to_utc_us(end) // bucket_us) * bucket_us
+    if end_us <= start_us:
+        raise ValueError("start must be before end")
+    if end_us - start_us > MAX_REPORT_WINDOW.total_seconds() * US_PER_SECOND + bucket_us:
+        raise ValueError(f"The range must be at most {MAX_REPORT_WINDOW.days} days")
+    if (end_us - start_us) // bucket_us > AVAILABILITY_MAX_BUCKETS:
+        raise ValueError(f"At most {AVAILABILITY_MAX_BUCKETS} buckets per request")
+
+    # Statuses hold until the newest poll; buckets after it stay empty.
+    horizon_us = max(start_us, min(end_us, to_utc_us(current_time)))
+    fleet = load_fleet(db, from_utc_us(start_us), from_utc_us(horizon_us), store_ids)
+    logger.info(f"Loaded {fleet.n_stores} stores and {len(fleet.status_ts)} status rows for availability")
+    series = availability_series(fleet, start_us, end_us, bucket_us)
+    up, down = series['uptime'].to_numpy(dtype=np.float64), series['downtime'].to_numpy(dtype=np.float64)
+    # The bucket holding the newest poll is averaged over the part that has data.
+    covered = np.clip(horizon_us - series['bucket_start'].to_numpy(dtype=np.int64), 0, bucket_us).astype(np.float64)
+    covered[covered == 0] = np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        availability = up / (up + down)
+    frame = pd.DataFrame({
+        'bucket_start': series['bucket_start'],
+        'availability': availability,
+        'active_stores': up / covered,
+        'inactive_stores': down / covered,
+        'open_stores': series['open'].to_numpy(dtype=np.float64) / covered,
+    })
+    return frame, fleet.n_stores
+
+def availability_json(frame: pd.DataFrame, meta: Dict) -> Dict:
+    """Columnar JSON: one list per column, with nulls for NaN."""
+    with phase('serialization'):
+        columns = {'bucket_start': _iso(frame['bucket_start'].to_numpy(dtype=np.int64))}
+        for name in SERIES_COLUMNS:
+            values = frame[name].round(4 if name == 'availability' else 3)
+            columns[name] = values.astype(object).where(values.notna(), None).tolist()
+        return {**meta, 'buckets': len(frame), 'columns': columns}
+
+def availability_arrow(frame: pd.DataFrame, meta: Dict) -> bytes:
+    """An Arrow IPC stream with a UTC timestamp column and the request's metadata on the schema."""
+    with phase('serialization'):
+        table = pa.table({
+            'bucket_start': pa.array(frame['bucket_start'].to_numpy(dtype=np.int64), pa.timestamp('us', tz='UTC')),
+            **{name: pa.array(frame[name].to_numpy(), pa.float64(), from_pandas=True) for name in SERIES_COLUMNS},
+        })
+        table = table.replace_schema_metadata({key: str(value) for key, value in meta.items()})
+        sink = io.BytesIO()
+        with ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
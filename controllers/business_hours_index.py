@@ -0,0 +1,245 @@
+from typing import Dict, Optional, Sequence, Tuple
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pytz
+from sqlalchemy.orm import Session
+from models.store import Store
+from models.business_hours import BusinessHours
+from controllers.data_versions import BUSINESS_HOURS, STORES, get_data_versions
+from controllers.db_utils import chunked, to_utc_us
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEZONE = 'America/Chicago'
+
+# Extra range built around a request so a cached index keeps serving reports
+# as new status data moves the report end time forward.
+CACHE_PADDING_BEFORE = timedelta(days=1)
+CACHE_PADDING_AFTER = timedelta(days=7)
+# Single-store indexes kept for per-store lookups when the fleet index is not built.
+STORE_HOURS_CACHE_SIZE = int(os.getenv("STORE_HOURS_CACHE_SIZE", "10000"))
+
+class BusinessHoursIndex:
+    """Sorted, non-overlapping UTC business intervals per store over a fixed range.
+
+    Intervals are stored CSR-style: the intervals of the store at position ``i``
+    are ``starts[offsets[i]:offsets[i + 1]]`` / ``ends[...]``, in microseconds
+    since the epoch.
+    """
+
+    def __init__(self, store_ids: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                 offsets: np.ndarray, range_start_us: int, range_end_us: int, version: Tuple[int, ...] = ()):
+        self.store_ids = store_ids
+        self.starts = starts
+        self.ends = ends
+        self.offsets = offsets
+        self.range_start_us = range_start_us
+        self.range_end_us = range_end_us
+        self.version = version
+        self._position = pd.Series(np.arange(len(store_ids)), index=store_ids)
+
+    def covers(self, start_us: int, end_us: int) -> bool:
+        return self.range_start_us <= start_us and end_us <= self.range_end_us
+
+    def store_intervals(self, store_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        pos = self._position.get(store_id)
+        if pos is None:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        lo, hi = self.offsets[pos], self.offsets[pos + 1]
+        return self.starts[lo:hi], self.ends[lo:hi]
+
+    def fleet_intervals(self, store_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Intervals for ``store_ids``, tagged with each store's position in that array."""
+        pos = self._position.reindex(store_ids).to_numpy()
+        known = ~np.isnan(pos)
+        target = np.arange(len(store_ids))[known]
+        pos = pos[known].astype(np.int64)
+        counts = self.offsets[pos + 1] - self.offsets[pos]
+        # Gather each store's slice without a Python loop.
+        take = np.repeat(self.offsets[pos] - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+        take = take + np.arange(counts.sum())
+        return np.repeat(target, counts), self.starts[take], self.ends[take]
+
+@lru_cache(maxsize=None)
+def get_timezone(name: str):
+    return pytz.timezone(name)
+
+def _localize(local: pd.Series, timezones: pd.Series) -> np.ndarray:
+    """UTC microseconds for naive local wall-clock times, one timezone group at a time.
+
+    Ambiguous times (the repeated hour when clocks fall back) resolve to their
+    first occurrence and non-existent times (spring forward) move to the first
+    valid instant after the gap.
+    """
+    out = np.empty(len(local), dtype=np.int64)
+    values = local.to_numpy()
+    tz_values = timezones.to_numpy()
+    for tz_name in np.unique(tz_values):
+        mask = tz_values == tz_name
+        stamps = pd.DatetimeIndex(values[mask]).tz_localize(
+            get_timezone(tz_name),
+            ambiguous=np.ones(mask.sum(), dtype=bool),
+            nonexistent='shift_forward'
+        )
+        out[mask] = stamps.asi8 // 1000
+    return out
+
+def build_business_hours_index(db: Session, since: datetime, until: datetime,
+                               store_ids: Optional[Sequence[str]] = None,
+                               version: Tuple[int, ...] = ()) -> BusinessHoursIndex:
+    start_us, end_us = to_utc_us(since), to_utc_us(until)
+
+    store_query = db.query(Store.store_id, Store.timezone_str)
+    hours_query = db.query(BusinessHours.store_id, BusinessHours.day,
+                           BusinessHours.start_time_local, BusinessHours.end_time_local)
+    if store_ids is None:
+        store_rows, hour_rows = store_query.all(), hours_query.all()
+    else:
+        store_rows, hour_rows = [], []
+        for chunk in chunked(list(store_ids)):
+            store_rows += store_query.filter(Store.store_id.in_(chunk)).all()
+            hour_rows += hours_query.filter(BusinessHours.store_id.in_(chunk)).all()
+
+    timezones = pd.DataFrame(store_rows, columns=['store_id', 'timezone_str'])
+    hours = pd.DataFrame(hour_rows, columns=['store_id', 'day', 'start', 'end'])
+    return business_hours_index_from_frames(timezones, hours, start_us, end_us, version)
+
+def business_hours_index_from_frames(timezones: pd.DataFrame, hours: pd.DataFrame, start_us: int, end_us: int,
+                                     version: Tuple[int, ...] = ()) -> BusinessHoursIndex:
+    """Index from a (store_id, timezone_str) frame and a (store_id, day, start, end) frame."""
+    hours = hours.copy()
+    hours['store_id'] = hours['store_id'].astype(str)
+    hours = hours.merge(timezones.astype({'store_id': str}), on='store_id', how='left')
+    hours['timezone_str'] = hours['timezone_str'].fillna(DEFAULT_TIMEZONE)
+    hours['start'] = pd.to_timedelta(hours['start'], errors='coerce')
+    hours['end'] = pd.to_timedelta(hours['end'], errors='coerce')
+    hours = hours.dropna(subset=['start', 'end'])
+
+    # Every local calendar day that can touch the range in any timezone.
+    first_day = pd.Timestamp(start_us * 1000).normalize() - pd.Timedelta(days=2)
+    last_day = pd.Timestamp(end_us * 1000).normalize() + pd.Timedelta(days=1)
+    days = pd.DataFrame({'date': pd.date_range(first_day, last_day, freq='D')})
+    days['day'] = days['date'].dt.dayofweek
+
+    periods = hours.astype({'day': int}).merge(days, on='day')
+    local_start = periods['date'] + periods['start']
+    local_end = periods['date'] + periods['end']
+    local_end = local_end.where(local_end >= local_start, local_end + pd.Timedelta(days=1))
+
+    frame = pd.DataFrame({
+        'store_id': periods['store_id'].to_numpy(),
+        'start': _localize(local_start, periods['timezone_str']) if len(periods) else np.array([], dtype=np.int64),
+        'end': _localize(local_end, periods['timezone_str']) if len(periods) else np.array([], dtype=np.int64),
+    })
+    frame['start'] = frame['start'].clip(lower=start_us, upper=end_us)
+    frame['end'] = frame['end'].clip(lower=start_us, upper=end_us)
+    frame = frame[frame['end'] > frame['start']].sort_values(['store_id', 'start', 'end'])
+
+    # Merge overlapping or touching intervals within each store.
+    reach = frame.groupby('store_id')['end'].cummax()
+    prev_reach = reach.groupby(frame['store_id']).shift()
+    new_run = prev_reach.isna() | (frame['start'] > prev_reach)
+    frame['run'] = new_run.cumsum()
+    merged = frame.groupby('run').agg(store_id=('store_id', 'first'), start=('start', 'min'), end=('end', 'max'))
+
+    ids = merged['store_id'].drop_duplicates().to_numpy(dtype=object)
+    counts = merged.groupby('store_id', sort=False).size().reindex(ids).to_numpy()
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    return BusinessHoursIndex(
+        ids,
+        merged['start'].to_numpy(dtype=np.int64),
+        merged['end'].to_numpy(dtype=np.int64),
+        offsets,
+        start_us,
+        end_us,
+        version,
+    )
+
+_cache: Dict[str, BusinessHoursIndex] = {}
+_store_cache: "OrderedDict[str, BusinessHoursIndex]" = OrderedDict()
+_weekly_cache: "OrderedDict[str, Tuple[Tuple[int, ...], object, Dict[int, Tuple[int, int, int, int]]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def get_business_hours_index(db: Session, since: datetime, until: datetime) -> BusinessHoursIndex:
+    """Fleet-wide index covering [since, until], rebuilt only when the hours or timezones change."""
+    version = get_data_versions(db, BUSINESS_HOURS, STORES)
+    with _cache_lock:
+        index = _cache.get('fleet')
+        if index is not None and index.version == version and index.covers(to_utc_us(since), to_utc_us(until)):
+            return index
+
+        index = build_business_hours_index(
+            db, since - CACHE_PADDING_BEFORE, until + CACHE_PADDING_AFTER, version=version
+        )
+        logger.info(f"Built business hours index for {len(index.store_ids)} stores at version {version}")
+        _cache['fleet'] = index
+        return index
+
+def store_business_hours(db: Session, store_id: str, since: datetime, until: datetime) -> Tuple[np.ndarray, np.ndarray]:
+    """One store's UTC business intervals over [since, until] without building the fleet index.
+
+    A current fleet index is used when it covers the range; otherwise the
+    store's own index is built once and kept in a bounded LRU.
+    """
+    version = get_data_versions(db, BUSINESS_HOURS, STORES)
+    start_us, end_us = to_utc_us(since), to_utc_us(until)
+    with _cache_lock:
+        index = _cache.get('fleet')
+        if index is not None and index.version == version and index.covers(start_us, end_us):
+            return index.store_intervals(store_id)
+        index = _store_cache.get(store_id)
+        if index is not None and index.version == version and index.covers(start_us, end_us):
+            _store_cache.move_to_end(store_id)
+            return index.store_intervals(store_id)
+
+    index = build_business_hours_index(
+        db, since - CACHE_PADDING_BEFORE, until + CACHE_PADDING_AFTER, [store_id], version=version
+    )
+    with _cache_lock:
+        _store_cache[store_id] = index
+        _store_cache.move_to_end(store_id)
+        while len(_store_cache) > STORE_HOURS_CACHE_SIZE:
+            _store_cache.popitem(last=False)
+    return index.store_intervals(store_id)
+
+def store_weekly_hours(db: Session, store_id: str) -> Tuple[object, Dict[int, Tuple[int, int, int, int]]]:
+    """A store's timezone and its (start hour, start minute, end hour, end minute) per weekday.
+
+    The first row of each weekday wins, as it always has; parsed rows are kept
+    per data version in a bounded LRU.
+    """
+    version = get_data_versions(db, BUSINESS_HOURS, STORES)
+    with _cache_lock:
+        cached = _weekly_cache.get(store_id)
+        if cached is not None and cached[0] == version:
+            _weekly_cache.move_to_end(store_id)
+            return cached[1], cached[2]
+
+    store = db.query(Store).filter(Store.store_id == store_id).first()
+    timezone = get_timezone(store.timezone_str if store else DEFAULT_TIMEZONE)
+    weekly: Dict[int, Tuple[int, int, int, int]] = {}
+    for row in db.query(BusinessHours).filter(BusinessHours.store_id == store_id).all():
+        if row.day in weekly:
+            continue
+        start_parts = row.start_time_local.split(':')
+        end_parts = row.end_time_local.split(':')
+        weekly[row.day] = (int(start_parts[0]), int(start_parts[1]), int(end_parts[0]), int(end_parts[1]))
+
+    with _cache_lock:
+        _weekly_cache[store_id] = (version, timezone, weekly)
+        _weekly_cache.move_to_end(store_id)
+        while len(_weekly_cache) > STORE_HOURS_CACHE_SIZE:
+            _weekly_cache.popitem(last=False)
+    return timezone, weekly
+
+def invalidate_business_hours_index():
+    with _cache_lock:
+        _cache.clear()
+        _store_cache.clear()
+        _weekly_cache.clear()
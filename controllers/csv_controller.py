@@ -1,90 +1,133 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from typing import Callable, Dict, Optional
+import numpy as np
 import pandas as pd
-from datetime import datetime
 import pytz
-from models.store import Store
 from models.business_hours import BusinessHours
-from models.store_status import StoreStatus
-from database import get_db
+from controllers.data_versions import BUSINESS_HOURS, STORES, bump_data_version
+from controllers.business_hours_index import invalidate_business_hours_index
+from controllers.db_utils import chunked, read_rows
+from controllers.uptime_rollups import rebuild_rollups, rollups_current
+from controllers.status_ingest import STATUS_COLUMNS, merge_status_frames, split_status_chunk
+from controllers.upload_jobs import get_upload_job, save_upload, submit_upload_job
+from controllers.status_stream import ingest_stream
 from sqlalchemy.orm import Session
-from fastapi import Depends
 import os
 import logging
+import time
 import uuid
 
 router = APIRouter()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def parse_timestamp(timestamp_str: str) -> datetime:
-    try:
-        timestamp_str = timestamp_str.replace(' UTC', '')
-        return datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S.%f')
-    except ValueError:
-        try:
-            return datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-        except ValueError:
-            raise HTTPException(status_code=400, detail=f"Invalid timestamp format: {timestamp_str}")
+STATUS_CHUNK_SIZE = 100_000
+UPLOADS_DIR = "uploads"
 
-@router.post("/upload/store-status")
-async def upload_store_status(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    try:
-        logger.info(f"Starting store status upload for file: {file.filename}")
-        
-        chunk_size = 1000
-        total_rows = 0
-        processed_rows = 0
-        
-        for chunk in pd.read_csv(file.file, chunksize=chunk_size):
-            total_rows += len(chunk)
-        
-        file.file.seek(0)
-        
-        for chunk in pd.read_csv(file.file, chunksize=chunk_size):
-            required_columns = ['store_id', 'timestamp_utc', 'status']
-            if not all(col in chunk.columns for col in required_columns):
+HOURS_COLUMNS = ['store_id', 'day', 'start_time_local', 'end_time_local']
+INSERT_HOURS_SQL = (
+    "INSERT INTO business_hours (store_id, day, start_time_local, end_time_local) VALUES (?, ?, ?, ?)"
+)
+UPSERT_STORE_SQL = (
+    "INSERT INTO stores (store_id, timezone_str) VALUES (?, ?) "
+    "ON CONFLICT (store_id) DO UPDATE SET timezone_str = excluded.timezone_str"
+)
+
+def ingest_store_status(db: Session, source, filename: str, progress: Optional[Callable] = None) -> Dict:
+    """Read the CSV once in chunks and merge it in a single transaction.
+
+    Polls are unique per store and timestamp, so uploading an overlapping
+    export again only adds what is new. Rejected rows go to a CSV under
+    uploads/ instead of the log. Status intervals and hourly rollups are
+    refreshed in the same transaction, so a failure leaves nothing behind;
+    an upload that changes nothing leaves the data version alone.
+    """
+    started = time.perf_counter()
+    processed_rows = 0
+    rejected_rows = 0
+    reject_path = None
+
+    def accepted_chunks():
+        nonlocal processed_rows, rejected_rows, reject_path
+        for chunk in pd.read_csv(source, chunksize=STATUS_CHUNK_SIZE, dtype={'store_id': str, 'status': str}):
+            if not all(col in chunk.columns for col in STATUS_COLUMNS):
                 raise HTTPException(status_code=400, detail="CSV must contain store_id, timestamp_utc, and status columns")
             
-            records = []
-            for _, row in chunk.iterrows():
-                try:
-                    timestamp = parse_timestamp(row['timestamp_utc'])
-                    if timestamp.tzinfo is None:
-                        timestamp = pytz.UTC.localize(timestamp)
-                    
-                    records.append({
-                        'store_id': row['store_id'],
-                        'timestamp_utc': timestamp,
-                        'status': row['status']
-                    })
-                    
-                    processed_rows += 1
-                    if processed_rows % 1000 == 0:
-                        logger.info(f"Processed {processed_rows}/{total_rows} rows")
-                        
-                except Exception as e:
-                    logger.error(f"Error processing row: {row.to_dict()}, Error: {str(e)}")
-                    continue
+            accepted, rejected = split_status_chunk(chunk[STATUS_COLUMNS])
+            if len(rejected):
+                if reject_path is None:
+                    os.makedirs(UPLOADS_DIR, exist_ok=True)
+                    reject_path = os.path.join(UPLOADS_DIR, f"rejects_{uuid.uuid4()}.csv")
+                rejected.to_csv(reject_path, mode='a', header=rejected_rows == 0, index=False)
+                rejected_rows += len(rejected)
             
-            if records:
-                db.bulk_insert_mappings(StoreStatus, records)
-                db.commit()
-        
-        logger.info("Store status upload completed successfully")
-        return {"message": f"Store status data uploaded successfully. Processed {processed_rows} rows."}
+            processed_rows += len(chunk)
+            yield accepted
+            if progress:
+                progress(processed_rows, rejected_rows)
     
-    except Exception as e:
+    try:
+        totals = merge_status_frames(db, accepted_chunks())
+        db.commit()
+    except Exception:
         db.rollback()
-        logger.error(f"Error during store status upload: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise
+    
+    elapsed = time.perf_counter() - started
+    written_rows = totals['inserted'] + totals['updated']
+    logger.info(f"Store status upload: {totals['inserted']} inserted, {totals['updated']} updated, "
+                f"{totals['unchanged']} unchanged, {totals['skipped']} skipped, {rejected_rows} rejected")
+    return {
+        'rows_inserted': totals['inserted'],
+        'rows_updated': totals['updated'],
+        'rows_unchanged': totals['unchanged'],
+        'rows_skipped': totals['skipped'],
+        'rows_rejected': rejected_rows,
+        'reject_file': reject_path,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(written_rows / elapsed, 1) if elapsed > 0 else None,
+    }
 
-@router.post("/upload/business-hours")
-async def upload_business_hours(file: UploadFile = File(...), db: Session = Depends(get_db)):
+def _bad_rows(mask: pd.Series, problem: str) -> HTTPException:
+    rows = (np.flatnonzero(mask.to_numpy()) + 1).tolist()
+    shown = ', '.join(str(row) for row in rows[:10]) + (f" and {len(rows) - 10} more" if len(rows) > 10 else "")
+    logger.error(f"{problem} in {len(rows)} rows: {shown}")
+    return HTTPException(status_code=400, detail=f"{problem} in rows {shown}")
+
+def validate_business_hours(df: pd.DataFrame) -> pd.DataFrame:
+    """Vectorized checks of day (0-6) and HH:MM:SS times; times come back zero-padded."""
+    day = pd.to_numeric(df['day'], errors='coerce')
+    bad_day = day.isna() | (day % 1 != 0) | ~day.between(0, 6)
+    if bad_day.any():
+        raise _bad_rows(bad_day, "Day value must be an integer between 0-6")
+
+    start = pd.to_datetime(df['start_time_local'], format='%H:%M:%S', errors='coerce')
+    end = pd.to_datetime(df['end_time_local'], format='%H:%M:%S', errors='coerce')
+    bad_time = start.isna() | end.isna()
+    if bad_time.any():
+        raise _bad_rows(bad_time, "Invalid time format")
+
+    bad_store = df['store_id'].isna()
+    if bad_store.any():
+        raise _bad_rows(bad_store, "Missing store_id")
+
+    return pd.DataFrame({
+        'store_id': df['store_id'].astype(str),
+        'day': day.astype(int),
+        'start_time_local': start.dt.strftime('%H:%M:%S'),
+        'end_time_local': end.dt.strftime('%H:%M:%S'),
+    }).drop_duplicates()
+
+def _hour_sets(hours: pd.DataFrame) -> pd.Series:
+    """One comparable key per store for its whole set of business hours."""
+    keys = hours['day'].astype(str) + ' ' + hours['start_time_local'] + '-' + hours['end_time_local']
+    keys = pd.DataFrame({'store_id': hours['store_id'], 'key': keys}).drop_duplicates().sort_values(['store_id', 'key'])
+    return keys.groupby('store_id', sort=False)['key'].agg('|'.join)
+
+def ingest_business_hours(db: Session, source, filename: str, progress: Optional[Callable] = None) -> Dict:
+    """Replace the hours of every store in the file as a set; stores whose set is unchanged are not written."""
     try:
-        logger.info(f"Starting business hours upload for file: {file.filename}")
-        
-        df = pd.read_csv(file.file)
+        df = pd.read_csv(source, dtype={'store_id': str, 'start_time_local': str, 'end_time_local': str})
         
         if 'dayOfWeek' in df.columns:
             df = df.rename(columns={'dayOfWeek': 'day'})
@@ -96,76 +139,131 @@ async def upload_business_hours(file: UploadFile = File(...), db: Session = Depe
             logger.error(error_msg)
             raise HTTPException(status_code=400, detail=error_msg)
         
-        try:
-            df['day'] = df['day'].astype(int)
-        except Exception as e:
-            logger.error(f"Error converting day column to integer: {str(e)}")
-            raise HTTPException(status_code=400, detail="Day column must contain integers (0-6)")
+        hours = validate_business_hours(df)
+        store_ids = sorted(hours['store_id'].unique())
+        existing = read_rows(
+            db,
+            "SELECT store_id, day, start_time_local, end_time_local FROM business_hours WHERE {store_filter}",
+            {},
+            store_ids,
+        ).reindex(columns=HOURS_COLUMNS)
+        existing['store_id'] = existing['store_id'].astype(str)
         
-        total_rows = len(df)
+        new_sets = _hour_sets(hours)
+        old_sets = _hour_sets(existing.dropna()).reindex(new_sets.index)
+        changed = new_sets.index[new_sets != old_sets].tolist()
+        rows = hours[hours['store_id'].isin(changed)]
         
-        for index, row in df.iterrows():
-            try:
-                if not 0 <= row['day'] <= 6:
-                    raise ValueError(f"Day value {row['day']} is not between 0-6")
-                
-                try:
-                    datetime.strptime(row['start_time_local'], '%H:%M:%S')
-                    datetime.strptime(row['end_time_local'], '%H:%M:%S')
-                except ValueError:
-                    raise ValueError(f"Invalid time format in row {index + 1}")
-                
-                business_hours = BusinessHours(
-                    store_id=str(row['store_id']),
-                    day=row['day'],
-                    start_time_local=row['start_time_local'],
-                    end_time_local=row['end_time_local']
-                )
-                db.add(business_hours)
-                
-                if (index + 1) % 1000 == 0:
-                    db.commit()
-            
-            except Exception as e:
-                logger.error(f"Error processing row {index + 1}: {row.to_dict()}, Error: {str(e)}")
-                raise HTTPException(status_code=400, detail=f"Error in row {index + 1}: {str(e)}")
+        rollups_were_current = rollups_current(db)
+        for chunk in chunked(changed):
+            db.query(BusinessHours).filter(BusinessHours.store_id.in_(chunk)).delete(synchronize_session=False)
+        if len(rows):
+            db.connection().exec_driver_sql(INSERT_HOURS_SQL, list(rows[HOURS_COLUMNS].itertuples(index=False, name=None)))
+        if progress:
+            progress(len(df))
         
-        db.commit()
-        logger.info("Business hours upload completed successfully")
-        return {"message": "Business hours data uploaded successfully"}
+        if changed:
+            bump_data_version(db, BUSINESS_HOURS)
+            # Commits; only the changed stores need new rollups if the rest were current.
+            rebuild_rollups(db, changed if rollups_were_current else None)
+            invalidate_business_hours_index()
+        else:
+            db.commit()
+        logger.info(f"Business hours upload changed {len(changed)} of {len(store_ids)} stores")
+        return {
+            'rows_inserted': len(rows),
+            'stores_changed': len(changed),
+            'stores_unchanged': len(store_ids) - len(changed),
+        }
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        logger.error(f"Error during business hours upload: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise
 
-@router.post("/upload/timezones")
-async def upload_timezones(file: UploadFile = File(...), db: Session = Depends(get_db)):
+def ingest_timezones(db: Session, source, filename: str, progress: Optional[Callable] = None) -> Dict:
+    """Upsert store timezones; rows that match what is stored already are not written."""
     try:
-        logger.info(f"Starting timezones upload for file: {file.filename}")
-        
-        df = pd.read_csv(file.file)
+        df = pd.read_csv(source, dtype={'store_id': str, 'timezone_str': str})
         
         required_columns = ['store_id', 'timezone_str']
         if not all(col in df.columns for col in required_columns):
             raise HTTPException(status_code=400, detail="CSV must contain store_id and timezone_str columns")
         
-        total_rows = len(df)
-        for index, row in df.iterrows():
-            store = Store(
-                store_id=row['store_id'],
-                timezone_str=row['timezone_str']
-            )
-            db.add(store)
-            
-            if (index + 1) % 1000 == 0:
-                db.commit()
+        bad_store = df['store_id'].isna()
+        if bad_store.any():
+            raise _bad_rows(bad_store, "Missing store_id")
+        # A missing timezone is allowed and means DEFAULT_TIMEZONE; a misspelled one is not.
+        timezone = df['timezone_str'].str.strip()
+        bad_timezone = timezone.notna() & ~timezone.isin(pytz.all_timezones_set)
+        if bad_timezone.any():
+            raise _bad_rows(bad_timezone, "Unknown timezone")
         
-        db.commit()
-        logger.info("Timezones upload completed successfully")
-        return {"message": "Timezone data uploaded successfully"}
+        stores = pd.DataFrame({'store_id': df['store_id'], 'timezone_str': timezone})
+        stores = stores.drop_duplicates('store_id', keep='last')
+        existing = read_rows(
+            db, "SELECT store_id, timezone_str FROM stores WHERE {store_filter}", {}, stores['store_id'].tolist()
+        ).reindex(columns=['store_id', 'timezone_str'])
+        existing['store_id'] = existing['store_id'].astype(str)
+        
+        merged = stores.merge(existing, on='store_id', how='left', suffixes=('', '_old'), indicator=True)
+        changed = merged[(merged['_merge'] == 'left_only')
+                         | (merged['timezone_str'].fillna('') != merged['timezone_str_old'].fillna(''))]
+        inserted = int((changed['_merge'] == 'left_only').sum())
+        
+        rollups_were_current = rollups_current(db)
+        if len(changed):
+            rows = [(store_id, None if pd.isna(tz) else tz)
+                    for store_id, tz in zip(changed['store_id'], changed['timezone_str'])]
+            db.connection().exec_driver_sql(UPSERT_STORE_SQL, rows)
+        if progress:
+            progress(len(df))
+        
+        if len(changed):
+            bump_data_version(db, STORES)
+            rebuild_rollups(db, changed['store_id'].tolist() if rollups_were_current else None)
+            invalidate_business_hours_index()
+        else:
+            db.commit()
+        logger.info(f"Timezone upload inserted {inserted} and updated {len(changed) - inserted} of {len(stores)} stores")
+        return {
+            'rows_inserted': inserted,
+            'rows_updated': len(changed) - inserted,
+            'rows_unchanged': len(stores) - len(changed),
+        }
     
-    except Exception as e:
+    except Exception:
         db.rollback()
-        logger.error(f"Error during timezones upload: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise
+
+async def _start_upload_job(kind: str, file: UploadFile, ingest) -> Dict:
+    logger.info(f"Queueing {kind} upload for file: {file.filename}")
+    try:
+        path = await save_upload(file)
+    except Exception as e:
+        logger.error(f"Error saving {kind} upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    job_id = submit_upload_job(kind, file.filename, path, ingest)
+    return {"job_id": job_id, "status": "Queued"}
+
+@router.post("/upload/store-status")
+async def upload_store_status(file: UploadFile = File(...)):
+    return await _start_upload_job("store_status", file, ingest_store_status)
+
+@router.post("/stream/store-status")
+async def stream_store_status(request: Request, wait: bool = False):
+    return await ingest_stream(request, wait)
+
+@router.post("/upload/business-hours")
+async def upload_business_hours(file: UploadFile = File(...)):
+    return await _start_upload_job("business_hours", file, ingest_business_hours)
+
+@router.post("/upload/timezones")
+async def upload_timezones(file: UploadFile = File(...)):
+    return await _start_upload_job("timezones", file, ingest_timezones)
+
+@router.get("/upload/status/{job_id}")
+async def get_upload_status(job_id: str):
+    job = get_upload_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job
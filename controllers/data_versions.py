@@ -0,0 +1,29 @@
+from typing import Optional, Tuple
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from models.data_version import DataVersion
+
+STORES = "stores"
+BUSINESS_HOURS = "business_hours"
+STORE_STATUS = "store_status"
+# The store_status version the status_intervals table was last brought up to.
+STATUS_INTERVALS = "status_intervals"
+
+def bump_data_version(db: Session, *names: str):
+    """Increment the counters for the given tables as part of the caller's transaction."""
+    for name in names:
+        stmt = insert(DataVersion).values(name=name, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DataVersion.name],
+            set_={'version': DataVersion.version + 1}
+        )
+        db.execute(stmt)
+
+def set_data_version(db: Session, name: str, version: int):
+    stmt = insert(DataVersion).values(name=name, version=version)
+    stmt = stmt.on_conflict_do_update(index_elements=[DataVersion.name], set_={'version': version})
+    db.execute(stmt)
+
+def get_data_versions(db: Session, *names: str, default: Optional[int] = 0) -> Tuple[Optional[int], ...]:
+    rows = dict(db.query(DataVersion.name, DataVersion.version).filter(DataVersion.name.in_(names)).all())
+    return tuple(rows.get(name, default) for name in names)
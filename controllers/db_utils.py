@@ -0,0 +1,66 @@
+from typing import Dict, List, Optional, Sequence
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytz
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+# Stores per IN list; keeps each statement well under SQLite's bound parameter limit.
+STORE_CHUNK_SIZE = 500
+
+def chunked(values: Sequence, size: int = STORE_CHUNK_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def fetch_frame(conn, query, params: Dict) -> pd.DataFrame:
+    result = conn.execute(query, params)
+    try:
+        # Tuples straight from the DBAPI cursor: on reads of 100k+ rows SQLAlchemy's
+        # row objects cost about as much as the query itself.
+        return pd.DataFrame.from_records(result.cursor.fetchall(), columns=list(result.keys()))
+    finally:
+        result.close()
+
+def read_rows(db: Session, sql: str, params: Dict, store_ids: Optional[Sequence[str]]) -> pd.DataFrame:
+    """Rows of ``sql`` whose ``{store_filter}`` limits them to ``store_ids`` (every store when None)."""
+    conn = db.connection()
+    if store_ids is None:
+        return fetch_frame(conn, text(sql.format(store_filter='1 = 1')), params)
+
+    # One expanding parameter instead of a named one per store keeps statement compilation cheap.
+    query = text(sql.format(store_filter="store_id IN :store_ids")).bindparams(bindparam('store_ids', expanding=True))
+    frames = []
+    for chunk in chunked(list(store_ids)):
+        frames.append(fetch_frame(conn, query, dict(params, store_ids=chunk)))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def to_utc_us(value: datetime) -> int:
+    """Microseconds since the epoch; naive datetimes are UTC."""
+    if value.tzinfo is None:
+        value = pytz.UTC.localize(value)
+    return int(pd.Timestamp(value).value // 1000)
+
+def from_utc_us(value_us: int) -> datetime:
+    """Naive UTC datetime for microseconds since the epoch."""
+    return pd.Timestamp(value_us * 1000).to_pydatetime()
+
+# Timestamps are written in the text layout SQLAlchemy uses for DateTime columns on SQLite.
+
+def as_db_timestamp(value: datetime) -> str:
+    if value.tzinfo is not None:
+        value = value.astimezone(pytz.UTC).replace(tzinfo=None)
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+def db_timestamps(values_us: np.ndarray) -> List[str]:
+    """Database timestamps for UTC microseconds since the epoch."""
+    return np.char.replace(np.datetime_as_string(values_us.astype('datetime64[us]'), unit='us'), 'T', ' ').tolist()
+
+def db_timestamps_us(values: pd.Series) -> np.ndarray:
+    """UTC microseconds since the epoch for database timestamps."""
+    return (pd.to_datetime(values, format='ISO8601').astype('int64') // 1000).to_numpy()
+
+def to_db_timestamps(timestamps: pd.Series) -> np.ndarray:
+    """Database timestamps for a tz-aware datetime series."""
+    values = timestamps.dt.tz_convert(None).to_numpy(dtype='datetime64[us]')
+    return np.char.replace(np.datetime_as_string(values, unit='us'), 'T', ' ')
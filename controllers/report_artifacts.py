@@ -0,0 +1,158 @@
+from typing import Iterable, Iterator, Optional, Tuple
+from datetime import datetime, timedelta
+import gzip
+import hashlib
+import io
+import os
+import pandas as pd
+import pytz
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from models.report import Report
+from metrics import phase
+import logging
+
+logger = logging.getLogger(__name__)
+
+REPORTS_DIR = os.getenv("REPORTS_DIR", "uploads")
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Finished reports beyond the newest REPORT_RETENTION_COUNT, and any report older
+# than REPORT_RETENTION_HOURS, are deleted along with their files.
+REPORT_RETENTION_COUNT = int(os.getenv("REPORT_RETENTION_COUNT", "100"))
+REPORT_RETENTION_HOURS = float(os.getenv("REPORT_RETENTION_HOURS", "168"))
+
+def artifact_path(report_id: str) -> str:
+    return os.path.join(REPORTS_DIR, f"report_{report_id}.csv.gz")
+
+def write_report_artifact(report_id: str, batches: Iterable[pd.DataFrame]) -> Tuple[str, int, str, int]:
+    """Stream report batches into a gzip CSV; returns (path, size in bytes, etag, rows).
+
+    Each batch is compressed and written as soon as it arrives, so only one batch
+    is ever held in memory.
+    """
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    path = artifact_path(report_id)
+    partial = path + ".part"
+    rows = 0
+    try:
+        # mtime=0 and no embedded file name keep the bytes, and so the ETag, stable for identical reports.
+        with open(partial, "wb") as raw, gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0) as compressed, \
+                io.TextIOWrapper(compressed, encoding="utf-8", newline="") as target:
+            for batch in batches:
+                with phase('serialization'):
+                    batch.to_csv(target, header=rows == 0, index=False)
+                rows += len(batch)
+        os.replace(partial, path)
+    except Exception:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(STREAM_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return path, os.path.getsize(path), digest.hexdigest()[:32], rows
+
+def _utcnow() -> datetime:
+    return datetime.now(pytz.UTC).replace(tzinfo=None)
+
+def evict_reports(db: Session) -> int:
+    """Apply the retention policy; returns the number of reports removed."""
+    cutoff = _utcnow() - timedelta(hours=REPORT_RETENTION_HOURS)
+    finished = db.query(Report).filter(Report.status.notin_(('Queued', 'Running'))).order_by(Report.created_at.desc())
+    expired = {report.report_id: report for report in finished.offset(REPORT_RETENTION_COUNT)}
+    # Queued or running reports that outlived the cutoff were orphaned by a restart.
+    for report in db.query(Report).filter(Report.created_at < cutoff):
+        expired[report.report_id] = report
+
+    for report in expired.values():
+        if report.artifact_path and os.path.exists(report.artifact_path):
+            os.remove(report.artifact_path)
+        db.delete(report)
+    db.commit()
+    if expired:
+        logger.info(f"Evicted {len(expired)} report artifacts")
+    return len(expired)
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) for a single ``bytes=`` range; None to serve the whole body."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+def iter_file(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as source:
+        source.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = source.read(min(STREAM_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def iter_decompressed(path: str) -> Iterator[bytes]:
+    with gzip.open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(STREAM_CHUNK_BYTES), b""):
+            yield chunk
+
+def _accepts_gzip(request: Request) -> bool:
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def artifact_response(report: Report, request: Request) -> Response:
+    """Stream a stored report; gzip bytes as-is (with Range support) or decompressed on the fly."""
+    if not report.artifact_path or not os.path.exists(report.artifact_path):
+        raise HTTPException(status_code=404, detail="Report artifact no longer available")
+
+    gzipped = _accepts_gzip(request)
+    etag = f'"{report.etag}"' if gzipped else f'"{report.etag}-identity"'
+    headers = {
+        "Content-Disposition": f"attachment; filename=report_{report.report_id}.csv",
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    if not gzipped:
+        return StreamingResponse(iter_decompressed(report.artifact_path), media_type="text/csv", headers=headers)
+
+    size = report.size_bytes
+    headers.update({"Content-Encoding": "gzip", "Accept-Ranges": "bytes"})
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        byte_range = parse_range(range_header, size)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(iter_file(report.artifact_path, 0, size - 1), media_type="text/csv",
+                                 headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(iter_file(report.artifact_path, start, end), status_code=206,
+                             media_type="text/csv", headers=headers)
@@ -1,30 +1,63 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from typing import Dict, List
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Iterator, Optional, Tuple
 import uuid
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import pytz
 from models.store import Store
-from models.business_hours import BusinessHours
 from models.store_status import StoreStatus
 from models.report import Report
 from database import get_db
+from controllers.uptime_engine import (
+    REPORT_WINDOWS, US_PER_SECOND, format_windows, get_current_time, intervals_current, parse_windows,
+)
+from controllers.business_hours_index import store_business_hours, store_weekly_hours
+from controllers.report_shards import REPORT_BATCH_STORES, REPORT_PROGRESS_STORES, iter_report_shards, store_batches
+from controllers.uptime_rollups import build_report_from_rollups, rollups_current
+from controllers.snapshots import build_report_from_snapshot, snapshot_current, snapshot_store_ids
+from controllers.report_artifacts import artifact_response, evict_reports, write_report_artifact
+from controllers.status_intervals import store_points
+from controllers.data_versions import BUSINESS_HOURS, STORE_STATUS, STORES, get_data_versions
+from controllers.db_utils import to_utc_us
+from controllers.report_scheduler import QueueFull, ReportCancelled, ReportJob, report_scheduler
+from controllers.store_uptime import cached_store_uptime
+from controllers.availability import (
+    ARROW_STREAM_TYPE, availability_arrow, availability_frame, availability_json, parse_bucket,
+)
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from fastapi import Depends
-from fastapi.responses import StreamingResponse
-import io
+import metrics
+import os
+import time
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-reports: Dict[str, Dict] = {}
+
+# 'rollup' sums the hourly rollup table when it is current; 'raw' always scans the status intervals;
+# 'snapshot' memory-maps REPORT_SNAPSHOT_DIR when it matches the database, else uses rollups.
+REPORT_SOURCE = os.getenv("REPORT_SOURCE", "rollup")
+REPORT_SNAPSHOT_DIR = os.getenv("REPORT_SNAPSHOT_DIR")
 
 def calculate_uptime_downtime(store_id: str, start_time: datetime, end_time: datetime, db: Session) -> Dict:
+    """Business-hours minutes of one store from the day-by-day walk over its business hours.
+
+    Only polls inside the window count and the last poll of a business day runs
+    to that day's close. Reports follow each store's status timeline instead;
+    see ``timeline_uptime_downtime``.
+    """
+    with metrics.STORE_UPTIME_SECONDS.time(source='store'):
+        return _calculate_uptime_downtime(store_id, start_time, end_time, db)
+
+def _calculate_uptime_downtime(store_id: str, start_time: datetime, end_time: datetime, db: Session) -> Dict:
     try:
-        store = db.query(Store).filter(Store.store_id == store_id).first()
-        timezone = pytz.timezone(store.timezone_str if store else 'America/Chicago')
+        timezone, weekly_hours = store_weekly_hours(db, store_id)
         
         if start_time.tzinfo is None:
             start_time = pytz.UTC.localize(start_time)
@@ -36,15 +69,16 @@ def calculate_uptime_downtime(store_id: str, start_time: datetime, end_time: dat
         else:
             end_time = end_time.astimezone(pytz.UTC)
         
-        business_hours = db.query(BusinessHours).filter(BusinessHours.store_id == store_id).all()
-        status_records = db.query(StoreStatus).filter(
+        status_records = db.query(StoreStatus.timestamp_utc, StoreStatus.status).filter(
             StoreStatus.store_id == store_id,
             StoreStatus.timestamp_utc >= start_time,
             StoreStatus.timestamp_utc <= end_time
         ).order_by(StoreStatus.timestamp_utc).all()
+        timestamps = np.array([to_utc_us(record.timestamp_utc) for record in status_records], dtype=np.int64)
+        active = np.array([record.status == 'active' for record in status_records], dtype=bool)
         
-        total_uptime = timedelta()
-        total_downtime = timedelta()
+        total_uptime = 0
+        total_downtime = 0
         
         current_time = start_time
         day_count = 0
@@ -53,150 +87,343 @@ def calculate_uptime_downtime(store_id: str, start_time: datetime, end_time: dat
         while current_time < end_time and day_count < max_days:
             day_count += 1
             local_time = current_time.astimezone(timezone)
-            day_of_week = local_time.weekday()
-            
-            day_hours = next((bh for bh in business_hours if bh.day == day_of_week), None)
+            day_hours = weekly_hours.get(local_time.weekday())
             
             if day_hours:
-                start_time_parts = day_hours.start_time_local.split(':')
-                end_time_parts = day_hours.end_time_local.split(':')
-                
-                start_hour = int(start_time_parts[0])
-                start_minute = int(start_time_parts[1])
-                end_hour = int(end_time_parts[0])
-                end_minute = int(end_time_parts[1])
-                
+                start_hour, start_minute, end_hour, end_minute = day_hours
                 business_start = local_time.replace(hour=start_hour, minute=start_minute, second=0, microsecond=0)
                 business_end = local_time.replace(hour=end_hour, minute=end_minute, second=0, microsecond=0)
                 
-                if business_start.tzinfo is None:
-                    business_start = timezone.localize(business_start)
-                if business_end.tzinfo is None:
-                    business_end = timezone.localize(business_end)
-                
                 if business_end < business_start:
                     business_end += timedelta(days=1)
                 
-                period_records = [r for r in status_records if 
-                                business_start <= r.timestamp_utc.astimezone(timezone) <= business_end]
-                
-                if period_records:
-                    for i in range(len(period_records) - 1):
-                        current_record = period_records[i]
-                        next_record = period_records[i + 1]
-                        duration = next_record.timestamp_utc - current_record.timestamp_utc
-                        
-                        if current_record.status == 'active':
-                            total_uptime += duration
-                        else:
-                            total_downtime += duration
-                    
-                    last_record = period_records[-1]
-                    duration = business_end - last_record.timestamp_utc.astimezone(timezone)
-                    if last_record.status == 'active':
-                        total_uptime += duration
-                    else:
-                        total_downtime += duration
+                # Polls inside the business period; each runs to the next one and the last to the period end.
+                period_end = to_utc_us(business_end)
+                first = np.searchsorted(timestamps, to_utc_us(business_start), side='left')
+                last = np.searchsorted(timestamps, period_end, side='right')
+                durations = np.diff(timestamps[first:last], append=period_end)
+                period_active = active[first:last]
+                total_uptime += int(durations[period_active].sum())
+                total_downtime += int(durations[~period_active].sum())
                 
                 current_time = business_end.astimezone(pytz.UTC)
             else:
                 current_time = end_time
         
         return {
-            'uptime': total_uptime.total_seconds() / 60,
-            'downtime': total_downtime.total_seconds() / 60
+            'uptime': total_uptime / US_PER_SECOND / 60,
+            'downtime': total_downtime / US_PER_SECOND / 60
         }
     
     except Exception as e:
         logger.error(f"Error calculating uptime/downtime for store {store_id}: {str(e)}")
         raise
 
-def generate_report(report_id: str, db: Session):
+def timeline_uptime_downtime(store_id: str, start_time: datetime, end_time: datetime, db: Session) -> Dict:
+    """Business-hours minutes of one store as the report engine computes them: each poll holds
+    until the next, the window opens with the last poll before it, and everything is clipped to the window."""
     try:
-        logger.info(f"Starting report generation for report_id: {report_id}")
+        if start_time.tzinfo is None:
+            start_time = pytz.UTC.localize(start_time)
+        else:
+            start_time = start_time.astimezone(pytz.UTC)
+            
+        if end_time.tzinfo is None:
+            end_time = pytz.UTC.localize(end_time)
+        else:
+            end_time = end_time.astimezone(pytz.UTC)
         
-        stores = db.query(Store).all()
-        max_timestamp = db.query(StoreStatus.timestamp_utc).order_by(StoreStatus.timestamp_utc.desc()).first()
-        if not max_timestamp:
-            raise ValueError("No store status records found")
-        current_time = max_timestamp[0]
+        start_us, end_us = to_utc_us(start_time), to_utc_us(end_time)
+        hours_start, hours_end = store_business_hours(db, store_id, start_time, end_time)
         
-        report_data = []
-        total_stores = len(stores)
+        if intervals_current(db):
+            records = store_points(db, store_id, start_time, end_time)
+        else:
+            # The last update before the window gives the status the window opens with.
+            previous = db.query(StoreStatus).filter(
+                StoreStatus.store_id == store_id,
+                StoreStatus.timestamp_utc < start_time
+            ).order_by(StoreStatus.timestamp_utc.desc()).first()
+            status_records = db.query(StoreStatus).filter(
+                StoreStatus.store_id == store_id,
+                StoreStatus.timestamp_utc >= start_time,
+                StoreStatus.timestamp_utc <= end_time
+            ).order_by(StoreStatus.timestamp_utc).all()
+            records = [(record.timestamp_utc, record.status) for record in ([previous] if previous else []) + status_records]
         
-        for index, store in enumerate(stores, 1):
-            logger.info(f"Calculating for store {store.store_id}")
-            
-            last_hour = calculate_uptime_downtime(
-                store.store_id,
-                current_time - timedelta(hours=1),
-                current_time,
-                db
-            )
-            
-            last_day = calculate_uptime_downtime(
-                store.store_id,
-                current_time - timedelta(days=1),
-                current_time,
-                db
-            )
-            
-            last_week = calculate_uptime_downtime(
-                store.store_id,
-                current_time - timedelta(weeks=1),
-                current_time,
-                db
-            )
-            
-            report_data.append({
-                'store_id': store.store_id,
-                'uptime_last_hour': last_hour['uptime'],
-                'uptime_last_day': last_day['uptime'] / 60,
-                'uptime_last_week': last_week['uptime'] / 60,
-                'downtime_last_hour': last_hour['downtime'],
-                'downtime_last_day': last_day['downtime'] / 60,
-                'downtime_last_week': last_week['downtime'] / 60
-            })
+        total_uptime = 0
+        total_downtime = 0
         
-        df = pd.DataFrame(report_data)
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False)
-        csv_content = csv_buffer.getvalue()
+        for i, (timestamp, status) in enumerate(records):
+            span_start = max(to_utc_us(timestamp), start_us)
+            span_end = to_utc_us(records[i + 1][0]) if i + 1 < len(records) else end_us
+            span_end = min(span_end, end_us)
+            if span_end <= span_start:
+                continue
+            
+            overlap = np.minimum(hours_end, span_end) - np.maximum(hours_start, span_start)
+            business_time = int(np.clip(overlap, 0, None).sum())
+            if status == 'active':
+                total_uptime += business_time
+            else:
+                total_downtime += business_time
         
-        reports[report_id] = {
-            'status': 'Complete',
-            'data': csv_content
+        return {
+            'uptime': total_uptime / US_PER_SECOND / 60,
+            'downtime': total_downtime / US_PER_SECOND / 60
         }
-        logger.info(f"Report generation completed for report_id: {report_id}")
+    
+    except Exception as e:
+        logger.error(f"Error calculating uptime/downtime for store {store_id}: {str(e)}")
+        raise
+
+def report_batches(db: Session, current_time: datetime, windows=REPORT_WINDOWS,
+                   batch_stores: int = REPORT_BATCH_STORES) -> Tuple[str, Iterator[pd.DataFrame]]:
+    """Pick the report source and return it with a lazy iterator of report batches in store order."""
+    if REPORT_SOURCE == 'snapshot' and REPORT_SNAPSHOT_DIR and snapshot_current(db, REPORT_SNAPSHOT_DIR):
+        batches = store_batches(snapshot_store_ids(REPORT_SNAPSHOT_DIR), batch_stores)
+        return 'snapshot', (build_report_from_snapshot(REPORT_SNAPSHOT_DIR, current_time, batch, windows)
+                            for batch in batches)
+    if REPORT_SOURCE in ('rollup', 'snapshot') and rollups_current(db):
+        store_ids = [row[0] for row in db.execute(text("SELECT store_id FROM stores ORDER BY store_id"))]
+        return 'rollup', (build_report_from_rollups(db, current_time, batch, windows)
+                          for batch in store_batches(store_ids, batch_stores))
+    return 'raw', iter_report_shards(db, current_time, batch_stores=batch_stores, windows=windows)
+
+def _timed_batches(batches: Iterator[pd.DataFrame], source: str) -> Iterator[pd.DataFrame]:
+    """Pass batches through, observing each one's compute time per store as store_uptime_seconds{source}."""
+    batches = iter(batches)
+    while True:
+        started = time.perf_counter()
+        batch = next(batches, None)
+        if batch is None:
+            return
+        if len(batch):
+            metrics.STORE_UPTIME_SECONDS.observe((time.perf_counter() - started) / len(batch), source=source)
+        yield batch
+
+def _finish_report(db: Session, report_id: str, status: str, error: Optional[str] = None, **fields) -> bool:
+    """Move a queued or running report to ``status``; False when it already finished, e.g. cancelled
+    through the database by another process."""
+    finished = db.query(Report).filter(
+        Report.report_id == report_id,
+        Report.status.in_(('Queued', 'Running'))
+    ).update({
+        'status': status,
+        'error': error,
+        'completed_at': datetime.now(pytz.UTC).replace(tzinfo=None),
+        **fields,
+    }, synchronize_session=False)
+    db.commit()
+    return bool(finished)
+
+def generate_report(report_id: str, db: Session, job: Optional[ReportJob] = None):
+    """Compute a queued report with the caller's session; ``job`` reports progress and carries cancellation."""
+    started = time.perf_counter()
+    try:
+        report = db.get(Report, report_id)
+        if report is None or report.status != 'Queued':
+            logger.info(f"Report {report_id} is no longer queued, skipping")
+            return
+        report.status = 'Running'
+        db.commit()
+        logger.info(f"Starting report generation for report_id: {report_id}")
+        
+        current_time = get_current_time(db)
+        if current_time is None:
+            raise ValueError("No store status records found")
+        
+        windows = parse_windows(report.windows)
+        with metrics.profiled(f"report_{report_id}"):
+            # Batches are computed and written one at a time, so memory stays flat as the fleet grows.
+            # A scheduled job uses smaller ones, which are its progress and cancellation steps.
+            batch_stores = REPORT_BATCH_STORES if job is None else min(REPORT_BATCH_STORES, REPORT_PROGRESS_STORES)
+            source, batches = report_batches(db, current_time, windows, batch_stores)
+            batches = _timed_batches(batches, source)
+            if job is not None:
+                job.rows_total = db.execute(text("SELECT COUNT(*) FROM stores")).scalar()
+                batches = job.track(batches)
+            path, size, etag, rows = write_report_artifact(report_id, batches)
+        metrics.REPORT_SECONDS.observe(time.perf_counter() - started, source=source)
+        metrics.REPORT_STORES.set(rows)
+        
+        if _finish_report(db, report_id, 'Complete', artifact_path=path, size_bytes=size, etag=etag):
+            metrics.REPORTS_TOTAL.inc(outcome='computed')
+            logger.info(f"Report generation completed for report_id: {report_id} ({size} bytes)")
+        else:
+            os.remove(path)
+            logger.info(f"Report {report_id} was finished elsewhere while it ran, discarding its artifact")
         
+    except ReportCancelled:
+        logger.info(f"Report {report_id} cancelled")
+        metrics.REPORTS_TOTAL.inc(outcome='cancelled')
+        db.rollback()
+        _finish_report(db, report_id, 'Cancelled')
     except Exception as e:
         logger.error(f"Error during report generation: {str(e)}")
-        reports[report_id] = {
-            'status': 'Failed',
-            'error': str(e)
-        }
+        metrics.REPORTS_TOTAL.inc(outcome='failed')
+        db.rollback()
+        _finish_report(db, report_id, 'Failed', str(e))
+    
+    try:
+        evict_reports(db)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error applying report retention: {str(e)}")
+
+def current_data_version(db: Session) -> str:
+    return '.'.join(str(v) for v in get_data_versions(db, STORE_STATUS, BUSINESS_HOURS, STORES))
+
+def find_reusable_report(db: Session, data_version: str, windows: str) -> Optional[Report]:
+    """A finished or in-flight report for the same input data and windows, newest first.
+
+    Only reports this process's scheduler holds are joined: the queue lives in
+    memory, so a queued or running row left by a restart or another worker may
+    never finish.
+    """
+    candidates = db.query(Report).filter(
+        Report.data_version == data_version,
+        Report.windows == windows,
+        Report.status.in_(('Queued', 'Running', 'Complete'))
+    ).order_by(Report.created_at.desc()).all()
+    for report in candidates:
+        if report.status == 'Complete' and report.artifact_path and os.path.exists(report.artifact_path):
+            return report
+        if report.status in ('Queued', 'Running') and report_scheduler.get(report.report_id) is not None:
+            return report
+    return None
 
 @router.post("/trigger_report")
-async def trigger_report(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def trigger_report(windows: Optional[str] = None, priority: int = 0, db: Session = Depends(get_db)):
+    try:
+        windows = format_windows(parse_windows(windows))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Nothing here awaits, so the lookup and the insert cannot interleave with
+    # another trigger on this event loop.
+    data_version = current_data_version(db)
+    existing = find_reusable_report(db, data_version, windows)
+    if existing is not None:
+        logger.info(f"Reusing {existing.status.lower()} report {existing.report_id} for data version {data_version}")
+        metrics.REPORTS_TOTAL.inc(outcome='reused' if existing.status == 'Complete' else 'joined')
+        return {"report_id": existing.report_id}
+    
     report_id = str(uuid.uuid4())
-    reports[report_id] = {'status': 'Running'}
-    background_tasks.add_task(generate_report, report_id, db)
+    db.add(Report(
+        report_id=report_id,
+        status='Queued',
+        created_at=datetime.now(pytz.UTC).replace(tzinfo=None),
+        data_version=data_version,
+        windows=windows
+    ))
+    db.commit()
+    try:
+        report_scheduler.submit(report_id, priority)
+    except QueueFull as e:
+        db.delete(db.get(Report, report_id))
+        db.commit()
+        metrics.REPORTS_TOTAL.inc(outcome='rejected')
+        raise HTTPException(status_code=503, detail=f"Report queue is full: {str(e)}", headers={"Retry-After": "5"})
     return {"report_id": report_id}
 
 @router.get("/get_report/{report_id}")
-async def get_report(report_id: str):
-    if report_id not in reports:
+async def get_report(report_id: str, request: Request, db: Session = Depends(get_db)):
+    report = db.get(Report, report_id)
+    if report is None:
         raise HTTPException(status_code=404, detail="Report not found")
     
-    report = reports[report_id]
-    
-    if report['status'] == 'Running':
-        return {"status": "Running"}
-    elif report['status'] == 'Failed':
-        raise HTTPException(status_code=500, detail=f"Report generation failed: {report['error']}")
+    if report.status == 'Queued':
+        return {"status": "Queued", "progress": 0.0, "queue_position": report_scheduler.queue_position(report_id)}
+    elif report.status == 'Running':
+        job = report_scheduler.get(report_id)
+        return {"status": "Running", "progress": job.progress() if job is not None else None}
+    elif report.status == 'Cancelled':
+        raise HTTPException(status_code=410, detail="Report was cancelled")
+    elif report.status == 'Failed':
+        raise HTTPException(status_code=500, detail=f"Report generation failed: {report.error}")
     else:
-        return StreamingResponse(
-            io.StringIO(report['data']),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=report_{report_id}.csv"}
-        )
\ No newline at end of file
+        return artifact_response(report, request)
+
+@router.post("/cancel_report/{report_id}")
+async def cancel_report(report_id: str, db: Session = Depends(get_db)):
+    report = db.get(Report, report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if report.status not in ('Queued', 'Running'):
+        raise HTTPException(status_code=409, detail=f"Report is already {report.status.lower()}")
+    
+    state = report_scheduler.cancel(report_id)
+    if state == 'Running':
+        # The job stops before its next batch and records the cancellation itself.
+        return {"report_id": report_id, "status": "Cancelling"}
+    # Queued here, or left behind by another process: nothing will pick it up.
+    if not _finish_report(db, report_id, 'Cancelled'):
+        raise HTTPException(status_code=409, detail="Report finished before it could be cancelled")
+    metrics.REPORTS_TOTAL.inc(outcome='cancelled')
+    return {"report_id": report_id, "status": "Cancelled"}
+
+def store_uptime(db: Session, store_id: str, windows: Optional[str]) -> Dict:
+    try:
+        parsed = parse_windows(windows)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if db.get(Store, store_id) is None:
+        raise HTTPException(status_code=404, detail="Store not found")
+    current_time = get_current_time(db)
+    if current_time is None:
+        raise HTTPException(status_code=404, detail="No store status records found")
+    
+    data_version = current_data_version(db)
+    row = cached_store_uptime(db, store_id, current_time, data_version, parsed)
+    return {
+        **row,
+        'windows': format_windows(parsed),
+        'current_time': pytz.UTC.localize(current_time).isoformat(),
+        'data_version': data_version,
+    }
+
+@router.get("/stores/{store_id}/uptime")
+async def get_store_uptime(store_id: str, windows: Optional[str] = None, db: Session = Depends(get_db)):
+    """One store's uptime and downtime over the report windows, computed on demand and cached."""
+    # Every query, cache hit or not, runs off the event loop.
+    return await run_in_threadpool(store_uptime, db, store_id, windows)
+
+@router.get("/availability")
+async def get_availability(request: Request, bucket: Optional[str] = None, start: Optional[datetime] = None,
+                           end: Optional[datetime] = None, store_ids: Optional[str] = None,
+                           format: Optional[str] = None, db: Session = Depends(get_db)):
+    """Share of stores active in each bucket, across the fleet or the listed stores, as columnar JSON or Arrow."""
+    if format is None:
+        format = 'arrow' if ARROW_STREAM_TYPE in request.headers.get('accept', '') else 'json'
+    if format not in ('json', 'arrow'):
+        raise HTTPException(status_code=400, detail="format must be json or arrow")
+    try:
+        bucket_span = parse_bucket(bucket)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    current_time = get_current_time(db)
+    if current_time is None:
+        raise HTTPException(status_code=404, detail="No store status records found")
+    ids = None
+    if store_ids is not None:
+        ids = sorted({part.strip() for part in store_ids.split(',') if part.strip()})
+        if not ids:
+            raise HTTPException(status_code=400, detail="store_ids is empty")
+
+    try:
+        # A week of 15m buckets for a large fleet is most of a second of CPU; keep it off the event loop.
+        frame, stores = await run_in_threadpool(availability_frame, db, bucket_span, start, end, current_time, ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if ids is not None and not stores:
+        raise HTTPException(status_code=404, detail="None of the stores were found")
+    meta = {
+        'bucket': bucket or '15m',
+        'current_time': pytz.UTC.localize(current_time).isoformat(),
+        'data_version': current_data_version(db),
+        'stores': stores,
+    }
+    if format == 'arrow':
+        return Response(content=availability_arrow(frame, meta), media_type=ARROW_STREAM_TYPE)
+    return availability_json(frame, meta)
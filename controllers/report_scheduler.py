@@ -0,0 +1,155 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+import heapq
+import itertools
+import os
+import threading
+import pandas as pd
+from database import SessionLocal
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Reports computed at once; each holds a database connection and, on the raw path, REPORT_WORKERS processes.
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+# Queued reports beyond this are turned away until the queue drains.
+REPORT_QUEUE_LIMIT = int(os.getenv("REPORT_QUEUE_LIMIT", "64"))
+
+class ReportCancelled(Exception):
+    pass
+
+class QueueFull(Exception):
+    pass
+
+class ReportJob:
+    """In-process state of a queued or running report: its place in the queue, progress and cancel flag."""
+
+    def __init__(self, report_id: str, priority: int, seq: int):
+        self.report_id = report_id
+        self.priority = priority
+        self.seq = seq
+        self.state = 'Queued'
+        self.rows_done = 0
+        self.rows_total = 0
+        self.cancelled = threading.Event()
+
+    def progress(self) -> float:
+        if self.state == 'Queued' or not self.rows_total:
+            return 0.0
+        return round(min(100.0, 100.0 * self.rows_done / self.rows_total), 1)
+
+    def track(self, batches: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """Count rows as batches pass through; a cancel takes effect before the next batch."""
+        for batch in batches:
+            if self.cancelled.is_set():
+                raise ReportCancelled()
+            yield batch
+            self.rows_done += len(batch)
+        if self.cancelled.is_set():
+            raise ReportCancelled()
+
+class ReportScheduler:
+    """A bounded pool of report threads fed from a priority queue (higher priority first, then FIFO).
+
+    Each job opens its own session, so nothing depends on the request that
+    triggered it.
+    """
+
+    def __init__(self, workers: int = REPORT_JOB_WORKERS, queue_limit: int = REPORT_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._heap: List = []
+        self._jobs: Dict[str, ReportJob] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    def _start(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        self._stopping = False
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"report-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, report_id: str, priority: int = 0) -> ReportJob:
+        with self._lock:
+            queued = sum(1 for job in self._jobs.values() if job.state == 'Queued')
+            if queued >= self.queue_limit:
+                raise QueueFull(f"{queued} reports are already queued")
+            job = ReportJob(report_id, priority, next(self._seq))
+            self._jobs[report_id] = job
+            heapq.heappush(self._heap, (-priority, job.seq, report_id))
+            self._start()
+            self._ready.notify()
+        return job
+
+    def get(self, report_id: str) -> Optional[ReportJob]:
+        with self._lock:
+            return self._jobs.get(report_id)
+
+    def queue_position(self, report_id: str) -> Optional[int]:
+        """1 for the next report to start, None when the report is not waiting here."""
+        with self._lock:
+            job = self._jobs.get(report_id)
+            if job is None or job.state != 'Queued':
+                return None
+            ahead = [other for other in self._jobs.values() if other.state == 'Queued'
+                     and (-other.priority, other.seq) < (-job.priority, job.seq)]
+            return len(ahead) + 1
+
+    def cancel(self, report_id: str) -> Optional[str]:
+        """Flag a report as cancelled; returns the state it was in, or None if this process does not run it."""
+        with self._lock:
+            job = self._jobs.get(report_id)
+            if job is None:
+                return None
+            job.cancelled.set()
+            state = job.state
+            if state == 'Queued':
+                job.state = 'Cancelled'
+                del self._jobs[report_id]
+            return state
+
+    def stop(self, timeout: Optional[float] = None):
+        """Let running reports finish and end the threads; queued reports stay queued in the database."""
+        with self._lock:
+            self._stopping = True
+            self._ready.notify_all()
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join(timeout)
+
+    def _next(self) -> Optional[ReportJob]:
+        with self._lock:
+            while True:
+                if self._stopping:
+                    return None
+                while self._heap:
+                    _, _, report_id = heapq.heappop(self._heap)
+                    job = self._jobs.get(report_id)
+                    # Cancelled while queued: already dropped from _jobs.
+                    if job is not None and job.state == 'Queued':
+                        job.state = 'Running'
+                        return job
+                self._ready.wait()
+
+    def _run(self):
+        from controllers.report_controller import generate_report
+
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            db = SessionLocal()
+            try:
+                generate_report(job.report_id, db, job)
+            except Exception as e:
+                logger.error(f"Report job {job.report_id} crashed: {str(e)}")
+            finally:
+                db.close()
+                with self._lock:
+                    self._jobs.pop(job.report_id, None)
+
+report_scheduler = ReportScheduler()
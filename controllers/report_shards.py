@@ -0,0 +1,70 @@
+from typing import Iterator, List, Optional, Sequence, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import repeat
+import multiprocessing
+import os
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session, sessionmaker
+from database import SQLALCHEMY_DATABASE_URL, make_engine
+from controllers.uptime_engine import REPORT_WINDOWS, build_report
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Processes for reports from the raw source; rollup and snapshot reports are cheap aggregates computed in-process.
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "1"))
+SHARDS_PER_WORKER = int(os.getenv("REPORT_SHARDS_PER_WORKER", "2"))
+# Stores per report batch; one batch's status rows bound the report's peak memory.
+REPORT_BATCH_STORES = int(os.getenv("REPORT_BATCH_STORES", "5000"))
+# Stores per step of a scheduled report: its progress moves and a cancel takes effect after each step.
+REPORT_PROGRESS_STORES = int(os.getenv("REPORT_PROGRESS_STORES", "500"))
+
+def split_shards(store_ids: Sequence[str], shard_count: int) -> List[List[str]]:
+    """Contiguous shards, so concatenating results keeps the serial store order."""
+    shard_count = max(1, min(shard_count, len(store_ids)))
+    size, extra = divmod(len(store_ids), shard_count)
+    shards, start = [], 0
+    for i in range(shard_count):
+        end = start + size + (1 if i < extra else 0)
+        shards.append(list(store_ids[start:end]))
+        start = end
+    return shards
+
+def store_batches(store_ids: Sequence[str], batch_stores: int = REPORT_BATCH_STORES) -> List[Optional[List[str]]]:
+    """Contiguous batches of at most ``batch_stores``; a fleet that fits in one batch is ``[None]`` (all stores)."""
+    if len(store_ids) <= batch_stores:
+        return [None]
+    return split_shards(store_ids, -(-len(store_ids) // batch_stores))
+
+def _run_shard(database_url: str, store_ids: List[str], current_time: datetime,
+               windows: Sequence[Tuple[str, timedelta]]) -> pd.DataFrame:
+    # Each worker process owns its engine; connections must never cross a fork.
+    engine = make_engine(database_url)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        return build_report(db, current_time, store_ids, windows=windows)
+    finally:
+        db.close()
+        engine.dispose()
+
+def iter_report_shards(db: Session, current_time: datetime, workers: int = REPORT_WORKERS,
+                       database_url: str = SQLALCHEMY_DATABASE_URL,
+                       batch_stores: int = REPORT_BATCH_STORES,
+                       windows: Sequence[Tuple[str, timedelta]] = REPORT_WINDOWS) -> Iterator[pd.DataFrame]:
+    """Report rows shard by shard, in store order, so callers can write them out as they arrive."""
+    store_ids = [row[0] for row in db.execute(text("SELECT store_id FROM stores ORDER BY store_id"))]
+    if workers <= 1 or len(store_ids) < 2:
+        for batch in store_batches(store_ids, batch_stores):
+            yield build_report(db, current_time, batch, cached_index=True, windows=windows)
+        return
+
+    shard_count = max(workers * SHARDS_PER_WORKER, -(-len(store_ids) // batch_stores))
+    shards = split_shards(store_ids, shard_count)
+    logger.info(f"Computing report for {len(store_ids)} stores in {len(shards)} shards on {workers} workers")
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # map yields in submission order, which keeps the serial store order.
+        yield from pool.map(_run_shard, repeat(database_url), shards, repeat(current_time), repeat(windows))
@@ -0,0 +1,338 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from datetime import datetime, timedelta
+import json
+import os
+import shutil
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+import pytz
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from controllers.business_hours_index import business_hours_index_from_frames, invalidate_business_hours_index
+from controllers.data_versions import (
+    BUSINESS_HOURS, STORE_STATUS, STORES, bump_data_version, get_data_versions, set_data_version,
+)
+from controllers.uptime_engine import REPORT_WINDOWS, FleetData, compute_report, status_queries
+from controllers.uptime_rollups import rebuild_rollups
+from controllers.status_intervals import rebuild_intervals
+from controllers.status_ingest import rebuild_watermarks
+from controllers.csv_controller import INSERT_HOURS_SQL
+from controllers.db_utils import to_db_timestamps, to_utc_us
+from metrics import phase
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+EXPORT_CHUNK_ROWS = 500_000
+
+# 'arrow' files are uncompressed Arrow IPC and are memory-mapped without decoding;
+# 'parquet' is smaller on disk but has to be decoded on read.
+SNAPSHOT_FORMATS = {'arrow': ('ipc', '.arrow'), 'parquet': ('parquet', '.parquet')}
+
+# The snapshot the database last matched and the data versions it matched at.
+SNAPSHOT_ID = "snapshot_id"
+SNAPSHOT_VERSIONS = ("snapshot_store_status", "snapshot_business_hours", "snapshot_stores")
+
+STORES_SCHEMA = pa.schema([
+    ('store_id', pa.string()),
+    ('timezone_str', pa.string()),
+    # Earliest status row per store, so carry-in lookups know when to stop searching.
+    ('first_status_utc', pa.timestamp('us', tz='UTC')),
+])
+HOURS_SCHEMA = pa.schema([
+    ('store_id', pa.string()),
+    ('day', pa.int64()),
+    ('start_time_local', pa.string()),
+    ('end_time_local', pa.string()),
+])
+STATUS_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('store_id', pa.string()),
+    ('timestamp_utc', pa.timestamp('us', tz='UTC')),
+    ('status', pa.string()),
+])
+DAY_PARTITIONING = ds.partitioning(pa.schema([('day', pa.string())]), flavor='hive')
+
+def _writer(path: str, schema: pa.Schema, fmt: str):
+    if fmt == 'arrow':
+        return ipc.new_file(path, schema)
+    return pq.ParquetWriter(path, schema, compression='zstd')
+
+def _write_table(path: str, table: pa.Table, fmt: str):
+    writer = _writer(path, table.schema, fmt)
+    try:
+        writer.write_table(table)
+    finally:
+        writer.close()
+
+def _to_utc(values: pd.Series) -> pd.Series:
+    return pd.to_datetime(values, format='ISO8601', utc=True).astype('datetime64[us, UTC]')
+
+def _export_status(db: Session, target: str, fmt: str) -> Tuple[List[str], int]:
+    """Write store_status as one file per UTC day, streaming the table in timestamp order.
+
+    With current status intervals each run is written as its first and last poll.
+    """
+    extension = SNAPSHOT_FORMATS[fmt][1]
+    days, rows, writer, current_day = [], 0, None, None
+    try:
+        for chunk in pd.read_sql_query(
+            text(status_queries(db)['all']),
+            db.connection(),
+            chunksize=EXPORT_CHUNK_ROWS,
+        ):
+            chunk['store_id'] = chunk['store_id'].astype(str)
+            chunk['timestamp_utc'] = _to_utc(chunk['timestamp_utc'])
+            for day, part in chunk.groupby(chunk['timestamp_utc'].dt.floor('D'), sort=True):
+                day = day.strftime('%Y-%m-%d')
+                if day != current_day:
+                    if writer is not None:
+                        writer.close()
+                    directory = os.path.join(target, STORE_STATUS, f"day={day}")
+                    os.makedirs(directory)
+                    writer = _writer(os.path.join(directory, f"part-0{extension}"), STATUS_SCHEMA, fmt)
+                    current_day = day
+                    days.append(day)
+                writer.write_table(pa.Table.from_pandas(part, schema=STATUS_SCHEMA, preserve_index=False))
+                rows += len(part)
+    finally:
+        if writer is not None:
+            writer.close()
+    return days, rows
+
+def export_snapshot(db: Session, path: str, fmt: str = 'arrow') -> Dict:
+    """Write stores, business_hours and store_status (partitioned by UTC day) to ``path``.
+
+    Everything is read in one transaction, and the directory only appears once complete.
+    """
+    if fmt not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unknown snapshot format {fmt}; expected one of {sorted(SNAPSHOT_FORMATS)}")
+    if os.path.exists(path):
+        raise ValueError(f"{path} already exists")
+    extension = SNAPSHOT_FORMATS[fmt][1]
+    target = f"{path}.partial-{uuid.uuid4().hex[:8]}"
+    os.makedirs(target)
+
+    try:
+        versions = get_data_versions(db, STORE_STATUS, BUSINESS_HOURS, STORES)
+        conn = db.connection()
+        sql = status_queries(db)
+        stores = pd.read_sql_query(text(
+            f"SELECT store_id, timezone_str, ({sql['first']}) AS first_status_utc FROM stores ORDER BY store_id"
+        ), conn)
+        stores['store_id'] = stores['store_id'].astype(str)
+        stores['first_status_utc'] = _to_utc(stores['first_status_utc'])
+        hours = pd.read_sql_query(text(
+            "SELECT store_id, day, start_time_local, end_time_local FROM business_hours "
+            "ORDER BY store_id, day, start_time_local"
+        ), conn)
+        hours['store_id'] = hours['store_id'].astype(str)
+        _write_table(os.path.join(target, f"{STORES}{extension}"),
+                     pa.Table.from_pandas(stores, schema=STORES_SCHEMA, preserve_index=False), fmt)
+        _write_table(os.path.join(target, f"{BUSINESS_HOURS}{extension}"),
+                     pa.Table.from_pandas(hours, schema=HOURS_SCHEMA, preserve_index=False), fmt)
+        days, status_rows = _export_status(db, target, fmt)
+
+        bounds = db.execute(text(sql['bounds'])).first()
+        manifest = {
+            'snapshot_id': uuid.uuid4().int >> 65,
+            'format': fmt,
+            'created_at': datetime.now(pytz.UTC).isoformat(),
+            'data_versions': dict(zip((STORE_STATUS, BUSINESS_HOURS, STORES), versions)),
+            'rows': {STORES: len(stores), BUSINESS_HOURS: len(hours), STORE_STATUS: status_rows},
+            'days': days,
+            'min_timestamp_utc': str(bounds[0]) if bounds[0] is not None else None,
+            'max_timestamp_utc': str(bounds[1]) if bounds[1] is not None else None,
+        }
+        with open(os.path.join(target, MANIFEST), "w") as handle:
+            json.dump(manifest, handle, indent=2)
+
+        _mark_snapshot(db, manifest['snapshot_id'], versions)
+        os.rename(target, path)
+        db.commit()
+    except Exception:
+        db.rollback()
+        shutil.rmtree(target, ignore_errors=True)
+        raise
+
+    logger.info(f"Exported snapshot {path}: {manifest['rows']}")
+    return manifest
+
+def _mark_snapshot(db: Session, snapshot_id: int, versions: Sequence[int]):
+    set_data_version(db, SNAPSHOT_ID, snapshot_id)
+    for name, version in zip(SNAPSHOT_VERSIONS, versions):
+        set_data_version(db, name, version)
+
+def read_manifest(path: str) -> Dict:
+    with open(os.path.join(path, MANIFEST)) as handle:
+        return json.load(handle)
+
+def snapshot_current(db: Session, path: str) -> bool:
+    """True when ``path`` holds exactly what the database holds now."""
+    if not os.path.exists(os.path.join(path, MANIFEST)):
+        return False
+    manifest = read_manifest(path)
+    marked = get_data_versions(db, SNAPSHOT_ID, *SNAPSHOT_VERSIONS, default=None)
+    return (marked[0] == manifest['snapshot_id']
+            and marked[1:] == get_data_versions(db, STORE_STATUS, BUSINESS_HOURS, STORES))
+
+def _mmap_dataset(path: str, fmt: str, partitioning=None) -> ds.Dataset:
+    filesystem = pafs.LocalFileSystem(use_mmap=True)
+    return ds.dataset(path, format=SNAPSHOT_FORMATS[fmt][0], filesystem=filesystem, partitioning=partitioning)
+
+def _read_reference(path: str, name: str, fmt: str) -> pa.Table:
+    return _mmap_dataset(os.path.join(path, f"{name}{SNAPSHOT_FORMATS[fmt][1]}"), fmt).to_table()
+
+def import_snapshot(db: Session, path: str) -> Dict:
+    """Replace the database contents with a snapshot and rebuild the status intervals and hourly rollups."""
+    manifest = read_manifest(path)
+    fmt = manifest['format']
+    stores = _read_reference(path, STORES, fmt).to_pandas()
+    hours = _read_reference(path, BUSINESS_HOURS, fmt).to_pandas()
+    try:
+        conn = db.connection()
+        for table in ('uptime_rollups', 'status_intervals', 'status_watermarks', STORE_STATUS, BUSINESS_HOURS, STORES):
+            conn.exec_driver_sql(f"DELETE FROM {table}")
+
+        conn.exec_driver_sql(
+            "INSERT INTO stores (store_id, timezone_str) VALUES (?, ?)",
+            [(store_id, None if pd.isna(tz) else tz) for store_id, tz in zip(stores['store_id'], stores['timezone_str'])],
+        )
+        conn.exec_driver_sql(INSERT_HOURS_SQL, list(hours[list(HOURS_SCHEMA.names)].itertuples(index=False, name=None)))
+
+        status_rows = 0
+        status = _mmap_dataset(os.path.join(path, STORE_STATUS), fmt, DAY_PARTITIONING)
+        for batch in status.to_batches(columns=list(STATUS_SCHEMA.names)):
+            frame = batch.to_pandas()
+            # Snapshots taken before polls were unique may repeat one; rows come in
+            # (timestamp, id) order, so the later row replaces the earlier, as it won before.
+            conn.exec_driver_sql(
+                "INSERT OR REPLACE INTO store_status (id, store_id, timestamp_utc, status) VALUES (?, ?, ?, ?)",
+                list(zip(frame['id'].tolist(), frame['store_id'], to_db_timestamps(frame['timestamp_utc']).tolist(),
+                         frame['status'])),
+            )
+            status_rows += len(frame)
+
+        # Bump rather than copy the snapshot's versions so caches keyed on them never see a repeat.
+        bump_data_version(db, STORE_STATUS, BUSINESS_HOURS, STORES)
+        _mark_snapshot(db, manifest['snapshot_id'], get_data_versions(db, STORE_STATUS, BUSINESS_HOURS, STORES))
+        rebuild_intervals(db)
+        rebuild_watermarks(db)
+        rebuild_rollups(db)
+    except Exception:
+        db.rollback()
+        raise
+    invalidate_business_hours_index()
+
+    rows = {STORES: len(stores), BUSINESS_HOURS: len(hours), STORE_STATUS: status_rows}
+    logger.info(f"Imported snapshot {path}: {rows}")
+    return rows
+
+def _last_per_store(pos: np.ndarray, ts: np.ndarray, row_id: np.ndarray) -> np.ndarray:
+    """Indices of each store's latest row."""
+    order = np.lexsort((row_id, ts, pos))
+    if not len(order):
+        return order
+    last = np.append(pos[order][1:] != pos[order][:-1], True)
+    return order[last]
+
+def _status_arrays(table: pa.Table, position: pd.Series) -> Tuple[np.ndarray, ...]:
+    """(store position, ts, id, active) straight from Arrow buffers; rows of unknown stores are dropped."""
+    encoded = table.column('store_id').combine_chunks().dictionary_encode()
+    store_pos = position.reindex(encoded.dictionary.to_pylist()).to_numpy()
+    pos = store_pos[encoded.indices.to_numpy()] if len(encoded.dictionary) else np.array([], dtype=float)
+    ts = table.column('timestamp_utc').combine_chunks().cast(pa.int64()).to_numpy()
+    row_id = table.column('id').combine_chunks().to_numpy()
+    active = pc.equal(table.column('status'), 'active').combine_chunks().to_numpy(zero_copy_only=False)
+    known = ~np.isnan(pos)
+    return pos[known].astype(np.int64), ts[known], row_id[known], active[known]
+
+def load_fleet_snapshot(path: str, since: datetime, until: datetime,
+                        store_ids: Optional[Sequence[str]] = None) -> FleetData:
+    """Same FleetData as ``load_fleet``, read from a snapshot without touching the database."""
+    manifest = read_manifest(path)
+    fmt = manifest['format']
+    since_us, until_us = to_utc_us(since), to_utc_us(until)
+
+    stores = _read_reference(path, STORES, fmt).to_pandas()
+    if store_ids is not None:
+        stores = stores[stores['store_id'].isin(set(store_ids))]
+    stores = stores.sort_values('store_id')
+    ids = stores['store_id'].to_numpy(dtype=object)
+    position = pd.Series(np.arange(len(ids)), index=ids)
+
+    with phase('business_hours'):
+        hours = _read_reference(path, BUSINESS_HOURS, fmt).to_pandas()
+        hours = hours.rename(columns={'start_time_local': 'start', 'end_time_local': 'end'})
+        hours = hours[hours['store_id'].isin(position.index)]
+        index = business_hours_index_from_frames(stores[['store_id', 'timezone_str']], hours, since_us, until_us)
+        period_store, period_start, period_end = index.fleet_intervals(ids)
+
+    status = _mmap_dataset(os.path.join(path, STORE_STATUS), fmt, DAY_PARTITIONING)
+    day = ds.field('day')
+    # Pushed into the scan so a batch of stores only materializes its own rows.
+    wanted = ds.field('store_id').isin(pa.array(ids, type=pa.string())) if store_ids is not None else None
+    first_day = pd.Timestamp(since_us * 1000).strftime('%Y-%m-%d')
+    last_day = pd.Timestamp(until_us * 1000).strftime('%Y-%m-%d')
+
+    def scan(days):
+        return _status_arrays(status.to_table(filter=days if wanted is None else days & wanted), position)
+
+    with phase('query'):
+        rows = scan((day >= first_day) & (day <= last_day))
+    pos, ts, row_id = rows[:3]
+
+    earlier = np.flatnonzero(ts < since_us)
+    carry = earlier[_last_per_store(pos[earlier], ts[earlier], row_id[earlier])]
+    in_window = np.flatnonzero((ts >= since_us) & (ts <= until_us))
+    selected = [tuple(values[carry] for values in rows), tuple(values[in_window] for values in rows)]
+
+    # Walk back a day at a time for stores whose carry-in row is older than the first day read.
+    first_status = stores['first_status_utc'].dt.tz_convert(None).to_numpy(dtype='datetime64[us]').astype(np.int64)
+    missing = stores['first_status_utc'].notna().to_numpy() & (first_status < since_us)
+    missing[pos[carry]] = False
+    for previous in sorted((d for d in manifest['days'] if d < first_day), reverse=True):
+        if not missing.any():
+            break
+        with phase('query'):
+            older = scan(day == previous)
+        older = tuple(values[missing[older[0]]] for values in older)
+        last = _last_per_store(*older[:3])
+        selected.append(tuple(values[last] for values in older))
+        missing[older[0][last]] = False
+
+    pos, ts, row_id, active = (np.concatenate([part[i] for part in selected]) for i in range(4))
+    order = np.lexsort((row_id, ts, pos))
+
+    return FleetData(
+        store_ids=ids,
+        status_store=pos[order],
+        status_ts=ts[order],
+        status_active=active[order].astype(bool),
+        period_store=period_store,
+        period_start=period_start,
+        period_end=period_end,
+        horizon_us=until_us,
+    )
+
+def snapshot_store_ids(path: str) -> List[str]:
+    fmt = read_manifest(path)['format']
+    return sorted(_read_reference(path, STORES, fmt).column('store_id').to_pylist())
+
+def build_report_from_snapshot(path: str, current_time: Optional[datetime] = None,
+                               store_ids: Optional[Sequence[str]] = None,
+                               windows: Sequence[Tuple[str, timedelta]] = REPORT_WINDOWS) -> pd.DataFrame:
+    if current_time is None:
+        current_time = pd.Timestamp(read_manifest(path)['max_timestamp_utc']).to_pydatetime()
+    longest = max(span for _, span in windows)
+    fleet = load_fleet_snapshot(path, current_time - longest, current_time, store_ids)
+    logger.info(f"Loaded {fleet.n_stores} stores and {len(fleet.status_ts)} status rows from snapshot {path}")
+    return compute_report(fleet, current_time, windows)
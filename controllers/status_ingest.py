@@ -0,0 +1,169 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from controllers.data_versions import STORE_STATUS, bump_data_version
+from controllers.db_utils import db_timestamps, read_rows, to_db_timestamps
+from controllers.uptime_rollups import update_rollups
+from controllers.status_intervals import can_update_intervals, mark_intervals_current, update_intervals
+
+STATUS_COLUMNS = ['store_id', 'timestamp_utc', 'status']
+STATUS_VALUES = ('active', 'inactive')
+
+# Polls at or behind a store's watermark: "merge" them through the staging table,
+# or "skip" them without looking at the table at all.
+STATUS_LATE_POLLS = os.getenv("STATUS_LATE_POLLS", "merge")
+
+INSERT_STATUS_SQL = "INSERT INTO store_status (store_id, timestamp_utc, status) VALUES (?, ?, ?)"
+CREATE_STAGING_SQL = (
+    "CREATE TEMP TABLE IF NOT EXISTS status_staging "
+    "(store_id VARCHAR NOT NULL, timestamp_utc DATETIME NOT NULL, status VARCHAR NOT NULL)"
+)
+INSERT_STAGING_SQL = "INSERT INTO status_staging (store_id, timestamp_utc, status) VALUES (?, ?, ?)"
+# The last upload of a poll decides its status, as the later row did before polls were unique.
+MERGE_STAGED_UPDATE_SQL = (
+    "UPDATE store_status SET status = s.status FROM status_staging s "
+    "WHERE store_status.store_id = s.store_id AND store_status.timestamp_utc = s.timestamp_utc "
+    "AND store_status.status <> s.status"
+)
+MERGE_STAGED_INSERT_SQL = (
+    "INSERT OR IGNORE INTO store_status (store_id, timestamp_utc, status) "
+    "SELECT store_id, timestamp_utc, status FROM status_staging"
+)
+UPSERT_WATERMARK_SQL = (
+    "INSERT INTO status_watermarks (store_id, max_timestamp_utc) VALUES (?, ?) "
+    "ON CONFLICT (store_id) DO UPDATE SET max_timestamp_utc = excluded.max_timestamp_utc"
+)
+# Intervals still cover stores whose raw polls were all compacted away.
+REBUILD_WATERMARKS_SQL = (
+    "INSERT INTO status_watermarks (store_id, max_timestamp_utc) "
+    "SELECT store_id, MAX(ts) FROM (SELECT store_id, timestamp_utc AS ts FROM store_status "
+    "UNION ALL SELECT store_id, end_utc FROM status_intervals) GROUP BY store_id"
+)
+
+
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    """Vectorized UTC parsing of 'YYYY-MM-DD HH:MM:SS[.ffffff][ UTC]'; unparseable values become NaT."""
+    cleaned = values.astype(str).str.replace(' UTC', '', regex=False).str.strip()
+    return pd.to_datetime(cleaned, format='ISO8601', errors='coerce', utc=True)
+
+
+def split_status_chunk(chunk: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Parse a CSV chunk into insertable rows and rejected rows with a reason column."""
+    timestamps = parse_timestamps(chunk['timestamp_utc'])
+    reason = pd.Series('', index=chunk.index)
+    reason[~chunk['status'].isin(STATUS_VALUES)] = 'invalid status'
+    reason[timestamps.isna()] = 'invalid timestamp'
+    reason[chunk['store_id'].isna()] = 'missing store_id'
+
+    bad = reason != ''
+    rejected = chunk[bad].assign(reason=reason[bad])
+    accepted = pd.DataFrame({
+        'store_id': chunk.loc[~bad, 'store_id'].astype(str),
+        'timestamp_utc': timestamps[~bad],
+        'status': chunk.loc[~bad, 'status'],
+    })
+    return accepted, rejected
+
+def rebuild_watermarks(db: Session):
+    """Recompute every store's newest poll, e.g. after a bulk load; runs in the caller's transaction."""
+    db.execute(text("DELETE FROM status_watermarks"))
+    db.execute(text(REBUILD_WATERMARKS_SQL))
+
+def load_watermarks(db: Session, store_ids: Optional[List[str]] = None) -> pd.Series:
+    """Each store's newest loaded poll in UTC microseconds, indexed by store_id (all stores when None)."""
+    if (db.execute(text("SELECT 1 FROM status_watermarks LIMIT 1")).first() is None
+            and db.execute(text("SELECT 1 FROM store_status LIMIT 1")).first() is not None):
+        rebuild_watermarks(db)
+    marks = read_rows(db, "SELECT store_id, max_timestamp_utc FROM status_watermarks WHERE {store_filter}",
+                       {}, store_ids).reindex(columns=['store_id', 'max_timestamp_utc'])
+    values = pd.to_datetime(marks['max_timestamp_utc'], format='ISO8601').astype('int64') // 1000
+    return pd.Series(values.to_numpy(), index=marks['store_id'].astype(str), dtype='int64')
+
+def merge_status_chunk(conn, accepted: pd.DataFrame, marks: pd.Series) -> Tuple[Dict, pd.Series]:
+    """Write one chunk of valid polls without creating duplicates.
+
+    Polls newer than their store's watermark cannot be in the table yet and are
+    inserted directly. Older ones go through the staging table: changed
+    statuses are updated and unseen polls inserted in bulk, repeats are
+    dropped. Returns the counts, including the polls that may have changed the
+    table, and the advanced watermarks.
+    """
+    unique = accepted.drop_duplicates(['store_id', 'timestamp_utc'], keep='last')
+    ts_us = unique['timestamp_utc'].dt.tz_convert(None).to_numpy(dtype='datetime64[us]').astype(np.int64)
+    mark = unique['store_id'].map(marks).to_numpy(dtype='float64')
+    fresh = np.isnan(mark) | (ts_us > mark)
+    new, late = unique[fresh], unique[~fresh]
+    counts = {'inserted': len(new), 'updated': 0, 'unchanged': len(accepted) - len(unique), 'skipped': 0}
+
+    if len(new):
+        conn.exec_driver_sql(INSERT_STATUS_SQL, list(zip(
+            new['store_id'], to_db_timestamps(new['timestamp_utc']).tolist(), new['status'])))
+        newest = pd.Series(ts_us[fresh], index=new['store_id'].to_numpy()).groupby(level=0).max()
+        marks = pd.concat([marks[~marks.index.isin(newest.index)], newest])
+
+    if len(late) and STATUS_LATE_POLLS == 'skip':
+        counts['skipped'] = len(late)
+        late = late.iloc[:0]
+    if len(late):
+        conn.exec_driver_sql(CREATE_STAGING_SQL)
+        conn.exec_driver_sql(INSERT_STAGING_SQL, list(zip(
+            late['store_id'], to_db_timestamps(late['timestamp_utc']).tolist(), late['status'])))
+        updated = conn.exec_driver_sql(MERGE_STAGED_UPDATE_SQL).rowcount
+        inserted = conn.exec_driver_sql(MERGE_STAGED_INSERT_SQL).rowcount
+        conn.exec_driver_sql("DELETE FROM status_staging")
+        counts['inserted'] += inserted
+        counts['updated'] = updated
+        counts['unchanged'] += len(late) - inserted - updated
+        if not inserted and not updated:
+            late = late.iloc[:0]
+
+    # Late polls are kept whole when any of them landed; the refresh only needs a superset.
+    counts['written'] = pd.concat([new, late]) if len(late) else new
+    return counts, marks
+
+def merge_status_frames(db: Session, frames: Iterable[pd.DataFrame], store_ids: Optional[List[str]] = None) -> Dict:
+    """Merge frames of valid polls and refresh what depends on them, without committing.
+
+    ``store_ids``, when known up front, limits the watermarks read to those
+    stores. Status intervals and hourly rollups are brought up to date and
+    the data version bumped only when some poll was inserted or changed.
+    """
+    totals = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+    # Each store's first and last written poll in UTC microseconds.
+    new_polls = None
+
+    intervals_maintained = can_update_intervals(db)
+    marks = load_watermarks(db, store_ids)
+    marks_before = marks.copy()
+    conn = db.connection()
+    for accepted in frames:
+        if not len(accepted):
+            continue
+        counts, marks = merge_status_chunk(conn, accepted, marks)
+        written = counts.pop('written')
+        for key, value in counts.items():
+            totals[key] += value
+        if len(written):
+            ts_us = written['timestamp_utc'].dt.tz_convert(None).to_numpy(dtype='datetime64[us]').astype(np.int64)
+            chunk = pd.Series(ts_us, index=written['store_id'].to_numpy()).groupby(level=0).agg(['min', 'max'])
+            if new_polls is not None:
+                chunk = pd.concat([new_polls, chunk]).groupby(level=0).agg({'min': 'min', 'max': 'max'})
+            new_polls = chunk
+
+    advanced = marks[marks.ne(marks_before.reindex(marks.index))]
+    if len(advanced):
+        conn.exec_driver_sql(UPSERT_WATERMARK_SQL, list(zip(
+            advanced.index.tolist(), db_timestamps(advanced.to_numpy(dtype=np.int64)))))
+    if new_polls is not None:
+        # Intervals first: the rollup refresh reads them.
+        if intervals_maintained:
+            min_timestamp = pd.Timestamp(int(new_polls['min'].min()) * 1000).to_pydatetime()
+            update_intervals(db, new_polls.index.tolist(), min_timestamp)
+        update_rollups(db, new_polls)
+        bump_data_version(db, STORE_STATUS)
+        if intervals_maintained:
+            mark_intervals_current(db)
+    return totals
@@ -0,0 +1,180 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, timedelta
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from controllers.data_versions import STATUS_INTERVALS, STORE_STATUS, get_data_versions, set_data_version
+from controllers.db_utils import (
+    as_db_timestamp, chunked, db_timestamps, db_timestamps_us, from_utc_us, read_rows, to_utc_us,
+)
+from controllers.uptime_engine import intervals_current
+from models.status_interval import StatusInterval
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Raw polls older than this (before the newest poll) are deleted by compact_store_status;
+# the runs in status_intervals keep everything the reports need.
+STATUS_RAW_RETENTION_DAYS = float(os.getenv("STATUS_RAW_RETENTION_DAYS", "14"))
+REBUILD_CHUNK_STORES = 1000
+
+INSERT_INTERVAL_SQL = "INSERT INTO status_intervals (store_id, status, start_utc, end_utc) VALUES (?, ?, ?, ?)"
+UPDATE_INTERVAL_END_SQL = "UPDATE status_intervals SET end_utc = ? WHERE id = ?"
+
+INTERVAL_COLUMNS = "id, store_id, status, start_utc, end_utc"
+
+# Each store's last run that ended before :since; new polls may extend it.
+PREVIOUS_SQL = (
+    f"SELECT {INTERVAL_COLUMNS} FROM status_intervals WHERE id IN ("
+    "SELECT (SELECT x.id FROM status_intervals x WHERE x.store_id = s.store_id "
+    "AND x.end_utc < :since ORDER BY x.end_utc DESC, x.id DESC LIMIT 1) "
+    "FROM (SELECT DISTINCT store_id FROM status_intervals WHERE {store_filter}) s)"
+)
+AFFECTED_SQL = f"SELECT {INTERVAL_COLUMNS} FROM status_intervals WHERE {{store_filter}} AND end_utc >= :since"
+RAW_SQL = "SELECT id, store_id, timestamp_utc, status FROM store_status WHERE {store_filter} AND timestamp_utc >= :since"
+
+def can_update_intervals(db: Session) -> bool:
+    """Whether an ingest can keep the runs up to date: they are current, or there is nothing yet."""
+    if intervals_current(db):
+        return True
+    return (db.execute(text("SELECT 1 FROM store_status LIMIT 1")).first() is None
+            and db.execute(text("SELECT 1 FROM status_intervals LIMIT 1")).first() is None)
+
+def mark_intervals_current(db: Session):
+    version = get_data_versions(db, STORE_STATUS, default=None)[0]
+    if version is not None:
+        set_data_version(db, STATUS_INTERVALS, version)
+
+def store_points(db: Session, store_id: str, since: datetime, until: datetime) -> List[Tuple[datetime, str]]:
+    """One store's runs around [since, until] as (timestamp, status) polls in time order, carry-in first."""
+    previous = db.query(StatusInterval).filter(
+        StatusInterval.store_id == store_id,
+        StatusInterval.start_utc < since
+    ).order_by(StatusInterval.start_utc.desc(), StatusInterval.id.desc()).first()
+    runs = db.query(StatusInterval).filter(
+        StatusInterval.store_id == store_id,
+        StatusInterval.start_utc >= since,
+        StatusInterval.start_utc <= until
+    ).order_by(StatusInterval.start_utc, StatusInterval.id).all()
+    points = []
+    for run in ([previous] if previous else []) + runs:
+        points.append((run.start_utc, run.status))
+        if run.end_utc > run.start_utc:
+            points.append((run.end_utc, run.status))
+    return points
+
+def run_lengths(points: pd.DataFrame) -> pd.DataFrame:
+    """Merge sorted (store_id, ts, status) points into runs of one status: store_id, status, start, end."""
+    if not len(points):
+        return pd.DataFrame(columns=['store_id', 'status', 'start', 'end'])
+    store = points['store_id'].to_numpy()
+    status = points['status'].to_numpy()
+    starts = np.ones(len(points), dtype=bool)
+    starts[1:] = (store[1:] != store[:-1]) | (status[1:] != status[:-1])
+    ends = np.append(starts[1:], True)
+    ts = points['ts'].to_numpy(dtype=np.int64)
+    return pd.DataFrame({'store_id': store[starts], 'status': status[starts], 'start': ts[starts], 'end': ts[ends]})
+
+def _merge(db: Session, store_ids: Optional[List[str]], since: datetime) -> int:
+    """Re-derive the runs of ``store_ids`` (all stores when None) from ``since`` on.
+
+    The runs touching [since, ∞) plus the run just before are taken apart into
+    their first and last polls, combined with the raw polls from the start of
+    that range, and merged again. Raw polls are complete for anything newer than
+    the retention horizon, so the result there is exact; for late polls behind
+    the horizon only the kept run ends are available to merge with.
+    """
+    params = {'since': as_db_timestamp(since)}
+    previous = read_rows(db, PREVIOUS_SQL, params, store_ids)
+    affected = read_rows(db, AFFECTED_SQL, params, store_ids)
+    old = pd.concat([previous, affected], ignore_index=True).drop_duplicates('id')
+
+    # A run that straddles ``since`` is re-derived from its first poll on, so each
+    # store takes raw polls from the earlier of ``since`` and its first affected run.
+    since_us = to_utc_us(since)
+    first_affected = pd.Series(db_timestamps_us(affected['start_utc']), index=affected['store_id'].astype(str))
+    store_since = first_affected.groupby(level=0).min().clip(upper=since_us)
+    raw_since_us = int(store_since.min()) if len(store_since) else since_us
+    raw = read_rows(db, RAW_SQL, {'since': as_db_timestamp(from_utc_us(raw_since_us))}, store_ids)
+    raw_ts = db_timestamps_us(raw['timestamp_utc'])
+    raw_store = raw['store_id'].astype(str)
+    raw_keep = raw_ts >= store_since.reindex(raw_store).fillna(since_us).to_numpy()
+    raw, raw_ts = raw[raw_keep], raw_ts[raw_keep]
+    if not len(raw) and not len(old):
+        return 0
+
+    old_start, old_end = db_timestamps_us(old['start_utc']), db_timestamps_us(old['end_utc'])
+    old_id = old['id'].to_numpy(dtype=np.int64)
+    # Kept run ends come first at equal times, then raw polls in id order, like the engine.
+    points = pd.concat([
+        pd.DataFrame({'store_id': old['store_id'].astype(str), 'ts': old_start, 'status': old['status'],
+                      'source': 0, 'key': old_id * 2}),
+        pd.DataFrame({'store_id': old['store_id'].astype(str), 'ts': old_end, 'status': old['status'],
+                      'source': 0, 'key': old_id * 2 + 1}),
+        pd.DataFrame({'store_id': raw['store_id'].astype(str), 'ts': raw_ts,
+                      'status': raw['status'], 'source': 1, 'key': raw['id']}),
+    ], ignore_index=True)
+    points = points.sort_values(['store_id', 'ts', 'source', 'key'], kind='mergesort')
+    runs = run_lengths(points)
+
+    # Runs that still start where an old run started only move their end; that is
+    # how a new poll extends a store's open run.
+    existing = pd.DataFrame({'id': old_id, 'store_id': old['store_id'].astype(str).to_numpy(),
+                             'status': old['status'].to_numpy(), 'start': old_start, 'old_end': old_end})
+    matched = runs.merge(existing, on=['store_id', 'status', 'start'], how='left')
+    kept = matched[matched['id'].notna()]
+    moved = kept[kept['end'] != kept['old_end']]
+    added = matched[matched['id'].isna()]
+    removed = np.setdiff1d(old_id, kept['id'].to_numpy(dtype=np.int64))
+
+    conn = db.connection()
+    if len(removed):
+        conn.exec_driver_sql("DELETE FROM status_intervals WHERE id = ?", [(int(i),) for i in removed])
+    if len(moved):
+        conn.exec_driver_sql(UPDATE_INTERVAL_END_SQL, list(zip(
+            db_timestamps(moved['end'].to_numpy(dtype=np.int64)), moved['id'].astype(int).tolist())))
+    if len(added):
+        conn.exec_driver_sql(INSERT_INTERVAL_SQL, list(zip(
+            added['store_id'], added['status'],
+            db_timestamps(added['start'].to_numpy(dtype=np.int64)),
+            db_timestamps(added['end'].to_numpy(dtype=np.int64)))))
+    return len(added) + len(moved)
+
+def update_intervals(db: Session, store_ids: Iterable[str], min_new: datetime):
+    """Fold polls newer than ``min_new`` that were just inserted into the runs of ``store_ids``."""
+    written = _merge(db, sorted(set(store_ids)), min_new)
+    logger.info(f"Updated {written} status intervals")
+
+def rebuild_intervals(db: Session):
+    """Merge every raw poll into the runs, e.g. for a database that predates them or after a bulk load.
+
+    Runs as part of the caller's transaction.
+    """
+    stores = [row[0] for row in db.execute(text(
+        "SELECT store_id FROM store_status UNION SELECT store_id FROM status_intervals ORDER BY 1"))]
+    written = 0
+    for chunk in chunked(stores, REBUILD_CHUNK_STORES):
+        written += _merge(db, chunk, datetime(1970, 1, 1))
+    mark_intervals_current(db)
+    logger.info(f"Rebuilt status intervals for {len(stores)} stores ({written} written)")
+
+def compact_store_status(db: Session, retention_days: float = STATUS_RAW_RETENTION_DAYS) -> Dict:
+    """Bring the runs up to date and delete raw polls older than the retention horizon."""
+    if not intervals_current(db):
+        rebuild_intervals(db)
+        db.commit()
+
+    newest = db.execute(text("SELECT MAX(timestamp_utc) FROM store_status")).scalar()
+    deleted = 0
+    if newest is not None:
+        horizon = pd.Timestamp(newest).to_pydatetime() - timedelta(days=retention_days)
+        deleted = db.execute(text("DELETE FROM store_status WHERE timestamp_utc < :horizon"),
+                             {'horizon': as_db_timestamp(horizon)}).rowcount
+    db.commit()
+
+    remaining = db.execute(text("SELECT COUNT(*) FROM store_status")).scalar()
+    intervals = db.execute(text("SELECT COUNT(*) FROM status_intervals")).scalar()
+    logger.info(f"Deleted {deleted} raw status rows; {remaining} remain next to {intervals} intervals")
+    return {'rows_deleted': deleted, 'rows_remaining': remaining, 'intervals': intervals}
@@ -0,0 +1,311 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from collections import deque
+import asyncio
+import io
+import json
+import os
+import queue
+import threading
+import time
+import pandas as pd
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from controllers.status_ingest import STATUS_COLUMNS, merge_status_frames, split_status_chunk
+import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Parsed pieces waiting for the writer; a full queue turns requests away.
+STREAM_QUEUE_BATCHES = int(os.getenv("STREAM_QUEUE_BATCHES", "256"))
+# The writer commits once it has this many polls or the oldest waited this long.
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", "5000"))
+STREAM_FLUSH_MS = int(os.getenv("STREAM_FLUSH_MS", "200"))
+# How long a request waits for room in a full queue before answering 503.
+STREAM_PUT_TIMEOUT = float(os.getenv("STREAM_PUT_TIMEOUT", "5"))
+STREAM_PUT_RETRY_SECONDS = 0.01
+# ?wait=true answers once the request's polls are committed, or after this long.
+STREAM_WAIT_SECONDS = float(os.getenv("STREAM_WAIT_SECONDS", "10"))
+STREAM_PARSE_LINES = 2000
+# A batch that fails to commit (e.g. the write lock stayed busy past busy_timeout) is tried
+# this many times in all, waiting STREAM_RETRY_SECONDS and then twice as long before each retry.
+STREAM_WRITE_ATTEMPTS = int(os.getenv("STREAM_WRITE_ATTEMPTS", "3"))
+STREAM_RETRY_SECONDS = float(os.getenv("STREAM_RETRY_SECONDS", "0.5"))
+# Failed writer batches remembered for ?wait=true requests, as (first seq, last seq).
+STREAM_FAILED_BATCHES = 1024
+MAX_REPORTED_REJECTS = 10
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+CSV_TYPES = ('text/csv',)
+
+_STOP = object()
+
+class StreamPiece:
+    __slots__ = ('frame', 'seq', 'enqueued')
+
+    def __init__(self, frame: pd.DataFrame, seq: int):
+        self.frame = frame
+        self.seq = seq
+        self.enqueued = time.perf_counter()
+
+class StatusStreamWriter:
+    """The only thread that writes streamed polls: it drains the queue in size- or time-bounded batches.
+
+    Each batch is one transaction through the same merge as CSV uploads, so
+    concurrent streaming requests take SQLite's write lock once per batch rather
+    than once each; batches still wait for it behind upload jobs and report
+    writes, and are retried with backoff when that wait fails.
+    """
+
+    def __init__(self, queue_batches: int = STREAM_QUEUE_BATCHES, batch_rows: int = STREAM_BATCH_ROWS,
+                 flush_ms: int = STREAM_FLUSH_MS):
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_batches)
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_ms / 1000
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+        self._queued_seq = 0
+        self._written_seq = 0
+        self._failed: "deque[Tuple[int, int]]" = deque(maxlen=STREAM_FAILED_BATCHES)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="status-stream-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Write what is queued, then end the thread."""
+        with self._lock:
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self.queue.put(_STOP)
+        thread.join(timeout)
+
+    def offer(self, frame: pd.DataFrame) -> Optional[int]:
+        """Queue a frame of valid polls without blocking; returns its sequence number, or None when full."""
+        with self._lock:
+            piece = StreamPiece(frame, self._queued_seq + 1)
+            try:
+                self.queue.put_nowait(piece)
+            except queue.Full:
+                return None
+            self._queued_seq = piece.seq
+        metrics.STREAM_QUEUE_DEPTH.set(self.queue.qsize())
+        return piece.seq
+
+    def wait_written(self, seqs: List[int], timeout: float) -> Optional[bool]:
+        """Block until the pieces ``seqs`` are written: True if all were committed, False if any
+        failed, None on timeout."""
+        with self._written:
+            if not self._written.wait_for(lambda: self._written_seq >= max(seqs, default=0), timeout):
+                return None
+            return not any(first <= seq <= last for first, last in self._failed for seq in seqs)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self.queue.get()
+            if first is _STOP:
+                break
+            pieces, rows = [first], len(first.frame)
+            deadline = time.monotonic() + self.flush_seconds
+            while rows < self.batch_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    piece = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if piece is _STOP:
+                    stopping = True
+                    break
+                pieces.append(piece)
+                rows += len(piece.frame)
+            metrics.STREAM_QUEUE_DEPTH.set(self.queue.qsize())
+            self._write(pieces)
+
+    def _write(self, pieces: List[StreamPiece]):
+        started = time.perf_counter()
+        frame = pd.concat([piece.frame for piece in pieces], ignore_index=True)
+        first_seq, last_seq = pieces[0].seq, pieces[-1].seq
+        failed = True
+        for attempt in range(1, STREAM_WRITE_ATTEMPTS + 1):
+            db = SessionLocal()
+            try:
+                totals = merge_status_frames(db, [frame], sorted(frame['store_id'].unique()))
+                db.commit()
+                result = {f"rows_{key}": value for key, value in totals.items()}
+                metrics.record_ingest("store_status_stream", result, time.perf_counter() - started)
+                failed = False
+                break
+            except Exception as e:
+                db.rollback()
+                if attempt < STREAM_WRITE_ATTEMPTS:
+                    delay = STREAM_RETRY_SECONDS * 2 ** (attempt - 1)
+                    logger.warning(f"Stream writer failed to write pieces {first_seq}-{last_seq} "
+                                   f"(attempt {attempt}), retrying in {delay}s: {str(e)}")
+                    time.sleep(delay)
+                else:
+                    logger.error(f"Stream writer dropped pieces {first_seq}-{last_seq} ({len(frame)} polls) "
+                                 f"after {attempt} attempts: {str(e)}")
+            finally:
+                db.close()
+        if failed:
+            metrics.INGEST_ROWS_TOTAL.inc(len(frame), kind="store_status_stream", outcome="failed")
+            metrics.STREAM_FAILED_BATCHES_TOTAL.inc()
+
+        committed = time.perf_counter()
+        metrics.STREAM_BATCH_ROWS.observe(len(frame))
+        for piece in pieces:
+            metrics.STREAM_LAG_SECONDS.observe(committed - piece.enqueued)
+        with self._written:
+            # The queue is FIFO, so a batch is a contiguous run of sequence numbers.
+            if failed:
+                self._failed.append((first_seq, last_seq))
+            self._written_seq = last_seq
+            self._written.notify_all()
+
+stream_writer = StatusStreamWriter()
+
+def iter_lines(buffer: bytearray, data: bytes, final: bool = False) -> Iterator[bytes]:
+    """Complete lines from ``data`` appended to ``buffer``; the unfinished tail stays in ``buffer``."""
+    buffer.extend(data)
+    end = buffer.rfind(b'\n')
+    if final:
+        end = len(buffer)
+    if end < 0:
+        return
+    lines = bytes(buffer[:end]).split(b'\n')
+    del buffer[:end + 1]
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield line
+
+def parse_ndjson(lines: List[bytes]) -> Tuple[pd.DataFrame, List[Tuple[int, str]]]:
+    """Objects with store_id, timestamp_utc and status; returns the frame and (index, reason) for bad lines."""
+    records, bad = [], []
+    for index, line in enumerate(lines):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            bad.append((index, 'invalid json'))
+            continue
+        if not isinstance(record, dict):
+            bad.append((index, 'not an object'))
+            continue
+        records.append(record)
+    # object dtype keeps numeric store ids from turning into floats next to missing ones.
+    frame = pd.DataFrame(records, columns=STATUS_COLUMNS, dtype=object)
+    skipped = {index for index, _ in bad}
+    frame.index = [index for index in range(len(lines)) if index not in skipped]
+    return frame, bad
+
+def parse_csv(header: bytes, lines: List[bytes]) -> pd.DataFrame:
+    text = b'\n'.join([header] + lines).decode('utf-8')
+    try:
+        frame = pd.read_csv(io.StringIO(text), dtype=str, keep_default_na=False, na_values=[''])
+    except (pd.errors.ParserError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed CSV: {str(e)}")
+    return frame[STATUS_COLUMNS]
+
+def check_csv_header(header: bytes):
+    columns = [column.strip().strip('"') for column in header.decode('utf-8').split(',')]
+    if not all(column in columns for column in STATUS_COLUMNS):
+        raise HTTPException(status_code=400, detail="CSV must contain store_id, timestamp_utc, and status columns")
+
+class StreamRequest:
+    """Book-keeping for one streaming request: parses pieces, queues the valid polls and counts the rest."""
+
+    def __init__(self, content_type: str):
+        media_type = (content_type or '').split(';')[0].strip().lower()
+        if media_type in NDJSON_TYPES:
+            self.format = 'ndjson'
+        elif media_type in CSV_TYPES:
+            self.format = 'csv'
+        else:
+            raise HTTPException(status_code=415, detail="Send application/x-ndjson or text/csv")
+        self.header: Optional[bytes] = None
+        self.lines_seen = 0
+        self.rows_queued = 0
+        self.rejects: List[Dict] = []
+        self.rows_rejected = 0
+        self.seqs: List[int] = []
+
+    def parse(self, lines: List[bytes]) -> pd.DataFrame:
+        """Valid polls from a piece of body lines; rejected lines are counted with their line numbers."""
+        if self.format == 'csv' and self.header is None:
+            self.header = lines.pop(0)
+            self.lines_seen += 1
+            check_csv_header(self.header)
+        first_line = self.lines_seen + 1
+        self.lines_seen += len(lines)
+        if not lines:
+            return pd.DataFrame()
+
+        bad = []
+        if self.format == 'ndjson':
+            frame, bad = parse_ndjson(lines)
+        else:
+            frame = parse_csv(self.header, lines)
+        accepted, rejected = split_status_chunk(frame)
+        bad += list(zip(rejected.index, rejected['reason']))
+        self.rows_rejected += len(bad)
+        for index, reason in sorted(bad)[:MAX_REPORTED_REJECTS - len(self.rejects)]:
+            self.rejects.append({'line': first_line + int(index), 'reason': reason})
+        return accepted
+
+    def summary(self) -> Dict:
+        return {
+            'rows_queued': self.rows_queued,
+            'rows_rejected': self.rows_rejected,
+            'rejects': self.rejects,
+            'queue_depth': stream_writer.queue.qsize(),
+        }
+
+async def _queue_lines(stream: StreamRequest, lines: List[bytes]):
+    accepted = await run_in_threadpool(stream.parse, lines)
+    if not len(accepted):
+        return
+    deadline = time.monotonic() + STREAM_PUT_TIMEOUT
+    while (seq := stream_writer.offer(accepted)) is None:
+        if time.monotonic() >= deadline:
+            metrics.STREAM_BACKPRESSURE_TOTAL.inc()
+            raise HTTPException(status_code=503, headers={'Retry-After': '1'},
+                                detail={'message': "Stream queue is full, retry later", **stream.summary()})
+        await asyncio.sleep(STREAM_PUT_RETRY_SECONDS)
+    stream.rows_queued += len(accepted)
+    stream.seqs.append(seq)
+
+async def ingest_stream(request: Request, wait: bool = False) -> Dict:
+    """Queue the polls of a streamed NDJSON or CSV body as they arrive.
+
+    Complete lines are parsed and queued after every chunk of the body, so a
+    long-lived request trickling events is written within STREAM_FLUSH_MS of
+    each one. Polls queued before a 503 are still written.
+    """
+    stream = StreamRequest(request.headers.get('content-type'))
+    stream_writer.start()
+    buffer = bytearray()
+    async for data in request.stream():
+        lines = list(iter_lines(buffer, data))
+        for start in range(0, len(lines), STREAM_PARSE_LINES):
+            await _queue_lines(stream, lines[start:start + STREAM_PARSE_LINES])
+    lines = list(iter_lines(buffer, b'', final=True))
+    if lines:
+        await _queue_lines(stream, lines)
+
+    result = stream.summary()
+    if wait:
+        written = await run_in_threadpool(stream_writer.wait_written, stream.seqs, STREAM_WAIT_SECONDS)
+        if written is False:
+            # Ingest is idempotent, so the whole request can be sent again.
+            raise HTTPException(status_code=500, detail={'message': "Writing the polls failed, retry the request",
+                                                         **result, 'written': False})
+        result['written'] = bool(written)
+    return result
@@ -0,0 +1,38 @@
+from typing import Dict, Sequence, Tuple
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import os
+import threading
+from sqlalchemy.orm import Session
+from controllers.uptime_engine import build_report, format_windows
+import metrics
+
+# Single-store answers kept per (store, windows, data version); any upload moves the version on.
+STORE_UPTIME_CACHE_SIZE = int(os.getenv("STORE_UPTIME_CACHE_SIZE", "10000"))
+
+_cache: "OrderedDict[Tuple[str, str, str], Dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def store_uptime_row(store_id: str, current_time: datetime, db: Session,
+                     windows: Sequence[Tuple[str, timedelta]]) -> Dict:
+    """One store's report row: its longest window is loaded once and every window answered from it."""
+    with metrics.STORE_UPTIME_SECONDS.time(source='store'):
+        return build_report(db, current_time, [store_id], windows=windows).iloc[0].to_dict()
+
+def cached_store_uptime(db: Session, store_id: str, current_time: datetime, data_version: str,
+                        windows: Sequence[Tuple[str, timedelta]]) -> Dict:
+    key = (store_id, format_windows(windows), data_version)
+    with _cache_lock:
+        row = _cache.get(key)
+        if row is not None:
+            _cache.move_to_end(key)
+    metrics.STORE_UPTIME_CACHE_TOTAL.inc(outcome='hit' if row is not None else 'miss')
+    if row is not None:
+        return row
+
+    row = store_uptime_row(store_id, current_time, db, windows)
+    with _cache_lock:
+        _cache[key] = row
+        while len(_cache) > STORE_UPTIME_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return row
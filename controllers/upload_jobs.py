@@ -0,0 +1,107 @@
+from typing import Callable, Dict, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import os
+import tempfile
+import threading
+import time
+import uuid
+import pytz
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.orm import Session
+from database import SessionLocal
+import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+# One writer by default: SQLite serializes writes anyway.
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "1"))
+MAX_TRACKED_JOBS = 1000
+COPY_CHUNK_BYTES = 1024 * 1024
+
+upload_jobs: "OrderedDict[str, Dict]" = OrderedDict()
+_jobs_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+
+# ingest(db, source, filename, progress) -> result dict
+Ingest = Callable[[Session, object, str, Callable], Dict]
+
+async def save_upload(file: UploadFile) -> str:
+    """Spool the request body to a temp file so the job can outlive the request."""
+    handle, path = tempfile.mkstemp(suffix=".csv", prefix="upload_")
+    with os.fdopen(handle, "wb") as target:
+        while True:
+            data = await file.read(COPY_CHUNK_BYTES)
+            if not data:
+                break
+            target.write(data)
+    return path
+
+def submit_upload_job(kind: str, filename: str, path: str, ingest: Ingest) -> str:
+    job_id = str(uuid.uuid4())
+    with _jobs_lock:
+        upload_jobs[job_id] = {
+            'job_id': job_id,
+            'kind': kind,
+            'filename': filename,
+            'status': 'Queued',
+            'rows_processed': 0,
+            'rows_rejected': 0,
+            'errors': [],
+            'submitted_at': datetime.now(pytz.UTC).isoformat(),
+        }
+        while len(upload_jobs) > MAX_TRACKED_JOBS:
+            upload_jobs.popitem(last=False)
+    _executor.submit(_run_job, job_id, kind, filename, path, ingest)
+    return job_id
+
+def _update(job_id: str, **fields):
+    with _jobs_lock:
+        if job_id in upload_jobs:
+            upload_jobs[job_id].update(fields)
+
+def _run_job(job_id: str, kind: str, filename: str, path: str, ingest: Ingest):
+    """Ingest the spooled file and remove it. The job's entry may already be gone (evicted
+    past MAX_TRACKED_JOBS); the upload is still ingested, only its progress is not tracked."""
+    started = time.perf_counter()
+    _update(job_id, status='Running', started_at=datetime.now(pytz.UTC).isoformat(), _started=started)
+
+    def progress(rows_processed: int, rows_rejected: int = 0):
+        _update(job_id, rows_processed=rows_processed, rows_rejected=rows_rejected)
+
+    db = None
+    try:
+        db = SessionLocal()
+        with open(path, "rb") as source:
+            result = ingest(db, source, filename, progress)
+        _update(job_id, status='Complete', result=result)
+        metrics.record_ingest(kind, result, time.perf_counter() - started)
+        logger.info(f"Upload job {job_id} completed: {result}")
+    except HTTPException as e:
+        _update(job_id, status='Failed', errors=[str(e.detail)])
+        logger.error(f"Upload job {job_id} failed: {e.detail}")
+    except Exception as e:
+        _update(job_id, status='Failed', errors=[str(e)])
+        logger.error(f"Upload job {job_id} failed: {str(e)}")
+    finally:
+        if db is not None:
+            db.close()
+        os.remove(path)
+        _update(job_id, finished_at=datetime.now(pytz.UTC).isoformat(), _elapsed=time.perf_counter() - started)
+
+def get_upload_job(job_id: str) -> Optional[Dict]:
+    with _jobs_lock:
+        job = upload_jobs.get(job_id)
+        if job is None:
+            return None
+        job = dict(job)
+
+    started = job.pop('_started', None)
+    elapsed = job.pop('_elapsed', None)
+    if elapsed is None and started is not None:
+        elapsed = time.perf_counter() - started
+    job['elapsed_seconds'] = round(elapsed, 3) if elapsed is not None else None
+    job['rows_per_second'] = round(job['rows_processed'] / elapsed, 1) if elapsed else None
+    return job
@@ -0,0 +1,491 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import os
+import re
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from controllers.business_hours_index import build_business_hours_index, get_business_hours_index, store_business_hours
+from controllers.data_versions import STATUS_INTERVALS, STORE_STATUS, get_data_versions
+from controllers.db_utils import as_db_timestamp, read_rows, to_utc_us
+from metrics import phase
+import logging
+
+logger = logging.getLogger(__name__)
+
+US_PER_SECOND = 1_000_000
+
+REPORT_WINDOWS: List[Tuple[str, timedelta]] = [
+    ('hour', timedelta(hours=1)),
+    ('day', timedelta(days=1)),
+    ('week', timedelta(weeks=1)),
+]
+
+# Custom windows are written like 15m, 6h or 30d; hour, day and week keep their usual names.
+WINDOW_UNITS = {'m': timedelta(minutes=1), 'h': timedelta(hours=1), 'd': timedelta(days=1), 'w': timedelta(weeks=1)}
+WINDOW_PATTERN = re.compile(r'^(\d+)([mhdw])$')
+MAX_REPORT_WINDOW = timedelta(days=int(os.getenv("REPORT_MAX_WINDOW_DAYS", "366")))
+
+def parse_windows(spec: Optional[str]) -> List[Tuple[str, timedelta]]:
+    """Report windows from a comma-separated list such as "15m,hour,6h,day,30d"; empty means the defaults.
+
+    Raises ValueError for malformed, empty or too long windows.
+    """
+    if not spec or not spec.strip():
+        return list(REPORT_WINDOWS)
+    named = {name: span for name, span in REPORT_WINDOWS}
+    windows = []
+    for token in (part.strip().lower() for part in spec.split(',')):
+        if token in named:
+            span = named[token]
+        else:
+            match = WINDOW_PATTERN.match(token)
+            if not match:
+                raise ValueError(f"Invalid window '{token}', expected e.g. 15m, 6h, 30d or 2w")
+            span = int(match.group(1)) * WINDOW_UNITS[match.group(2)]
+        if span <= timedelta(0) or span > MAX_REPORT_WINDOW:
+            raise ValueError(f"Window '{token}' must be longer than zero and at most {MAX_REPORT_WINDOW.days} days")
+        if any(span == existing for _, existing in windows):
+            continue
+        name = next((name for name, existing in named.items() if existing == span), token)
+        windows.append((name, span))
+    return windows
+
+def format_windows(windows: Sequence[Tuple[str, timedelta]]) -> str:
+    return ','.join(name for name, _ in windows)
+
+def report_columns(windows: Sequence[Tuple[str, timedelta]] = REPORT_WINDOWS) -> List[str]:
+    return (['store_id'] + [f'uptime_last_{name}' for name, _ in windows]
+            + [f'downtime_last_{name}' for name, _ in windows])
+
+def report_frame(store_ids: np.ndarray, windows: Sequence[Tuple[str, timedelta]],
+                 totals: Sequence[Tuple[np.ndarray, np.ndarray]]) -> pd.DataFrame:
+    """Report columns from per-window (uptime, downtime) microseconds."""
+    report = pd.DataFrame({'store_id': store_ids})
+    for (name, span), (uptime, downtime) in zip(windows, totals):
+        # Windows up to an hour are reported in minutes, longer ones in hours.
+        divisor = US_PER_SECOND * 60 * (1 if span <= timedelta(hours=1) else 60)
+        report[f'uptime_last_{name}'] = uptime / divisor
+        report[f'downtime_last_{name}'] = downtime / divisor
+    return report[report_columns(windows)]
+
+@dataclass
+class FleetData:
+    """Everything the report needs, loaded in bulk and indexed by store position.
+
+    Each status row holds from its timestamp until the store's next row, and the
+    last row holds until ``horizon_us`` (or ends there when ``closed``). Business
+    periods are UTC intervals.
+    """
+    store_ids: np.ndarray      # object array of store ids
+    status_store: np.ndarray   # store position of each status row
+    status_ts: np.ndarray      # int64 microseconds since epoch (UTC)
+    status_active: np.ndarray  # bool
+    period_store: np.ndarray   # store position of each business period
+    period_start: np.ndarray
+    period_end: np.ndarray
+    horizon_us: int
+    closed: bool = False
+
+    @property
+    def n_stores(self) -> int:
+        return len(self.store_ids)
+
+def get_current_time(db: Session) -> Optional[datetime]:
+    row = db.execute(text(status_queries(db)['bounds'])).first()
+    if not row or row[1] is None:
+        return None
+    return pd.Timestamp(row[1]).to_pydatetime()
+
+STATUS_SQL = (
+    "SELECT id, store_id, timestamp_utc, status FROM store_status "
+    "WHERE {store_filter} AND timestamp_utc >= :since AND timestamp_utc <= :until"
+)
+
+# The latest row before the range tells us each store's status when the range opens.
+CARRY_IN_SQL = (
+    "SELECT id, store_id, timestamp_utc, status FROM store_status WHERE id IN ("
+    "SELECT (SELECT x.id FROM store_status x WHERE x.store_id = stores.store_id "
+    "AND x.timestamp_utc < :since ORDER BY x.timestamp_utc DESC LIMIT 1) "
+    "FROM stores WHERE {store_filter})"
+)
+
+# The first row after the range tells a closed timeline where its last span ends.
+CARRY_OUT_SQL = (
+    "SELECT id, store_id, timestamp_utc, status FROM store_status WHERE id IN ("
+    "SELECT (SELECT x.id FROM store_status x WHERE x.store_id = stores.store_id "
+    "AND x.timestamp_utc > :until ORDER BY x.timestamp_utc LIMIT 1) "
+    "FROM stores WHERE {store_filter})"
+)
+
+# Each store's latest row.
+LATEST_SQL = (
+    "SELECT id, store_id, timestamp_utc, status FROM store_status WHERE id IN ("
+    "SELECT (SELECT x.id FROM store_status x WHERE x.store_id = stores.store_id "
+    "ORDER BY x.timestamp_utc DESC LIMIT 1) FROM stores WHERE {store_filter})"
+)
+
+# The same queries over status_intervals. A run is read back as its first and last
+# poll (ids 2 * id and 2 * id + 1), which gives exactly the spans of the raw rows:
+# the polls dropped in between only repeated the status.
+# Runs touching the range are read once and split into those polls by run_points.
+INTERVAL_RUNS_SQL = (
+    "SELECT id, store_id, start_utc, end_utc, status FROM status_intervals "
+    "WHERE {store_filter} AND end_utc >= :since AND start_utc <= :until"
+)
+
+INTERVAL_CARRY_IN_SQL = (
+    "SELECT CASE WHEN end_utc < :since THEN id * 2 + 1 ELSE id * 2 END AS id, store_id, "
+    "CASE WHEN end_utc < :since THEN end_utc ELSE start_utc END AS timestamp_utc, status "
+    "FROM status_intervals WHERE id IN ("
+    "SELECT (SELECT x.id FROM status_intervals x WHERE x.store_id = stores.store_id "
+    "AND x.start_utc < :since ORDER BY x.start_utc DESC, x.id DESC LIMIT 1) "
+    "FROM stores WHERE {store_filter})"
+)
+
+INTERVAL_CARRY_OUT_SQL = (
+    "SELECT CASE WHEN start_utc > :until THEN id * 2 ELSE id * 2 + 1 END AS id, store_id, "
+    "CASE WHEN start_utc > :until THEN start_utc ELSE end_utc END AS timestamp_utc, status "
+    "FROM status_intervals WHERE id IN ("
+    "SELECT (SELECT x.id FROM status_intervals x WHERE x.store_id = stores.store_id "
+    "AND x.end_utc > :until ORDER BY x.end_utc, x.id LIMIT 1) "
+    "FROM stores WHERE {store_filter})"
+)
+
+INTERVAL_LATEST_SQL = (
+    "SELECT id * 2 + 1 AS id, store_id, end_utc AS timestamp_utc, status FROM status_intervals WHERE id IN ("
+    "SELECT (SELECT x.id FROM status_intervals x WHERE x.store_id = stores.store_id "
+    "ORDER BY x.end_utc DESC, x.id DESC LIMIT 1) FROM stores WHERE {store_filter})"
+)
+
+RAW_QUERIES = {
+    'status': STATUS_SQL,
+    'carry_in': CARRY_IN_SQL,
+    'carry_out': CARRY_OUT_SQL,
+    'latest': LATEST_SQL,
+    'bounds': "SELECT MIN(timestamp_utc), MAX(timestamp_utc) FROM store_status",
+    'all': "SELECT id, store_id, timestamp_utc, status FROM store_status ORDER BY timestamp_utc, id",
+    'first': "SELECT MIN(x.timestamp_utc) FROM store_status x WHERE x.store_id = stores.store_id",
+}
+
+INTERVAL_QUERIES = {
+    'runs': INTERVAL_RUNS_SQL,
+    'carry_in': INTERVAL_CARRY_IN_SQL,
+    'carry_out': INTERVAL_CARRY_OUT_SQL,
+    'latest': INTERVAL_LATEST_SQL,
+    'bounds': "SELECT MIN(start_utc), MAX(end_utc) FROM status_intervals",
+    'all': (
+        "SELECT id * 2 AS id, store_id, start_utc AS timestamp_utc, status FROM status_intervals "
+        "UNION ALL SELECT id * 2 + 1, store_id, end_utc, status FROM status_intervals WHERE end_utc > start_utc "
+        "ORDER BY timestamp_utc, id"
+    ),
+    'first': "SELECT MIN(x.start_utc) FROM status_intervals x WHERE x.store_id = stores.store_id",
+}
+
+def intervals_current(db: Session) -> bool:
+    built, loaded = get_data_versions(db, STATUS_INTERVALS, STORE_STATUS, default=None)
+    return built is not None and built == loaded
+
+def status_queries(db: Session) -> Dict[str, str]:
+    """Status queries over status_intervals when it is current, else over the raw store_status rows."""
+    return INTERVAL_QUERIES if intervals_current(db) else RAW_QUERIES
+
+def _points(rows: pd.DataFrame) -> pd.DataFrame:
+    """id, store_id, ts (microseconds) and status of status query rows."""
+    if not len(rows):
+        return pd.DataFrame({'id': np.array([], dtype=np.int64), 'store_id': np.array([], dtype=object),
+                             'ts': np.array([], dtype=np.int64), 'status': np.array([], dtype=object)})
+    return pd.DataFrame({
+        'id': rows['id'].to_numpy(dtype=np.int64),
+        'store_id': rows['store_id'].astype(str).to_numpy(),
+        'ts': (pd.to_datetime(rows['timestamp_utc'], format='ISO8601').astype('int64') // 1000).to_numpy(),
+        'status': rows['status'].to_numpy(),
+    })
+
+def run_points(runs: pd.DataFrame, since_us: int, until_us: int) -> pd.DataFrame:
+    """The first and last polls of status_intervals runs that fall inside [since, until], as in _points."""
+    if not len(runs):
+        return _points(runs)
+    ids = runs['id'].to_numpy(dtype=np.int64)
+    store = runs['store_id'].astype(str).to_numpy()
+    status = runs['status'].to_numpy()
+    start = (pd.to_datetime(runs['start_utc'], format='ISO8601').astype('int64') // 1000).to_numpy()
+    end = (pd.to_datetime(runs['end_utc'], format='ISO8601').astype('int64') // 1000).to_numpy()
+    first = (start >= since_us) & (start <= until_us)
+    last = (end >= since_us) & (end <= until_us) & (end > start)
+    return pd.DataFrame({
+        'id': np.concatenate((ids[first] * 2, ids[last] * 2 + 1)),
+        'store_id': np.concatenate((store[first], store[last])),
+        'ts': np.concatenate((start[first], end[last])),
+        'status': np.concatenate((status[first], status[last])),
+    })
+
+def load_fleet(db: Session, since: datetime, until: datetime, store_ids: Optional[Sequence[str]] = None,
+               closed: bool = False, cached_index: bool = False) -> FleetData:
+    """Status rows and business periods for ``store_ids`` (all stores when None) over [since, until].
+
+    The whole fleet always uses the cached business hours index; a subset builds
+    its own unless ``cached_index`` asks for slices of the cached one, which suits
+    report batches that together cover the fleet over the usual report range. A
+    single store uses its cached intervals (see ``store_business_hours``).
+    """
+    with phase('query'):
+        stores = read_rows(db, "SELECT store_id FROM stores WHERE {store_filter} ORDER BY store_id", {}, store_ids)
+    ids = stores['store_id'].astype(str).to_numpy(dtype=object) if len(stores) else np.array([], dtype=object)
+    position = pd.Series(np.arange(len(ids)), index=ids)
+
+    with phase('business_hours'):
+        if store_ids is not None and not cached_index and len(ids) == 1:
+            period_start, period_end = store_business_hours(db, ids[0], since, until)
+            period_store = np.zeros(len(period_start), dtype=np.int64)
+        else:
+            if store_ids is None or cached_index:
+                index = get_business_hours_index(db, since, until)
+            else:
+                index = build_business_hours_index(db, since, until, ids)
+            period_store, period_start, period_end = index.fleet_intervals(ids)
+
+    params = {'since': as_db_timestamp(since), 'until': as_db_timestamp(until)}
+    sql = status_queries(db)
+    queries = [sql['carry_in']] + ([sql['carry_out']] if closed else [])
+    with phase('query'):
+        frames = [_points(read_rows(db, query, params, store_ids)) for query in queries]
+        if 'runs' in sql:
+            frames.append(run_points(read_rows(db, sql['runs'], params, store_ids), to_utc_us(since), to_utc_us(until)))
+        else:
+            frames.append(_points(read_rows(db, sql['status'], params, store_ids)))
+    status = pd.concat(frames, ignore_index=True)
+    store_pos = position.index.get_indexer(status['store_id'])
+    known = store_pos >= 0
+    store_pos, ts = store_pos[known].astype(np.int64), status['ts'].to_numpy(dtype=np.int64)[known]
+    order = np.lexsort((status['id'].to_numpy(dtype=np.int64)[known], ts, store_pos))
+
+    return FleetData(
+        store_ids=ids,
+        status_store=store_pos[order],
+        status_ts=ts[order],
+        status_active=(status['status'].to_numpy()[known] == 'active')[order],
+        period_store=period_store,
+        period_start=period_start,
+        period_end=period_end,
+        horizon_us=to_utc_us(until),
+        closed=closed,
+    )
+
+def status_segments(fleet: FleetData) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(store position, start, end, active) for the span each status row holds."""
+    store, start, active = fleet.status_store, fleet.status_ts, fleet.status_active
+    # A closed timeline stops at each store's last row instead of running to the horizon.
+    last_end = start if fleet.closed else np.full(len(start), fleet.horizon_us, dtype=np.int64)
+    end = last_end.copy()
+    same_store = store[1:] == store[:-1]
+    end[:-1] = np.where(same_store, start[1:], last_end[:-1])
+    return store, start, end, active
+
+def business_overlap(fleet: FleetData, store: np.ndarray, span_start: np.ndarray, span_end: np.ndarray,
+                     range_start_us: int, range_end_us: int) -> np.ndarray:
+    """Business time inside each [span_start, span_end), all spans within the given range."""
+    # Lay every store out on one axis so one searchsorted serves the whole fleet:
+    # business(x) is the business time on the axis before key x.
+    span = range_end_us - range_start_us + 1
+    p_start = np.clip(fleet.period_start, range_start_us, range_end_us)
+    p_end = np.clip(fleet.period_end, range_start_us, range_end_us)
+    p_keep = p_end > p_start
+    p_key = fleet.period_store[p_keep] * span + (p_start[p_keep] - range_start_us)
+    p_len = (p_end - p_start)[p_keep]
+    p_before = np.concatenate(([0], np.cumsum(p_len)))
+    if not len(p_key):
+        return np.zeros(len(store), dtype=np.int64)
+
+    def business(key: np.ndarray) -> np.ndarray:
+        i = np.searchsorted(p_key, key, side='right') - 1
+        j = np.maximum(i, 0)
+        return np.where(i >= 0, p_before[j] + np.clip(key - p_key[j], 0, p_len[j]), 0)
+
+    return (business(store * span + (span_end - range_start_us))
+            - business(store * span + (span_start - range_start_us)))
+
+def window_totals(fleet: FleetData, window_start_us: int, window_end_us: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Uptime and downtime in microseconds per store: status spans ∩ business periods ∩ window."""
+    with phase('interval_math'):
+        return _window_totals(fleet, window_start_us, window_end_us)
+
+def _window_totals(fleet: FleetData, window_start_us: int, window_end_us: int) -> Tuple[np.ndarray, np.ndarray]:
+    uptime = np.zeros(fleet.n_stores, dtype=np.int64)
+    downtime = np.zeros(fleet.n_stores, dtype=np.int64)
+
+    store, seg_start, seg_end, active = status_segments(fleet)
+    seg_start = np.maximum(seg_start, window_start_us)
+    seg_end = np.minimum(seg_end, window_end_us)
+    keep = seg_end > seg_start
+    store, seg_start, seg_end, active = store[keep], seg_start[keep], seg_end[keep], active[keep]
+    if not len(store):
+        return uptime, downtime
+
+    overlap = business_overlap(fleet, store, seg_start, seg_end, window_start_us, window_end_us)
+    np.add.at(uptime, store[active], overlap[active])
+    np.add.at(downtime, store[~active], overlap[~active])
+    return uptime, downtime
+
+def multi_window_totals(fleet: FleetData, window_starts_us: Sequence[int],
+                        end_us: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Uptime and downtime per store for every window [start, end_us), from one pass over the spans."""
+    with phase('interval_math'):
+        return _multi_window_totals(fleet, window_starts_us, end_us)
+
+def _multi_window_totals(fleet: FleetData, window_starts_us: Sequence[int],
+                         end_us: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    range_start_us = min(window_starts_us)
+    store, seg_start, seg_end, active = status_segments(fleet)
+    seg_start = np.maximum(seg_start, range_start_us)
+    seg_end = np.minimum(seg_end, end_us)
+    keep = seg_end > seg_start
+    store, seg_start, seg_end, active = store[keep], seg_start[keep], seg_end[keep], active[keep]
+    if not len(store):
+        empty = np.zeros(fleet.n_stores, dtype=np.int64)
+        return [(empty, empty.copy()) for _ in window_starts_us]
+
+    # Business time of every span over the longest window, as running totals along
+    # the store-major axis; a window is then a difference of two prefix sums plus
+    # the part of the span it starts in.
+    overlap = business_overlap(fleet, store, seg_start, seg_end, range_start_us, end_us)
+    up_before = np.concatenate(([0], np.cumsum(np.where(active, overlap, 0))))
+    down_before = np.concatenate(([0], np.cumsum(np.where(active, 0, overlap))))
+    span = end_us - range_start_us + 1
+    key = store * span + (seg_start - range_start_us)
+    stores = np.arange(fleet.n_stores, dtype=np.int64)
+    store_end = np.searchsorted(store, stores, side='right')
+
+    totals = []
+    for start_us in window_starts_us:
+        # First span starting inside the window, and the span the window opens in.
+        first = np.searchsorted(key, stores * span + (start_us - range_start_us), side='left')
+        uptime = up_before[store_end] - up_before[first]
+        downtime = down_before[store_end] - down_before[first]
+
+        opening = first - 1
+        straddles = opening >= 0
+        straddles[straddles] = (store[opening[straddles]] == stores[straddles]) & (seg_end[opening[straddles]] > start_us)
+        opening = opening[straddles]
+        partial = business_overlap(fleet, store[opening], np.full(len(opening), start_us, dtype=np.int64),
+                                   seg_end[opening], range_start_us, end_us)
+        uptime[stores[straddles]] += np.where(active[opening], partial, 0)
+        downtime[stores[straddles]] += np.where(active[opening], 0, partial)
+        totals.append((uptime, downtime))
+    return totals
+
+def bucket_totals(fleet: FleetData, range_start_us: int, range_end_us: int, bucket_us: int) -> pd.DataFrame:
+    """Uptime and downtime per store and fixed-size bucket; only buckets with business time are returned.
+
+    ``range_start_us`` must be aligned to ``bucket_us``.
+    """
+    with phase('interval_math'):
+        return _bucket_totals(fleet, range_start_us, range_end_us, bucket_us)
+
+def _bucket_totals(fleet: FleetData, range_start_us: int, range_end_us: int, bucket_us: int) -> pd.DataFrame:
+    store, seg_start, seg_end, active = status_segments(fleet)
+    seg_start = np.maximum(seg_start, range_start_us)
+    seg_end = np.minimum(seg_end, range_end_us)
+    keep = seg_end > seg_start
+    store, seg_start, seg_end, active = store[keep], seg_start[keep], seg_end[keep], active[keep]
+
+    # Split every span at bucket boundaries.
+    first = (seg_start - range_start_us) // bucket_us
+    last = (seg_end - 1 - range_start_us) // bucket_us
+    pieces = last - first + 1
+    piece_of = np.repeat(np.arange(len(store)), pieces)
+    bucket = np.repeat(first, pieces) + (np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces))
+    bucket_start = range_start_us + bucket * bucket_us
+    piece_start = np.maximum(seg_start[piece_of], bucket_start)
+    piece_end = np.minimum(seg_end[piece_of], bucket_start + bucket_us)
+    piece_store = store[piece_of]
+    piece_active = active[piece_of]
+
+    overlap = business_overlap(fleet, piece_store, piece_start, piece_end, range_start_us, range_end_us)
+    frame = pd.DataFrame({
+        'store_pos': piece_store,
+        'bucket_start': bucket_start,
+        'uptime': np.where(piece_active, overlap, 0),
+        'downtime': np.where(piece_active, 0, overlap),
+    })
+    frame = frame.groupby(['store_pos', 'bucket_start'], as_index=False, sort=True)[['uptime', 'downtime']].sum()
+    return frame[(frame['uptime'] > 0) | (frame['downtime'] > 0)].reset_index(drop=True)
+
+def _bucket_areas(bucket: np.ndarray, remaining: np.ndarray, delta: np.ndarray, n_buckets: int,
+                  bucket_us: int) -> np.ndarray:
+    """Area under a step function per bucket, from jumps of ``delta`` that are ``remaining`` before their bucket ends."""
+    jumps = np.bincount(bucket, weights=delta, minlength=n_buckets + 1)[:n_buckets].round().astype(np.int64)
+    level = np.concatenate(([0], np.cumsum(jumps)[:-1]))
+    within = np.zeros(n_buckets + 1, dtype=np.int64)
+    np.add.at(within, bucket, delta * remaining)
+    return level * bucket_us + within[:n_buckets]
+
+def availability_series(fleet: FleetData, range_start_us: int, range_end_us: int, bucket_us: int) -> pd.DataFrame:
+    """Store-time per fixed-size bucket across the fleet: open (in business hours), and active or inactive within them.
+
+    The range must be a whole number of buckets. Nothing is counted past the
+    fleet's horizon, where the status data ends.
+    """
+    with phase('interval_math'):
+        return _availability_series(fleet, range_start_us, range_end_us, bucket_us)
+
+def _availability_series(fleet: FleetData, range_start_us: int, range_end_us: int, bucket_us: int) -> pd.DataFrame:
+    store, seg_start, seg_end, active = status_segments(fleet)
+    seg_start = np.maximum(seg_start, range_start_us)
+    seg_end = np.minimum(seg_end, range_end_us)
+    keep = seg_end > seg_start
+    store, seg_start, seg_end, active = store[keep], seg_start[keep], seg_end[keep], active[keep]
+    data_end_us = max(range_start_us, min(range_end_us, fleet.horizon_us))
+    p_start = np.clip(fleet.period_start, range_start_us, data_end_us)
+    p_end = np.clip(fleet.period_end, range_start_us, data_end_us)
+    p_keep = p_end > p_start
+    p_store, p_start, p_end = fleet.period_store[p_keep], p_start[p_keep], p_end[p_keep]
+
+    # Every store is a sum of three 0/1 step functions: open, active and inactive.
+    # Sweeping their edges per store gives the products (active and open, ...) as
+    # jumps, which add up across the fleet without any per-bucket splitting.
+    n_seg, n_per = len(store), len(p_store)
+    ev_store = np.concatenate((store, store, p_store, p_store))
+    ev_t = np.concatenate((seg_start, seg_end, p_start, p_end))
+    up = np.where(active, 1, 0)
+    down = 1 - up
+    ev_open = np.concatenate((np.zeros(2 * n_seg, dtype=np.int64), np.ones(n_per, dtype=np.int64),
+                              -np.ones(n_per, dtype=np.int64)))
+    ev_up = np.concatenate((up, -up, np.zeros(2 * n_per, dtype=np.int64)))
+    ev_down = np.concatenate((down, -down, np.zeros(2 * n_per, dtype=np.int64)))
+    span = range_end_us - range_start_us + 1
+    order = np.argsort(ev_store * span + (ev_t - range_start_us), kind='stable')
+    ev_t = ev_t[order]
+    # Each store's edges net to zero, so running sums over the store-major order are per-store levels.
+    open_level = np.cumsum(ev_open[order])
+    up_level = open_level * np.cumsum(ev_up[order])
+    down_level = open_level * np.cumsum(ev_down[order])
+
+    n_buckets = (range_end_us - range_start_us) // bucket_us
+    bucket = (ev_t - range_start_us) // bucket_us
+    remaining = range_start_us + (bucket + 1) * bucket_us - ev_t
+    totals = {}
+    for name, level in (('open', open_level), ('uptime', up_level), ('downtime', down_level)):
+        delta = np.diff(level, prepend=0)
+        jump = delta != 0
+        totals[name] = _bucket_areas(bucket[jump], remaining[jump], delta[jump], n_buckets, bucket_us)
+    bucket_start = range_start_us + np.arange(n_buckets, dtype=np.int64) * bucket_us
+    return pd.DataFrame({'bucket_start': bucket_start, **totals})
+
+def window_start_us(end_us: int, span: timedelta) -> int:
+    return end_us - int(span.total_seconds() * US_PER_SECOND)
+
+def compute_report(fleet: FleetData, current_time: datetime,
+                   windows: Sequence[Tuple[str, timedelta]] = REPORT_WINDOWS) -> pd.DataFrame:
+    end_us = to_utc_us(current_time)
+    totals = multi_window_totals(fleet, [window_start_us(end_us, span) for _, span in windows], end_us)
+    return report_frame(fleet.store_ids, windows, totals)
+
+def build_report(db: Session, current_time: datetime, store_ids: Optional[Sequence[str]] = None,
+                 cached_index: bool = False, windows: Sequence[Tuple[str, timedelta]] = REPORT_WINDOWS) -> pd.DataFrame:
+    longest = max(span for _, span in windows)
+    fleet = load_fleet(db, current_time - longest, current_time, store_ids, cached_index=cached_index)
+    logger.info(f"Loaded {fleet.n_stores} stores and {len(fleet.status_ts)} status rows for report")
+    return compute_report(fleet, current_time, windows)
@@ -0,0 +1,213 @@
+from typing import Iterable, List, Optional, Sequence, Tuple
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from models.uptime_rollup import UptimeRollup
+from controllers.data_versions import BUSINESS_HOURS, STORES, get_data_versions, set_data_version
+from controllers.business_hours_index import get_business_hours_index
+from controllers.db_utils import as_db_timestamp, chunked, from_utc_us, read_rows, to_utc_us
+from controllers.uptime_engine import (
+    REPORT_WINDOWS, US_PER_SECOND, FleetData, bucket_totals, load_fleet, report_frame, status_queries,
+    window_start_us, window_totals,
+)
+from metrics import phase
+import logging
+
+logger = logging.getLogger(__name__)
+
+HOUR_US = 3600 * US_PER_SECOND
+INSERT_ROLLUP_SQL = "INSERT INTO uptime_rollups (store_id, hour_utc, uptime_us, downtime_us) VALUES (?, ?, ?, ?)"
+REBUILD_CHUNK_STORES = 1000
+
+# Versions of the reference tables the rollups were clipped with.
+ROLLUP_BUSINESS_HOURS = "rollup_business_hours"
+ROLLUP_STORES = "rollup_stores"
+
+def _floor_hour(value_us: int) -> int:
+    return value_us - value_us % HOUR_US
+
+def rollups_current(db: Session) -> bool:
+    built = get_data_versions(db, ROLLUP_BUSINESS_HOURS, ROLLUP_STORES, default=None)
+    return None not in built and built == get_data_versions(db, BUSINESS_HOURS, STORES)
+
+def _known_stores(db: Session, store_ids: Iterable[str]) -> List[str]:
+    rows = read_rows(db, "SELECT store_id FROM stores WHERE {store_filter} ORDER BY store_id", {}, sorted(store_ids))
+    return rows['store_id'].astype(str).tolist() if len(rows) else []
+
+def _refresh_range(db: Session, store_ids: List[str], start_us: int, end_us: int, cached_index: bool = False):
+    """Recompute the hourly buckets in [start_us, end_us) for the given stores.
+
+    ``cached_index`` slices the shared business hours index instead of building
+    one, for callers that do not change the hours or timezones.
+    """
+    start, end = from_utc_us(start_us), from_utc_us(end_us)
+    fleet = load_fleet(db, start, end, store_ids, closed=True, cached_index=cached_index)
+    buckets = bucket_totals(fleet, start_us, end_us, HOUR_US)
+
+    for chunk in chunked(store_ids):
+        db.query(UptimeRollup).filter(
+            UptimeRollup.store_id.in_(chunk),
+            UptimeRollup.hour_utc >= start,
+            UptimeRollup.hour_utc < end
+        ).delete(synchronize_session=False)
+
+    if len(buckets):
+        hours = np.char.replace(np.datetime_as_string(
+            buckets['bucket_start'].to_numpy(dtype=np.int64).astype('datetime64[us]'), unit='us'), 'T', ' ')
+        db.connection().exec_driver_sql(INSERT_ROLLUP_SQL, list(zip(
+            fleet.store_ids[buckets['store_pos'].to_numpy()].tolist(), hours.tolist(),
+            buckets['uptime'].astype(int).tolist(), buckets['downtime'].astype(int).tolist())))
+    return len(buckets)
+
+def _carry_hours(db: Session, query: str, param: str, hours: pd.Series) -> pd.Series:
+    """Hour of each store's carry row for ``query`` at its own ``hours`` value, one query per distinct hour."""
+    found = []
+    for hour_us, group in hours.groupby(hours):
+        rows = read_rows(db, query, {param: as_db_timestamp(from_utc_us(int(hour_us)))}, group.index.tolist())
+        if len(rows):
+            ts = pd.to_datetime(rows['timestamp_utc'], format='ISO8601').astype('int64') // 1000
+            found.append(pd.Series(ts.to_numpy() - ts.to_numpy() % HOUR_US, index=rows['store_id'].astype(str)))
+    return pd.concat(found) if found else pd.Series(dtype=np.int64)
+
+def update_rollups(db: Session, new_polls: pd.DataFrame):
+    """Recompute only the buckets whose spans can change after new polls were added.
+
+    ``new_polls`` holds each store's first and last new poll ('min' and 'max',
+    UTC microseconds, indexed by store_id). New polls change the spans from the
+    store's previous row up to its next existing row, so each store refreshes
+    its own range, from its row before the hour of its first new poll to its
+    row after the hour of its last one. Stores with the same range are
+    refreshed together.
+    """
+    if not rollups_current(db):
+        logger.info("Uptime rollups are stale, skipping incremental update")
+        return
+    stores = _known_stores(db, new_polls.index)
+    if not stores:
+        return
+
+    new_polls = new_polls.loc[stores]
+    start = new_polls['min'] - new_polls['min'] % HOUR_US
+    end = new_polls['max'] - new_polls['max'] % HOUR_US + HOUR_US
+    sql = status_queries(db)
+    before = _carry_hours(db, sql['carry_in'], 'since', start)
+    after = _carry_hours(db, sql['carry_out'], 'until', end)
+    ranges = pd.DataFrame({
+        'start': np.minimum(start, before.reindex(start.index).fillna(start)).astype(np.int64),
+        'end': np.maximum(end, after.reindex(end.index).fillna(end - HOUR_US) + HOUR_US).astype(np.int64),
+    })
+
+    groups = ranges.groupby(['start', 'end'])
+    written = 0
+    for (start_us, end_us), group in groups:
+        written += _refresh_range(db, group.index.tolist(), int(start_us), int(end_us), cached_index=True)
+    logger.info(f"Refreshed {written} hourly rollups for {len(stores)} stores in {groups.ngroups} ranges")
+
+def rebuild_rollups(db: Session, store_ids: Optional[Iterable[str]] = None):
+    """Rebuild buckets from scratch, e.g. after business hours or timezones change.
+
+    With ``store_ids`` only those stores are rebuilt; callers must only pass a
+    subset when the other stores' rollups were current before the change.
+    """
+    bounds = db.execute(text(status_queries(db)['bounds'])).first()
+    if store_ids is None:
+        db.query(UptimeRollup).delete(synchronize_session=False)
+    else:
+        store_ids = sorted(set(store_ids))
+        for chunk in chunked(store_ids):
+            db.query(UptimeRollup).filter(UptimeRollup.store_id.in_(chunk)).delete(synchronize_session=False)
+
+    if bounds and bounds[0] is not None:
+        start_us = _floor_hour(to_utc_us(pd.Timestamp(bounds[0]).to_pydatetime()))
+        end_us = _floor_hour(to_utc_us(pd.Timestamp(bounds[1]).to_pydatetime())) + HOUR_US
+        if store_ids is None:
+            stores = [row[0] for row in db.execute(text("SELECT store_id FROM stores ORDER BY store_id"))]
+        else:
+            stores = _known_stores(db, store_ids)
+        written = 0
+        for chunk in chunked(stores, REBUILD_CHUNK_STORES):
+            written += _refresh_range(db, chunk, start_us, end_us)
+        logger.info(f"Rebuilt {written} hourly rollups for {len(stores)} stores")
+
+    hours_version, stores_version = get_data_versions(db, BUSINESS_HOURS, STORES)
+    set_data_version(db, ROLLUP_BUSINESS_HOURS, hours_version)
+    set_data_version(db, ROLLUP_STORES, stores_version)
+    db.commit()
+
+def _edge_totals(db: Session, start_us: int, end_us: int, store_ids: Optional[List[str]]) -> tuple:
+    fleet = load_fleet(db, from_utc_us(start_us), from_utc_us(end_us), store_ids, cached_index=True)
+    return window_totals(fleet, start_us, end_us)
+
+def build_report_from_rollups(db: Session, current_time: datetime, store_ids: Optional[List[str]] = None,
+                              windows: Sequence[Tuple[str, timedelta]] = REPORT_WINDOWS) -> pd.DataFrame:
+    """Report from hourly rollups plus exact raw-data edges.
+
+    Each window [S, E] splits into a partial hour [S, A) and [B, E] computed from
+    raw rows, and the whole hours [A, B) summed from rollups. Rollups stop at each
+    store's latest row, so the time from there to B is added at the latest status.
+    """
+    end_us = to_utc_us(current_time)
+    b_us = _floor_hour(end_us)
+    if store_ids is None:
+        stores = [row[0] for row in db.execute(text("SELECT store_id FROM stores ORDER BY store_id"))]
+    else:
+        stores = store_ids = _known_stores(db, store_ids)
+    ids = np.array(stores, dtype=object)
+    position = pd.Series(np.arange(len(ids)), index=ids)
+
+    bounds = []
+    for _, span in windows:
+        start_us = window_start_us(end_us, span)
+        bounds.append((start_us, -(-start_us // HOUR_US) * HOUR_US))
+
+    sums = [f"SUM(CASE WHEN hour_utc >= :a{i} THEN uptime_us ELSE 0 END) AS up{i}, "
+            f"SUM(CASE WHEN hour_utc >= :a{i} THEN downtime_us ELSE 0 END) AS down{i}"
+            for i in range(len(bounds))]
+    params = {f"a{i}": as_db_timestamp(from_utc_us(a_us)) for i, (_, a_us) in enumerate(bounds)}
+    params['first'] = min(params.values())
+    params['b'] = as_db_timestamp(from_utc_us(b_us))
+    with phase('query'):
+        rolled = read_rows(
+            db,
+            f"SELECT store_id, {', '.join(sums)} FROM uptime_rollups "
+            "WHERE {store_filter} AND hour_utc >= :first AND hour_utc < :b GROUP BY store_id",
+            params,
+            store_ids,
+        ).reindex(columns=['store_id'] + [f"{kind}{i}" for i in range(len(bounds)) for kind in ('up', 'down')])
+        rolled = rolled.set_index('store_id').reindex(ids).fillna(0).astype(np.int64)
+        # Each store's latest row; it holds from there to the report time.
+        latest = read_rows(db, status_queries(db)['latest'], {}, store_ids)
+        latest = latest.reindex(columns=['id', 'store_id', 'timestamp_utc', 'status'])
+    latest = latest[latest['store_id'].isin(position.index)]
+    first_start = min(start_us for start_us, _ in bounds)
+    with phase('business_hours'):
+        index = get_business_hours_index(db, from_utc_us(first_start), current_time)
+        period_store, period_start, period_end = index.fleet_intervals(ids)
+    latest_pos = position.loc[latest['store_id']].to_numpy()
+    order = np.argsort(latest_pos, kind='mergesort')
+    tail_fleet = FleetData(
+        store_ids=ids,
+        status_store=latest_pos[order],
+        status_ts=(pd.to_datetime(latest['timestamp_utc'], format='ISO8601').astype('int64') // 1000).to_numpy()[order],
+        status_active=(latest['status'] == 'active').to_numpy()[order],
+        period_store=period_store,
+        period_start=period_start,
+        period_end=period_end,
+        horizon_us=b_us,
+    )
+
+    last_up, last_down = _edge_totals(db, b_us, end_us, store_ids)
+    totals = []
+    for i, (start_us, a_us) in enumerate(bounds):
+        if a_us >= b_us:
+            uptime, downtime = _edge_totals(db, start_us, end_us, store_ids)
+        else:
+            head_up, head_down = _edge_totals(db, start_us, a_us, store_ids) if start_us < a_us else (0, 0)
+            tail_up, tail_down = window_totals(tail_fleet, a_us, b_us)
+            uptime = head_up + rolled[f'up{i}'].to_numpy() + tail_up + last_up
+            downtime = head_down + rolled[f'down{i}'].to_numpy() + tail_down + last_down
+        totals.append((uptime, downtime))
+
+    return report_frame(ids, windows, totals)
@@ -3,9 +3,16 @@ import os
 from datetime import datetime
 from sqlalchemy.orm import Session
 from database import engine, Base
+import migrations
 from models.store import Store
 from models.business_hours import BusinessHours
 from models.store_status import StoreStatus
+from models.status_interval import StatusInterval
+from models.status_watermark import StatusWatermark
+from controllers.data_versions import BUSINESS_HOURS, STORE_STATUS, STORES, bump_data_version
+from controllers.uptime_rollups import rebuild_rollups
+from controllers.status_intervals import rebuild_intervals
+from controllers.status_ingest import rebuild_watermarks
 
 def load_store_activities(csv_path: str, db: Session):
     """Load store activities from CSV"""
@@ -13,6 +20,8 @@ def load_store_activities(csv_path: str, db: Session):
     df = pd.read_csv(csv_path)
     
     df['timestamp_utc'] = pd.to_datetime(df['timestamp_utc'])
+    # One poll per store and timestamp; the last row in the file wins, as in an upload.
+    df = df.drop_duplicates(['store_id', 'timestamp_utc'], keep='last')
     
     records = []
     for _, row in df.iterrows():
@@ -69,12 +78,15 @@ def load_store_timezones(csv_path: str, db: Session):
 def main():
     # Create all tables
     Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
     
     # Create a new session
     db = Session(engine)
     
     try:
         # Clear existing data
+        db.query(StatusInterval).delete()
+        db.query(StatusWatermark).delete()
         db.query(StoreStatus).delete()
         db.query(BusinessHours).delete()
         db.query(Store).delete()
@@ -85,6 +97,12 @@ def main():
         load_business_hours("data/business_hours.csv", db)
         load_store_timezones("data/store_timezones.csv", db)
         
+        # Invalidate caches built from the old data and rebuild the status intervals and hourly rollups
+        bump_data_version(db, BUSINESS_HOURS, STORE_STATUS, STORES)
+        rebuild_intervals(db)
+        rebuild_watermarks(db)
+        rebuild_rollups(db)
+        
     except Exception as e:
         print(f"Error loading data: {str(e)}")
         db.rollback()
@@ -1,12 +1,18 @@
 from fastapi import FastAPI
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from controllers import csv_router, report_router
+from controllers.status_stream import stream_writer
+from controllers.report_scheduler import report_scheduler
 from database import engine, Base
+import migrations
+import metrics
 import uvicorn
 from datetime import datetime
 import pytz
 
 Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 app = FastAPI()
 
@@ -21,10 +27,20 @@ app.add_middleware(
 app.include_router(csv_router, prefix="/api", tags=["CSV Upload"])
 app.include_router(report_router, prefix="/api", tags=["Reports"])
 
+@app.on_event("shutdown")
+def stop_stream_writer():
+    # Write the polls still queued before the process exits.
+    stream_writer.stop(timeout=30)
+    report_scheduler.stop(timeout=30)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Restaurant Monitoring API"}
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 now = datetime.now(pytz.UTC)
 iso_time = now.isoformat()
 
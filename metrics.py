@@ -0,0 +1,212 @@
+from typing import Dict, List, Sequence, Tuple
+from contextlib import contextmanager
+import bisect
+import cProfile
+import os
+import threading
+import time
+from sqlalchemy import event
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Prometheus text exposition, kept in-process; each worker process reports its own numbers.
+CONTENT_TYPE = "text/plain; version=0.0.4"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Set to a directory to write a cProfile dump for every report.
+REPORT_PROFILE_DIR = os.getenv("REPORT_PROFILE_DIR")
+
+_registry: List["_Metric"] = []
+_lock = threading.Lock()
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, object] = {}
+        _registry.append(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = sorted(self._values.items())
+            lines += [line for key, value in items for line in self._sample_lines(key, value)]
+        return lines
+
+    def _sample_lines(self, key: Tuple, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _sample_lines(self, key: Tuple, state) -> List[str]:
+        counts, total, count = state
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+def render() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+REPORT_PHASE_SECONDS = Histogram(
+    "report_phase_seconds", "Time spent per report phase.", ["phase"]
+)
+REPORT_SECONDS = Histogram(
+    "report_seconds", "End-to-end report generation time.", ["source"]
+)
+REPORTS_TOTAL = Counter(
+    "reports_total", "Reports by how they were answered.", ["outcome"]
+)
+REPORT_STORES = Gauge(
+    "report_stores", "Stores in the most recent report.", []
+)
+STORE_UPTIME_SECONDS = Histogram(
+    "store_uptime_seconds", "Uptime/downtime calculation time per store, alone or averaged over a report batch.",
+    ["source"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+STORE_UPTIME_CACHE_TOTAL = Counter(
+    "store_uptime_cache_total", "Per-store uptime lookups by cache outcome.", ["outcome"]
+)
+SQL_QUERIES_TOTAL = Counter(
+    "sql_queries_total", "SQL statements executed.", ["statement"]
+)
+SQL_QUERY_SECONDS = Histogram(
+    "sql_query_seconds", "SQL statement execution time.", ["statement"]
+)
+INGEST_ROWS_TOTAL = Counter(
+    "ingest_rows_total", "Uploaded CSV rows.", ["kind", "outcome"]
+)
+INGEST_SECONDS = Histogram(
+    "ingest_seconds", "Upload job duration.", ["kind"]
+)
+INGEST_ROWS_PER_SECOND = Gauge(
+    "ingest_rows_per_second", "Throughput of the most recent upload job.", ["kind"]
+)
+STREAM_QUEUE_DEPTH = Gauge(
+    "stream_queue_depth", "Parsed pieces of streamed polls waiting for the writer.", []
+)
+STREAM_BATCH_ROWS = Histogram(
+    "stream_batch_rows", "Polls per stream writer transaction.", [],
+    buckets=(1, 10, 100, 500, 1000, 2500, 5000, 10000, 25000),
+)
+STREAM_LAG_SECONDS = Histogram(
+    "stream_ingest_lag_seconds", "Time from queueing a streamed piece to its commit.", []
+)
+STREAM_BACKPRESSURE_TOTAL = Counter(
+    "stream_backpressure_total", "Streaming requests turned away with 503 by a full queue.", []
+)
+STREAM_FAILED_BATCHES_TOTAL = Counter(
+    "stream_failed_batches_total", "Stream writer batches dropped after every attempt failed.", []
+)
+
+def phase(name: str):
+    """Time a block as one report phase: query, business_hours, interval_math or serialization."""
+    return REPORT_PHASE_SECONDS.time(phase=name)
+
+# The start time lives on the statement's execution context, so a statement that raises
+# (and never reaches after_cursor_execute) leaves nothing behind on the connection.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    kind = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+    SQL_QUERIES_TOTAL.inc(statement=kind)
+    started = getattr(context, "_query_started", None)
+    if started is not None:
+        SQL_QUERY_SECONDS.observe(time.perf_counter() - started, statement=kind)
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def record_ingest(kind: str, result: Dict, seconds: float):
+    inserted = result.get('rows_inserted', 0) + result.get('rows_updated', 0)
+    INGEST_ROWS_TOTAL.inc(inserted, kind=kind, outcome="written")
+    INGEST_ROWS_TOTAL.inc(result.get('rows_rejected', 0), kind=kind, outcome="rejected")
+    INGEST_ROWS_TOTAL.inc(result.get('rows_unchanged', 0), kind=kind, outcome="unchanged")
+    INGEST_ROWS_TOTAL.inc(result.get('rows_skipped', 0), kind=kind, outcome="skipped")
+    INGEST_SECONDS.observe(seconds, kind=kind)
+    if seconds > 0:
+        INGEST_ROWS_PER_SECOND.set(round(inserted / seconds, 1), kind=kind)
+
+@contextmanager
+def profiled(name: str):
+    """cProfile the block into REPORT_PROFILE_DIR/<name>.prof when profiling is enabled."""
+    if not REPORT_PROFILE_DIR:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(REPORT_PROFILE_DIR, exist_ok=True)
+        path = os.path.join(REPORT_PROFILE_DIR, f"{name}.prof")
+        profiler.dump_stats(path)
+        logger.info(f"Wrote profile {path}")
@@ -0,0 +1,71 @@
+from sqlalchemy import inspect, text
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Indexes that create_all() only adds to new tables; existing databases get them here.
+STATEMENTS = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_store_status_store_id_timestamp_utc "
+    "ON store_status (store_id, timestamp_utc)",
+    "CREATE INDEX IF NOT EXISTS ix_store_status_timestamp_utc ON store_status (timestamp_utc)",
+    # Superseded by the unique index above.
+    "DROP INDEX IF EXISTS ix_store_status_store_id",
+    "DROP INDEX IF EXISTS ix_store_status_store_id_timestamp_utc",
+]
+
+# Before the unique index, the later of two polls with the same store and
+# timestamp decided the status; keeping it leaves every report unchanged.
+DEDUPE_STORE_STATUS = (
+    "DELETE FROM store_status WHERE id NOT IN "
+    "(SELECT MAX(id) FROM store_status GROUP BY store_id, timestamp_utc)"
+)
+
+# Columns added to existing tables after their first release: table -> [(name, DDL type)].
+COLUMNS = {
+    "reports": [
+        ("artifact_path", "VARCHAR"),
+        ("size_bytes", "INTEGER"),
+        ("etag", "VARCHAR"),
+        ("error", "VARCHAR"),
+        ("data_version", "VARCHAR"),
+        ("windows", "VARCHAR"),
+    ],
+}
+
+def _add_missing_columns(engine):
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+    with engine.begin() as conn:
+        for table, columns in COLUMNS.items():
+            if table not in tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name, ddl_type in columns:
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+                    logger.info(f"Added column {table}.{name}")
+        if "reports" in tables:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_reports_created_at ON reports (created_at)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_reports_data_version ON reports (data_version)"))
+
+def upgrade(engine):
+    """Bring an existing database's columns and indexes up to date; safe to run on every start."""
+    _add_missing_columns(engine)
+    if "store_status" not in inspect(engine).get_table_names():
+        return
+    with engine.begin() as conn:
+        indexes = {index["name"] for index in inspect(conn).get_indexes("store_status")}
+        if "ux_store_status_store_id_timestamp_utc" not in indexes:
+            deleted = conn.execute(text(DEDUPE_STORE_STATUS)).rowcount
+            if deleted:
+                logger.info(f"Removed {deleted} duplicate store_status rows")
+        for statement in STATEMENTS:
+            conn.execute(text(statement))
+        conn.execute(text("PRAGMA optimize"))
+    logger.info("Database migrations applied")
+
+if __name__ == "__main__":
+    from database import Base, engine
+    import models
+    Base.metadata.create_all(bind=engine)
+    upgrade(engine)
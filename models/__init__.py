@@ -1,4 +1,8 @@
 from .store import Store
 from .business_hours import BusinessHours
 from .store_status import StoreStatus
-from .report import Report 
\ No newline at end of file
+from .report import Report
+from .data_version import DataVersion
+from .uptime_rollup import UptimeRollup
+from .status_interval import StatusInterval
+from .status_watermark import StatusWatermark
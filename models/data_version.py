@@ -0,0 +1,8 @@
+from sqlalchemy import Column, String, Integer
+from database import Base
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    name = Column(String, primary_key=True, index=True)  # table the counter tracks
+    version = Column(Integer, default=0)
@@ -1,11 +1,20 @@
-from sqlalchemy import Column, String, DateTime, JSON
+from sqlalchemy import Column, String, DateTime, JSON, Integer
 from database import Base
 
 class Report(Base):
     __tablename__ = "reports"
 
     report_id = Column(String, primary_key=True, index=True)
-    status = Column(String)  # 'Running', 'Complete', 'Failed'
+    status = Column(String)  # 'Queued', 'Running', 'Complete', 'Failed', 'Cancelled'
     data = Column(JSON, nullable=True)
-    created_at = Column(DateTime)
-    completed_at = Column(DateTime, nullable=True) 
\ No newline at end of file
+    created_at = Column(DateTime, index=True)
+    completed_at = Column(DateTime, nullable=True)
+    # The CSV body lives on disk as gzip; only its metadata is kept here.
+    artifact_path = Column(String, nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    etag = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    # Input data versions the report was triggered at, e.g. "12.3.4".
+    data_version = Column(String, nullable=True, index=True)
+    # Comma-separated report windows, e.g. "hour,day,week" or "15m,6h,30d".
+    windows = Column(String, nullable=True)
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, String, DateTime, Integer, Index
+from database import Base
+
+class StatusInterval(Base):
+    """A run of identical consecutive polls of one store.
+
+    ``start_utc`` and ``end_utc`` are the first and last poll of the run; the
+    status holds from ``start_utc`` until the next run starts.
+    """
+    __tablename__ = "status_intervals"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    store_id = Column(String)
+    status = Column(String)  # 'active' or 'inactive'
+    start_utc = Column(DateTime, index=True)
+    end_utc = Column(DateTime, index=True)
+
+    __table_args__ = (
+        Index("ix_status_intervals_store_id_start_utc", "store_id", "start_utc"),
+        Index("ix_status_intervals_store_id_end_utc", "store_id", "end_utc"),
+    )
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, DateTime
+from database import Base
+
+class StatusWatermark(Base):
+    """The newest poll timestamp loaded for a store; it survives raw poll pruning."""
+    __tablename__ = "status_watermarks"
+
+    store_id = Column(String, primary_key=True)
+    max_timestamp_utc = Column(DateTime)
@@ -1,10 +1,15 @@
-from sqlalchemy import Column, String, DateTime, Integer
+from sqlalchemy import Column, String, DateTime, Integer, Index
 from database import Base
 
 class StoreStatus(Base):
     __tablename__ = "store_status"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    store_id = Column(String, index=True)
-    timestamp_utc = Column(DateTime)
-    status = Column(String)  # 'active' or 'inactive' 
\ No newline at end of file
+    store_id = Column(String)
+    timestamp_utc = Column(DateTime, index=True)
+    status = Column(String)  # 'active' or 'inactive'
+
+    __table_args__ = (
+        # One poll per store and timestamp; also serves per-store time range scans.
+        Index("ux_store_status_store_id_timestamp_utc", "store_id", "timestamp_utc", unique=True),
+    )
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, DateTime, BigInteger
+from database import Base
+
+class UptimeRollup(Base):
+    __tablename__ = "uptime_rollups"
+
+    store_id = Column(String, primary_key=True)
+    hour_utc = Column(DateTime, primary_key=True, index=True)  # start of the UTC hour
+    uptime_us = Column(BigInteger, default=0)  # business-hours uptime, microseconds
+    downtime_us = Column(BigInteger, default=0)
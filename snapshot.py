@@ -0,0 +1,40 @@
+import argparse
+import sys
+from database import SessionLocal, engine, Base
+import migrations
+import models
+from controllers.snapshots import SNAPSHOT_FORMATS, build_report_from_snapshot, export_snapshot, import_snapshot
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, import or report from columnar snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write the database to a new snapshot directory")
+    export.add_argument("path")
+    export.add_argument("--format", choices=sorted(SNAPSHOT_FORMATS), default="arrow")
+    restore = commands.add_parser("import", help="replace the database contents with a snapshot")
+    restore.add_argument("path")
+    report = commands.add_parser("report", help="compute the report straight from a snapshot")
+    report.add_argument("path")
+    report.add_argument("-o", "--output", default="-", help="CSV file to write (default stdout)")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        build_report_from_snapshot(args.path).to_csv(sys.stdout if args.output == "-" else args.output, index=False)
+        return 0
+
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        if args.command == "export":
+            manifest = export_snapshot(db, args.path, args.format)
+            print(f"Exported {manifest['rows']} to {args.path}")
+        else:
+            rows = import_snapshot(db, args.path)
+            print(f"Imported {rows} from {args.path}")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.orm import sessionmaker
+import models
+from database import Base, make_engine
+from controllers import report_artifacts
+from controllers.business_hours_index import invalidate_business_hours_index
+
+STORE = 'store-1'
+# A Monday; the store is open 09:00-17:00 UTC every day.
+DAY = datetime(2023, 1, 2)
+
+def at(hour: int, day: int = 0) -> datetime:
+    return DAY + timedelta(days=day, hours=hour)
+
+def add_polls(db, *polls, store_id=STORE):
+    db.add_all([models.StoreStatus(store_id=store_id, timestamp_utc=ts, status=status) for ts, status in polls])
+    db.commit()
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    session.add(models.Store(store_id=STORE, timezone_str='UTC'))
+    session.add_all([models.BusinessHours(store_id=STORE, day=day, start_time_local='09:00:00',
+                                          end_time_local='17:00:00') for day in range(7)])
+    session.commit()
+    invalidate_business_hours_index()
+    yield session
+    session.close()
+
+@pytest.fixture
+def reports_dir(tmp_path, monkeypatch):
+    path = tmp_path / 'reports'
+    monkeypatch.setattr(report_artifacts, 'REPORTS_DIR', str(path))
+    return path
@@ -0,0 +1,76 @@
+import gzip
+import pandas as pd
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+import models
+from controllers.report_artifacts import artifact_response, write_report_artifact
+
+CSV = "store_id,uptime_last_hour\nstore-1,60.0\nstore-2,0.0\n"
+
+@pytest.fixture
+def artifact(reports_dir):
+    batches = [pd.DataFrame({'store_id': ['store-1'], 'uptime_last_hour': [60.0]}),
+               pd.DataFrame({'store_id': ['store-2'], 'uptime_last_hour': [0.0]})]
+    path, size, etag, rows = write_report_artifact('report', batches)
+    assert rows == 2
+    return models.Report(report_id='report', status='Complete', artifact_path=path, size_bytes=size, etag=etag)
+
+@pytest.fixture
+def client(artifact):
+    app = FastAPI()
+
+    @app.get("/report")
+    def get_report(request: Request):
+        return artifact_response(artifact, request)
+
+    return TestClient(app)
+
+def fetch(client, **headers):
+    # Raw bytes: the client would otherwise decompress gzip bodies.
+    with client.stream("GET", "/report", headers=headers) as response:
+        return response, b"".join(response.iter_raw())
+
+def test_identical_reports_share_an_etag(artifact, reports_dir):
+    batches = [pd.DataFrame({'store_id': ['store-1', 'store-2'], 'uptime_last_hour': [60.0, 0.0]})]
+    _, _, etag, _ = write_report_artifact('again', batches)
+    assert etag == artifact.etag
+
+def test_gzip_body_and_conditional_get(client, artifact):
+    response, body = fetch(client, **{'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['etag'] == f'"{artifact.etag}"'
+    assert response.headers['content-encoding'] == 'gzip'
+    assert gzip.decompress(body).decode() == CSV
+
+    response, body = fetch(client, **{'Accept-Encoding': 'gzip', 'If-None-Match': f'"{artifact.etag}"'})
+    assert response.status_code == 304
+    assert body == b""
+
+def test_identity_body_has_its_own_etag(client, artifact):
+    response, body = fetch(client, **{'Accept-Encoding': 'identity'})
+    assert response.status_code == 200
+    assert response.headers['etag'] == f'"{artifact.etag}-identity"'
+    assert 'content-encoding' not in response.headers
+    assert body.decode() == CSV
+
+def test_range_requests(client, artifact):
+    _, whole = fetch(client, **{'Accept-Encoding': 'gzip'})
+
+    response, body = fetch(client, **{'Accept-Encoding': 'gzip', 'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.headers['content-range'] == f'bytes 10-19/{artifact.size_bytes}'
+    assert body == whole[10:20]
+
+    response, body = fetch(client, **{'Accept-Encoding': 'gzip', 'Range': 'bytes=-5'})
+    assert response.status_code == 206
+    assert body == whole[-5:]
+
+    # A stale If-Range gets the whole body instead of a piece of a different file.
+    response, body = fetch(client, **{'Accept-Encoding': 'gzip', 'Range': 'bytes=10-19', 'If-Range': '"other"'})
+    assert response.status_code == 200
+    assert body == whole
+
+    response, _ = fetch(client, **{'Accept-Encoding': 'gzip', 'Range': f'bytes={artifact.size_bytes}-'})
+    assert response.status_code == 416
+    assert response.headers['content-range'] == f'bytes */{artifact.size_bytes}'
@@ -0,0 +1,86 @@
+from datetime import datetime
+import pytest
+import pytz
+from sqlalchemy.orm import sessionmaker
+import models
+from controllers import report_controller
+from controllers.report_controller import find_reusable_report, generate_report
+from controllers.report_scheduler import QueueFull, ReportJob, ReportScheduler
+from conftest import add_polls, at
+
+WINDOWS = 'hour,day,week'
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    # No threads: submitted reports stay queued until a test runs them.
+    scheduler = ReportScheduler(workers=0, queue_limit=2)
+    monkeypatch.setattr(report_controller, 'report_scheduler', scheduler)
+    return scheduler
+
+def add_report(db, report_id: str, status: str = 'Queued'):
+    db.add(models.Report(report_id=report_id, status=status, created_at=datetime.now(pytz.UTC).replace(tzinfo=None),
+                         data_version='1.1.1', windows=WINDOWS))
+    db.commit()
+
+def status(db, report_id: str) -> str:
+    db.expire_all()
+    return db.get(models.Report, report_id).status
+
+def test_only_reports_held_by_this_scheduler_are_joined(db, scheduler):
+    add_report(db, 'orphaned', 'Running')
+    assert find_reusable_report(db, '1.1.1', WINDOWS) is None
+    add_report(db, 'queued')
+    scheduler.submit('queued')
+    assert find_reusable_report(db, '1.1.1', WINDOWS).report_id == 'queued'
+
+def test_full_queue_rejects_reports(scheduler):
+    scheduler.submit('first')
+    scheduler.submit('second', priority=5)
+    with pytest.raises(QueueFull):
+        scheduler.submit('third')
+    assert scheduler.queue_position('second') == 1
+    assert scheduler.queue_position('first') == 2
+
+def test_cancelled_queued_report_frees_its_place(scheduler):
+    scheduler.submit('first')
+    scheduler.submit('second')
+    assert scheduler.cancel('first') == 'Queued'
+    assert scheduler.get('first') is None
+    assert scheduler.queue_position('second') == 1
+    scheduler.submit('third')
+
+def test_cancel_stops_a_running_report(db, reports_dir):
+    add_polls(db, (at(9), 'active'), (at(12), 'inactive'))
+    add_report(db, 'report')
+    job = ReportJob('report', 0, 0)
+    job.cancelled.set()
+    generate_report('report', db, job)
+    assert status(db, 'report') == 'Cancelled'
+    assert not list(reports_dir.iterdir())
+
+def test_cancel_through_the_database_is_not_overwritten(db, engine, reports_dir, monkeypatch):
+    add_polls(db, (at(9), 'active'), (at(12), 'inactive'))
+    add_report(db, 'report')
+    write_report_artifact = report_controller.write_report_artifact
+
+    def cancel_while_writing(report_id, batches):
+        written = write_report_artifact(report_id, batches)
+        # /cancel_report in a process whose scheduler does not hold the report.
+        other = sessionmaker(bind=engine)()
+        other.query(models.Report).filter_by(report_id=report_id).update({'status': 'Cancelled'})
+        other.commit()
+        other.close()
+        return written
+
+    monkeypatch.setattr(report_controller, 'write_report_artifact', cancel_while_writing)
+    generate_report('report', db, ReportJob('report', 0, 0))
+    assert status(db, 'report') == 'Cancelled'
+    assert not list(reports_dir.iterdir())
+
+def test_report_completes(db, reports_dir):
+    add_polls(db, (at(9), 'active'), (at(12), 'inactive'))
+    add_report(db, 'report')
+    job = ReportJob('report', 0, 0)
+    generate_report('report', db, job)
+    assert status(db, 'report') == 'Complete'
+    assert job.rows_done == job.rows_total == 1
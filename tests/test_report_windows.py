@@ -0,0 +1,50 @@
+from datetime import timedelta
+import numpy as np
+import pytest
+from controllers.report_controller import calculate_uptime_downtime, timeline_uptime_downtime
+from controllers.uptime_engine import build_report, parse_windows, report_columns
+from conftest import DAY, STORE, add_polls, at
+
+def test_window_opens_with_the_poll_before_it(db):
+    add_polls(db, (at(8), 'active'), (at(12), 'inactive'))
+    assert timeline_uptime_downtime(STORE, at(9), at(17), db) == {'uptime': 180, 'downtime': 300}
+    # The day-by-day walk drops the 08:00 poll, so 09:00-12:00 counts nowhere.
+    assert calculate_uptime_downtime(STORE, at(9), at(17), db) == {'uptime': 0, 'downtime': 300}
+
+def test_last_poll_is_clipped_to_the_window(db):
+    add_polls(db, (at(9), 'active'), (at(12), 'inactive'))
+    assert timeline_uptime_downtime(STORE, at(9), at(13), db) == {'uptime': 180, 'downtime': 60}
+    # The walk runs the 12:00 poll to the 17:00 close, past the window end.
+    assert calculate_uptime_downtime(STORE, at(9), at(13), db) == {'uptime': 180, 'downtime': 300}
+
+def test_time_outside_business_hours_is_not_counted(db):
+    add_polls(db, (at(16), 'inactive'), (at(10, day=1), 'active'), (at(11, day=1), 'active'))
+    assert timeline_uptime_downtime(STORE, at(16), at(11, day=1), db) == {'uptime': 60, 'downtime': 120}
+
+def test_long_windows_count_every_business_day(db):
+    add_polls(db, (at(9), 'active'))
+    minutes = timeline_uptime_downtime(STORE, at(9), at(9, day=10), db)
+    assert minutes == {'uptime': 10 * 8 * 60, 'downtime': 0}
+    # The walk stops after seven steps and here revisits the first day on each of them.
+    assert calculate_uptime_downtime(STORE, at(9), at(9, day=10), db) == {'uptime': 7 * 8 * 60, 'downtime': 0}
+
+def test_engine_matches_timeline_for_any_windows(db):
+    rng = np.random.default_rng(0)
+    stamps = sorted(set(rng.integers(0, 12 * 24 * 60, 400).tolist()))
+    add_polls(db, *[(DAY + timedelta(minutes=int(minute)), 'active' if rng.random() < 0.7 else 'inactive')
+                    for minute in stamps])
+    current_time = DAY + timedelta(days=12)
+    windows = parse_windows('15m,hour,6h,day,week,10d')
+    row = build_report(db, current_time, windows=windows).iloc[0]
+    for name, span in windows:
+        minutes = timeline_uptime_downtime(STORE, current_time - span, current_time, db)
+        scale = 1 if span <= timedelta(hours=1) else 60
+        assert row[f'uptime_last_{name}'] == pytest.approx(minutes['uptime'] / scale, abs=1e-9)
+        assert row[f'downtime_last_{name}'] == pytest.approx(minutes['downtime'] / scale, abs=1e-9)
+
+def test_default_windows_keep_the_report_columns(db):
+    add_polls(db, (at(9), 'active'))
+    assert list(build_report(db, at(12)).columns) == report_columns() == [
+        'store_id', 'uptime_last_hour', 'uptime_last_day', 'uptime_last_week',
+        'downtime_last_hour', 'downtime_last_day', 'downtime_last_week',
+    ]
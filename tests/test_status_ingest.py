@@ -0,0 +1,46 @@
+import io
+import models
+from controllers import status_ingest
+from controllers.csv_controller import ingest_store_status
+from controllers.data_versions import STORE_STATUS, get_data_versions
+from conftest import STORE
+
+def upload(db, *rows):
+    body = "store_id,timestamp_utc,status\n" + "".join(f"{STORE},{ts} UTC,{status}\n" for ts, status in rows)
+    return ingest_store_status(db, io.BytesIO(body.encode()), 'status.csv')
+
+def polls(db):
+    return sorted((str(row.timestamp_utc), row.status) for row in db.query(models.StoreStatus))
+
+def test_repeated_upload_changes_nothing(db):
+    rows = [('2023-01-02 09:00:00', 'active'), ('2023-01-02 10:00:00', 'inactive')]
+    first = upload(db, *rows)
+    assert first['rows_inserted'] == 2
+    version = get_data_versions(db, STORE_STATUS)
+
+    again = upload(db, *rows)
+    assert (again['rows_inserted'], again['rows_updated'], again['rows_unchanged']) == (0, 0, 2)
+    assert db.query(models.StoreStatus).count() == 2
+    assert get_data_versions(db, STORE_STATUS) == version
+
+def test_duplicates_within_an_upload_keep_the_last(db):
+    result = upload(db, ('2023-01-02 09:00:00', 'active'), ('2023-01-02 09:00:00', 'inactive'))
+    assert (result['rows_inserted'], result['rows_unchanged']) == (1, 1)
+    assert polls(db) == [('2023-01-02 09:00:00', 'inactive')]
+
+def test_late_polls_update_or_fill_in(db):
+    upload(db, ('2023-01-02 09:00:00', 'active'), ('2023-01-02 11:00:00', 'active'))
+    version = get_data_versions(db, STORE_STATUS)
+    # Both are older than the store's newest poll: one changes a status, one is new.
+    result = upload(db, ('2023-01-02 09:00:00', 'inactive'), ('2023-01-02 10:00:00', 'inactive'))
+    assert (result['rows_inserted'], result['rows_updated'], result['rows_unchanged']) == (1, 1, 0)
+    assert polls(db) == [('2023-01-02 09:00:00', 'inactive'), ('2023-01-02 10:00:00', 'inactive'),
+                         ('2023-01-02 11:00:00', 'active')]
+    assert get_data_versions(db, STORE_STATUS) != version
+
+def test_late_polls_can_be_skipped(db, monkeypatch):
+    monkeypatch.setattr(status_ingest, 'STATUS_LATE_POLLS', 'skip')
+    upload(db, ('2023-01-02 11:00:00', 'active'))
+    result = upload(db, ('2023-01-02 10:00:00', 'inactive'), ('2023-01-02 12:00:00', 'inactive'))
+    assert (result['rows_inserted'], result['rows_skipped']) == (1, 1)
+    assert polls(db) == [('2023-01-02 11:00:00', 'active'), ('2023-01-02 12:00:00', 'inactive')]
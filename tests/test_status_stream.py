@@ -0,0 +1,76 @@
+from typing import List
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import sessionmaker
+import models
+from controllers import status_stream
+from controllers.status_stream import StatusStreamWriter, StreamRequest
+from conftest import STORE
+
+def ndjson_polls(*timestamps) -> List[bytes]:
+    return [json.dumps({'store_id': STORE, 'timestamp_utc': f'{ts} UTC', 'status': 'active'}).encode()
+            for ts in timestamps]
+
+@pytest.fixture
+def writer(engine, monkeypatch):
+    monkeypatch.setattr(status_stream, 'SessionLocal', sessionmaker(bind=engine))
+    monkeypatch.setattr(status_stream, 'STREAM_RETRY_SECONDS', 0)
+    writer = StatusStreamWriter(queue_batches=4, flush_ms=10)
+    monkeypatch.setattr(status_stream, 'stream_writer', writer)
+    yield writer
+    writer.stop(timeout=5)
+
+def test_full_queue_answers_503(writer, monkeypatch):
+    monkeypatch.setattr(status_stream, 'STREAM_PUT_TIMEOUT', 0.05)
+    # The writer is not started, so nothing drains the queue.
+    stream = StreamRequest('application/x-ndjson')
+    for minute in range(4):
+        asyncio.run(status_stream._queue_lines(stream, ndjson_polls(f'2023-01-02 09:0{minute}:00')))
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(status_stream._queue_lines(stream, ndjson_polls('2023-01-02 09:05:00')))
+    assert raised.value.status_code == 503
+    assert raised.value.detail['rows_queued'] == 4
+    assert stream.seqs == [1, 2, 3, 4]
+
+def test_batches_are_written(db, writer):
+    stream = StreamRequest('application/x-ndjson')
+    seq = writer.offer(stream.parse(ndjson_polls('2023-01-02 09:00:00', '2023-01-02 10:00:00')))
+    writer.start()
+    assert writer.wait_written([seq], timeout=5) is True
+    assert db.query(models.StoreStatus).count() == 2
+
+def test_failed_batch_is_retried(db, writer, monkeypatch):
+    merge_status_frames = status_stream.merge_status_frames
+    attempts = []
+
+    def fail_once(*args):
+        attempts.append(args)
+        if len(attempts) == 1:
+            raise RuntimeError("database is locked")
+        return merge_status_frames(*args)
+
+    monkeypatch.setattr(status_stream, 'merge_status_frames', fail_once)
+    seq = writer.offer(StreamRequest('application/x-ndjson').parse(ndjson_polls('2023-01-02 09:00:00')))
+    writer.start()
+    assert writer.wait_written([seq], timeout=5) is True
+    assert len(attempts) == 2
+    assert db.query(models.StoreStatus).count() == 1
+
+def test_dropped_batch_is_reported_to_its_requests(db, writer, monkeypatch, caplog):
+    attempts = []
+
+    def always_fail(*args):
+        attempts.append(args)
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(status_stream, 'merge_status_frames', always_fail)
+    stream = StreamRequest('application/x-ndjson')
+    first = writer.offer(stream.parse(ndjson_polls('2023-01-02 09:00:00')))
+    second = writer.offer(stream.parse(ndjson_polls('2023-01-02 10:00:00')))
+    writer.start()
+    assert writer.wait_written([first, second], timeout=5) is False
+    assert len(attempts) == status_stream.STREAM_WRITE_ATTEMPTS
+    assert f"dropped pieces {first}-{second}" in caplog.text
+    assert db.query(models.StoreStatus).count() == 0
@@ -0,0 +1,32 @@
+from datetime import timedelta
+import pytest
+from fastapi import HTTPException
+from controllers import business_hours_index
+from controllers.report_controller import store_uptime, timeline_uptime_downtime
+from conftest import STORE, add_polls, at
+
+def test_store_hours_are_built_once(db, monkeypatch):
+    add_polls(db, (at(9), 'active'), (at(12), 'inactive'), (at(10, day=1), 'active'))
+    build_business_hours_index = business_hours_index.build_business_hours_index
+    builds = []
+
+    def counted(*args, **kwargs):
+        builds.append(args)
+        return build_business_hours_index(*args, **kwargs)
+
+    monkeypatch.setattr(business_hours_index, 'build_business_hours_index', counted)
+    day = store_uptime(db, STORE, 'day')
+    # Another window misses the result cache but not the store's business hours.
+    hours = store_uptime(db, STORE, '6h,day')
+    assert len(builds) == 1
+    assert day['uptime_last_day'] == hours['uptime_last_day']
+    expected = timeline_uptime_downtime(STORE, at(10, day=1) - timedelta(days=1), at(10, day=1), db)
+    assert day['uptime_last_day'] == pytest.approx(expected['uptime'] / 60)
+
+def test_unknown_store_and_bad_windows(db):
+    with pytest.raises(HTTPException) as raised:
+        store_uptime(db, 'nope', None)
+    assert raised.value.status_code == 404
+    with pytest.raises(HTTPException) as raised:
+        store_uptime(db, STORE, 'xx')
+    assert raised.value.status_code == 400
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+import pytest
+from sqlalchemy.orm import sessionmaker
+from controllers import upload_jobs
+from controllers.upload_jobs import get_upload_job
+
+@pytest.fixture
+def spooled(tmp_path, engine, monkeypatch):
+    monkeypatch.setattr(upload_jobs, 'SessionLocal', sessionmaker(bind=engine))
+    monkeypatch.setattr(upload_jobs, 'upload_jobs', OrderedDict())
+    path = tmp_path / 'upload.csv'
+    path.write_text('store_id,timestamp_utc,status\n')
+    return path
+
+def track(job_id: str):
+    upload_jobs.upload_jobs[job_id] = {'job_id': job_id, 'kind': 'store_status', 'filename': 'upload.csv',
+                                       'status': 'Queued', 'rows_processed': 0, 'rows_rejected': 0, 'errors': []}
+
+def ingest_rows(db, source, filename, progress):
+    progress(1)
+    return {'rows_inserted': len(source.read().splitlines()) - 1}
+
+def test_job_runs_and_removes_its_file(spooled):
+    track('tracked')
+    upload_jobs._run_job('tracked', 'store_status', 'upload.csv', str(spooled), ingest_rows)
+    job = get_upload_job('tracked')
+    assert job['status'] == 'Complete'
+    assert job['result'] == {'rows_inserted': 0}
+    assert not spooled.exists()
+
+def test_evicted_job_still_ingests_and_removes_its_file(spooled):
+    ingested = []
+
+    def ingest(db, source, filename, progress):
+        ingested.append(filename)
+        return ingest_rows(db, source, filename, progress)
+
+    upload_jobs._run_job('evicted', 'store_status', 'upload.csv', str(spooled), ingest)
+    assert ingested == ['upload.csv']
+    assert get_upload_job('evicted') is None
+    assert not spooled.exists()
+
+def test_failed_job_removes_its_file(spooled):
+    def fail(db, source, filename, progress):
+        raise ValueError("bad file")
+
+    track('failing')
+    upload_jobs._run_job('failing', 'store_status', 'upload.csv', str(spooled), fail)
+    assert get_upload_job('failing')['errors'] == ['bad file']
+    assert not spooled.exists()
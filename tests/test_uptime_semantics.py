@@ -0,0 +1,156 @@
+import os
+import time
+import logging
+from typing import Dict
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+import pytz
+from sqlalchemy.orm import Session
+
+# The original walk below reads the naive UTC timestamps with datetime.astimezone().
+os.environ['TZ'] = 'UTC'
+time.tzset()
+
+from models.store import Store
+from models.business_hours import BusinessHours
+from models.store_status import StoreStatus
+import models
+from controllers.business_hours_index import invalidate_business_hours_index
+from controllers.report_controller import calculate_uptime_downtime
+from conftest import DAY, STORE, add_polls, at
+
+logger = logging.getLogger(__name__)
+
+# calculate_uptime_downtime as it was before the business hours were cached, kept verbatim.
+def original_calculate_uptime_downtime(store_id: str, start_time: datetime, end_time: datetime, db: Session) -> Dict:
+    try:
+        store = db.query(Store).filter(Store.store_id == store_id).first()
+        timezone = pytz.timezone(store.timezone_str if store else 'America/Chicago')
+        
+        if start_time.tzinfo is None:
+            start_time = pytz.UTC.localize(start_time)
+        else:
+            start_time = start_time.astimezone(pytz.UTC)
+            
+        if end_time.tzinfo is None:
+            end_time = pytz.UTC.localize(end_time)
+        else:
+            end_time = end_time.astimezone(pytz.UTC)
+        
+        business_hours = db.query(BusinessHours).filter(BusinessHours.store_id == store_id).all()
+        status_records = db.query(StoreStatus).filter(
+            StoreStatus.store_id == store_id,
+            StoreStatus.timestamp_utc >= start_time,
+            StoreStatus.timestamp_utc <= end_time
+        ).order_by(StoreStatus.timestamp_utc).all()
+        
+        total_uptime = timedelta()
+        total_downtime = timedelta()
+        
+        current_time = start_time
+        day_count = 0
+        max_days = 7
+        
+        while current_time < end_time and day_count < max_days:
+            day_count += 1
+            local_time = current_time.astimezone(timezone)
+            day_of_week = local_time.weekday()
+            
+            day_hours = next((bh for bh in business_hours if bh.day == day_of_week), None)
+            
+            if day_hours:
+                start_time_parts = day_hours.start_time_local.split(':')
+                end_time_parts = day_hours.end_time_local.split(':')
+                
+                start_hour = int(start_time_parts[0])
+                start_minute = int(start_time_parts[1])
+                end_hour = int(end_time_parts[0])
+                end_minute = int(end_time_parts[1])
+                
+                business_start = local_time.replace(hour=start_hour, minute=start_minute, second=0, microsecond=0)
+                business_end = local_time.replace(hour=end_hour, minute=end_minute, second=0, microsecond=0)
+                
+                if business_start.tzinfo is None:
+                    business_start = timezone.localize(business_start)
+                if business_end.tzinfo is None:
+                    business_end = timezone.localize(business_end)
+                
+                if business_end < business_start:
+                    business_end += timedelta(days=1)
+                
+                period_records = [r for r in status_records if 
+                                business_start <= r.timestamp_utc.astimezone(timezone) <= business_end]
+                
+                if period_records:
+                    for i in range(len(period_records) - 1):
+                        current_record = period_records[i]
+                        next_record = period_records[i + 1]
+                        duration = next_record.timestamp_utc - current_record.timestamp_utc
+                        
+                        if current_record.status == 'active':
+                            total_uptime += duration
+                        else:
+                            total_downtime += duration
+                    
+                    last_record = period_records[-1]
+                    duration = business_end - last_record.timestamp_utc.astimezone(timezone)
+                    if last_record.status == 'active':
+                        total_uptime += duration
+                    else:
+                        total_downtime += duration
+                
+                current_time = business_end.astimezone(pytz.UTC)
+            else:
+                current_time = end_time
+        
+        return {
+            'uptime': total_uptime.total_seconds() / 60,
+            'downtime': total_downtime.total_seconds() / 60
+        }
+    
+    except Exception as e:
+        logger.error(f"Error calculating uptime/downtime for store {store_id}: {str(e)}")
+        raise
+
+def test_polls_inside_one_business_day(db):
+    add_polls(db, (at(9), 'active'), (at(12), 'inactive'))
+    assert calculate_uptime_downtime(STORE, at(9), at(17), db) == {'uptime': 180, 'downtime': 300}
+
+def test_poll_before_the_window_is_ignored(db):
+    add_polls(db, (at(8), 'active'), (at(12), 'inactive'))
+    assert calculate_uptime_downtime(STORE, at(9), at(17), db) == {'uptime': 0, 'downtime': 300}
+
+def test_last_poll_runs_to_the_business_day_close(db):
+    add_polls(db, (at(9), 'active'), (at(12), 'inactive'))
+    assert calculate_uptime_downtime(STORE, at(9), at(13), db) == {'uptime': 180, 'downtime': 300}
+
+def test_hours_are_reloaded_after_an_upload(db):
+    add_polls(db, (at(9), 'active'))
+    assert calculate_uptime_downtime(STORE, at(9), at(17), db) == {'uptime': 480, 'downtime': 0}
+    db.query(models.BusinessHours).update({'end_time_local': '10:00:00'})
+    db.commit()
+    invalidate_business_hours_index()
+    # The day closes before the window ends, so the walk counts the same day on each of its seven steps.
+    assert calculate_uptime_downtime(STORE, at(9), at(17), db) == {'uptime': 420, 'downtime': 0}
+
+def test_matches_the_original_walk(db):
+    rng = np.random.default_rng(0)
+    # An overnight store in a DST timezone next to the UTC one, closed on Sundays.
+    db.add(models.Store(store_id='store-2', timezone_str='America/New_York'))
+    db.add_all([models.BusinessHours(store_id='store-2', day=day, start_time_local='18:30:00',
+                                     end_time_local='02:00:00') for day in range(6)])
+    db.commit()
+    for store_id in (STORE, 'store-2'):
+        stamps = sorted(set(rng.integers(0, 8 * 24 * 60, 300).tolist()))
+        add_polls(db, *[(DAY + timedelta(minutes=int(minute)), 'active' if rng.random() < 0.7 else 'inactive')
+                        for minute in stamps], store_id=store_id)
+    current_time = DAY + timedelta(days=8)
+    for store_id in (STORE, 'store-2'):
+        for span in (timedelta(hours=1), timedelta(days=1), timedelta(weeks=1)):
+            for offset in range(0, 24 * 60, 97):
+                end = current_time - timedelta(minutes=offset)
+                expected = original_calculate_uptime_downtime(store_id, end - span, end, db)
+                minutes = calculate_uptime_downtime(store_id, end - span, end, db)
+                assert minutes['uptime'] == pytest.approx(expected['uptime'], abs=1e-9)
+                assert minutes['downtime'] == pytest.approx(expected['downtime'], abs=1e-9)